@@ -0,0 +1,32 @@
+""" Measures the cost of sampling implementation latencies on dispatch. """
+
+import timeit
+
+from dynamic_dispatch import dynamic_dispatch
+
+
+def make(latency=None):
+    @dynamic_dispatch(latency=latency)
+    def handle(kind, a):
+        pass
+
+    @handle.dispatch(on=1)
+    def _(a):
+        pass
+
+    return handle
+
+
+def measure(handle):
+    number = 1_000_000
+    return min(timeit.repeat(lambda: handle(1, 2), number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    print(f'uninstrumented:          {measure(make()):6.1f} ns')
+    for latency in (10_000, 1000, 100, 1):
+        print(f'timing 1 in {latency:<6}       {measure(make(latency)):6.1f} ns')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+""" Measures the cost of context-scoped overlays on dispatch. """
+
+import timeit
+
+from dynamic_dispatch import dynamic_dispatch
+
+
+def make():
+    @dynamic_dispatch
+    def handle(kind, a):
+        pass
+
+    @handle.dispatch(on=1)
+    def _(a):
+        pass
+
+    @handle.dispatch(on=2)
+    def _(a):
+        pass
+
+    return handle
+
+
+def measure(handle):
+    number = 1_000_000
+    return min(timeit.repeat(lambda: handle(1, 2), number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    never = make()
+    print(f'never overridden:        {measure(never):6.1f} ns')
+
+    handle = make()
+    with handle.override({2: lambda a: a}):
+        pass
+    print(f'0 overlays:              {measure(handle):6.1f} ns')
+
+    with handle.override({2: lambda a: a}):
+        print(f'1 overlay, miss:         {measure(handle):6.1f} ns')
+
+        with handle.override({1: lambda a: a}):
+            print(f'nested overlays, hit:    {measure(handle):6.1f} ns')
+
+
+if __name__ == '__main__':
+    main()
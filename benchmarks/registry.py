@@ -0,0 +1,55 @@
+""" Compares memory per million dispatch values and lookup latency of compact and dict registries. """
+
+import gc
+import random
+import timeit
+import tracemalloc
+
+from dynamic_dispatch import dynamic_dispatch
+
+KEYS = 1_000_000
+IMPLEMENTATIONS = 40
+
+
+def build(compact: bool, keys):
+    # Implementations are created before tracing, as they are shared by either registry.
+    impls = [eval(f'lambda code: {i}') for i in range(IMPLEMENTATIONS)]
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        @dynamic_dispatch(compact=compact)
+        def product(code):
+            pass
+
+        product.dispatch_many({key: impls[i % IMPLEMENTATIONS] for i, key in enumerate(keys)})
+
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return product, used
+
+
+def main():
+    for label, keys in (('dense ints', range(KEYS)), ('sparse ints', random.sample(range(10 ** 12), KEYS)),
+                        ('strings', [f'SKU-{i:08}' for i in range(KEYS)])):
+        probes = random.sample(list(keys), 1000)
+
+        for compact in (False, True):
+            product, used = build(compact, keys)
+
+            number = 200
+            latency = min(timeit.repeat(lambda: [product(code) for code in probes], number=number, repeat=5))
+            latency /= number * len(probes)
+
+            print(f'{label:12} {"compact" if compact else "dict":8} {used / 2 ** 20 * 1_000_000 / KEYS:7.1f} MiB '
+                  f'per million values, {latency * 1e9:6.1f} ns per dispatch')
+
+            # Released before building the next registry, so that its memory isn't counted alongside.
+            product = None
+
+
+if __name__ == '__main__':
+    main()
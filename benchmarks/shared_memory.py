@@ -0,0 +1,62 @@
+""" Compares passing NumPy arrays to and from a process pool through shared memory against pickling them. """
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from dynamic_dispatch import SharedMemoryExecutor, dynamic_dispatch
+
+
+@dynamic_dispatch
+def handle(kind, a):
+    pass
+
+
+def total(a):
+    # Reads the whole array, as an implementation would.
+    return float(a.sum())
+
+
+def negate(a):
+    return -a
+
+
+def measure(pool, kind, array, repeat):
+    handle.dispatch(total, on='total', executor=pool)
+    handle.dispatch(negate, on='negate', executor=pool)
+    try:
+        # Starts the worker, and fills the pool of segments.
+        handle(kind, array).result()
+
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            handle(kind, array).result()
+            times.append(time.perf_counter() - start)
+    finally:
+        handle.unregister('total')
+        handle.unregister('negate')
+
+    return min(times)
+
+
+def main():
+    # Returning a gigabyte holds about five copies of it at once between the two processes, either way.
+    for size, repeat, kinds in ((1 << 20, 50, ('total', 'negate')), (100 << 20, 5, ('total', 'negate')),
+                                (1 << 30, 2, ('total',))):
+        array = numpy.ones(size // 8)
+        for kind in kinds:
+            with ProcessPoolExecutor(1) as pool:
+                pickled = measure(pool, kind, array, repeat)
+            with SharedMemoryExecutor(ProcessPoolExecutor(1)) as pool:
+                shared = measure(pool, kind, array, repeat)
+
+            print(f'{size >> 20:5} MB {kind:7} pickled {pickled * 1e3:9.2f} ms   shared memory {shared * 1e3:9.2f} ms'
+                  f'   {pickled / shared:5.1f}x')
+
+        del array
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+""" Compares the time to register many dispatch values one at a time and in bulk. """
+
+import time
+
+from dynamic_dispatch import dynamic_dispatch
+
+IMPLEMENTATIONS = 40
+
+
+def one_at_a_time(dispatcher, impls, values):
+    for value in values:
+        dispatcher.dispatch(impls[value % IMPLEMENTATIONS], on=value)
+
+
+def by_list(dispatcher, impls, values):
+    for i, impl in enumerate(impls):
+        dispatcher.dispatch(impl, on=list(values[i::IMPLEMENTATIONS]))
+
+
+def by_table(dispatcher, impls, values):
+    dispatcher.dispatch_many({value: impls[value % IMPLEMENTATIONS] for value in values})
+
+
+def main():
+    impls = [eval(f'lambda code: {i}') for i in range(IMPLEMENTATIONS)]
+
+    for count in (10_000, 100_000):
+        values = range(count)
+        for register in (one_at_a_time, by_list, by_table):
+            @dynamic_dispatch
+            def product(code):
+                pass
+
+            start = time.perf_counter()
+            register(product, impls, values)
+            elapsed = time.perf_counter() - start
+
+            assert product(count - 1) == (count - 1) % IMPLEMENTATIONS
+            print(f'{count:7} values {register.__name__:14} {elapsed * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Compares vectorized dispatch against dispatching each row in a Python loop. """
+
+import timeit
+
+import numpy
+
+from dynamic_dispatch import dynamic_dispatch
+
+
+@dynamic_dispatch
+def scale(code, value):
+    pass
+
+
+@scale.dispatch(on=0)
+def _(value):
+    return value * 2
+
+
+@scale.dispatch(on=1)
+def _(value):
+    return value + 1
+
+
+@scale.dispatch(on=2)
+def _(value):
+    return -value
+
+
+def loop(codes, values):
+    return [scale(code, value) for code, value in zip(codes.tolist(), values.tolist())]
+
+
+def main():
+    rng = numpy.random.default_rng(0)
+
+    for rows in (1_000, 100_000, 1_000_000):
+        codes = rng.integers(0, 3, rows)
+        values = rng.random(rows)
+
+        number = max(1, 100_000 // rows)
+        vectorized = min(timeit.repeat(lambda: scale.vectorize(codes, values), number=number, repeat=5)) / number
+        looped = min(timeit.repeat(lambda: loop(codes, values), number=number, repeat=5)) / number
+
+        print(f'{rows:>9} rows: vectorize {vectorized * 1e3:9.3f} ms, loop {looped * 1e3:9.3f} ms, '
+              f'{looped / vectorized:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,31 @@
 """ Like functools.singledispatch, but dynamic, value-based dispatch. """
 
-__all__ = ('dynamic_dispatch',)
+__all__ = ('dynamic_dispatch', 'binary_dispatch', 'warmup', 'Rejected', 'SharedMemoryExecutor')
 
 import functools
+import gc
 import inspect
+import operator
+import struct
 
-from typing import Union, Callable, Type, Hashable
+from typing import Any, Optional, Union, Callable, Mapping, Type
 
+from dynamic_dispatch._binary import feed, process, route
+from dynamic_dispatch._bulkhead import Rejected
 from dynamic_dispatch._class import class_dispatch
-from dynamic_dispatch._func import func_dispatch
+from dynamic_dispatch._func import DISPATCHERS, func_dispatch
+from dynamic_dispatch._partition import Partitioned
+from dynamic_dispatch._shard import Sharded
+from dynamic_dispatch._shm import SharedMemoryExecutor
+from dynamic_dispatch._vector import vectorize
 
 from ._typeguard import typechecked
 
 
 @typechecked(always=True)
-def dynamic_dispatch(func: Union[Callable, Type, None] = None, *, default: bool = False):
+def dynamic_dispatch(func: Union[Callable, Type, None] = None, *, default: bool = False, structural: bool = False,
+                     on_attr: Optional[str] = None, on_item: Any = None, compact: bool = False,
+                     adaptive: bool = False, latency: Optional[int] = None, keep_alive: Optional[int] = None):
     """
     Value-based dynamic-dispatch class decorator.
 
@@ -53,9 +64,9 @@ def dynamic_dispatch(func: Union[Callable, Type, None] = None, *, default: bool
         >>> class Foo:
         >>>     def __init__(self, foo: int):
         >>>         super().__init__()
-        >>>         print(bar)
+        >>>         print(foo)
         >>>
-        >>> @Foo.dispatch(foo=5)
+        >>> @Foo.dispatch(on=5)
         >>> class Bar(Foo):
         >>>     def __init__(self, foo, bar):
         >>>         super().__init__(foo)
@@ -65,33 +76,186 @@ def dynamic_dispatch(func: Union[Callable, Type, None] = None, *, default: bool
         1
         <__main__.Foo object at ...>
         >>> Foo(5, 10)
+        5
         50
         <__main__.Bar object at ...>
 
+    The README describes the other options, with examples.
+
     :param func: class or function to add dynamic dispatch to.
     :param default: whether or not to use func as the default implementation.
+    :param structural: whether to allow unhashable dispatch values, keyed by structure.
+    :param on_attr: attribute of the dispatch param to dispatch on, rather than the param itself.
+    :param on_item: item of the dispatch param to dispatch on, rather than the param itself.
+    :param compact: whether to store the registry compactly, for very many dispatch values.
+    :param adaptive: whether to specialize dispatch for the hottest dispatch values, for functions.
+    :param latency: times one in every so many calls, for latency histograms, for functions.
+    :param keep_alive: most weakly registered implementations to hold strongly, for functions.
     :returns: func with dynamic dispatch
     """
     # Default was specified, wait until func is here too.
     if func is None:
-        return functools.partial(dynamic_dispatch, default=default)
+        return functools.partial(dynamic_dispatch, default=default, structural=structural, on_attr=on_attr,
+                                 on_item=on_item, compact=compact, adaptive=adaptive, latency=latency,
+                                 keep_alive=keep_alive)
+
+    if on_attr is not None and on_item is not None:
+        raise ValueError('dispatch on either an attribute or an item, not both')
+
+    if on_attr is not None:
+        extract = operator.attrgetter(on_attr)
+    elif on_item is not None:
+        extract = operator.itemgetter(on_item)
+    else:
+        extract = None
 
     # Delegate depending on wrap type.
     if inspect.isclass(func):
-        return class_dispatch(func, default)
+        if adaptive:
+            raise ValueError('only dispatch functions can be adaptive')
+        if latency is not None:
+            raise ValueError('only dispatch functions can time their calls')
+        if keep_alive is not None:
+            raise ValueError('only dispatch functions can have weak implementations')
+
+        return class_dispatch(func, default, structural=structural, extract=extract, compact=compact)
+
+    return _function_dispatch(func, default, structural, extract, compact, adaptive, latency, keep_alive)
+
+
+@typechecked(always=True)
+def binary_dispatch(func: Optional[Callable] = None, *, header: Union[str, struct.Struct],
+                    prefix: Union[str, struct.Struct] = '>I', default: bool = False):
+    """
+    Value-based dynamic-dispatch decorator for framed binary messages.
+
+    Decorates a function of the header value and body of a frame, and any further
+    arguments, which is dispatched on the header value like any other function. Its
+    route(frame, ...) attribute decodes the header from the start of a bytes-like
+    frame with struct, e.g. '>H' for a big-endian 2 byte type code, or '>2xB' for a
+    single byte at offset 2, and dispatches it with a memoryview of the rest as the
+    body, so the body is never copied. Headers of several fields dispatch on a tuple.
+
+    Its feed(buffer, ...) attribute routes each complete frame in a stream of frames,
+    each starting with its length, excluding the prefix, in the prefix format. It
+    returns the number of bytes consumed, after which any partial frame remains.
+
+    Its process(path, ..., record_size=None, chunk_size=None) attribute handles a
+    whole file of such frames, or of records of record_size bytes each, in bulk. The
+    file is memory-mapped, and each implementation is called once per header value,
+    or per chunk_size records, with a list of views of their bodies in place of the
+    body. It returns the results of those calls by header value.
+
+    :Example:
+
+        >>> @binary_dispatch(header='>H')
+        >>> def handle(kind, body):
+        >>>     print('unknown', kind)
+        >>>
+        >>> @handle.dispatch(on=1)
+        >>> def _(body):
+        >>>     print(bytes(body))
+        >>>
+        >>> handle.route(b'\\x00\\x01hello')
+        b'hello'
+        >>> handle.feed(b'\\x00\\x00\\x00\\x03\\x00\\x01a\\x00\\x00')
+        b'a'
+        7
+
+    :param func: function to add dynamic dispatch to.
+    :param header: struct format or struct of the header.
+    :param prefix: struct format or struct of the length prefix of frames.
+    :param default: whether or not to use func as the default implementation.
+    :returns: func with dynamic dispatch
+    """
+    if func is None:
+        return functools.partial(binary_dispatch, header=header, prefix=prefix, default=default)
 
-    func = func_dispatch(func, default=default)
+    if not isinstance(header, struct.Struct):
+        header = struct.Struct(header)
+    if not isinstance(prefix, struct.Struct):
+        prefix = struct.Struct(prefix)
 
-    # Alter register to hide implicit parameter.
-    dispatch = func.dispatch
+    func = _function_dispatch(func, default, False, None, False, False, None, None)
 
-    def replacement(impl: Callable = None, *, on: Hashable):
+    setattr(func, 'route', functools.partial(route, func, header))
+    setattr(func, 'feed', functools.partial(feed, func, header, prefix))
+    setattr(func, 'process', functools.partial(process, func, header, prefix))
+
+    return func
+
+
+@typechecked(always=True)
+def warmup(freeze: bool = False) -> int:
+    """
+    Builds the state every dispatch function and class would otherwise build on first
+    use, e.g. the entry points for overrides, so that worker processes forked after
+    this share it with their parent rather than each building their own.
+
+    With freeze, everything allocated so far is then moved out of reach of the garbage
+    collector with gc.freeze(), so that collections in workers don't write to the
+    pages they share with their parent. Anything frozen is never collected, so it
+    should be called once everything long-lived has been set up, just before forking.
+
+    :param freeze: whether to freeze everything allocated so far.
+    :returns: number of dispatch functions and classes warmed up.
+    """
+    dispatchers = list(DISPATCHERS)
+    for dispatcher in dispatchers:
+        dispatcher._warm()
+
+    if freeze:
+        # Garbage is collected first, rather than frozen with everything else.
+        gc.collect()
+        gc.freeze()
+
+    return len(dispatchers)
+
+
+def _function_dispatch(func: Callable, default: bool, structural: bool, extract: Optional[Callable], compact: bool,
+                       adaptive: bool, latency: Optional[int], keep_alive: Optional[int]):
+    func = func_dispatch(func, default=default, structural=structural, extract=extract, compact=compact,
+                         adaptive=adaptive, latency=latency, keep_alive=keep_alive)
+
+    # Alter register, replace and override to hide implicit parameter.
+    dispatch, dispatch_many, replace, override = func.dispatch, func.dispatch_many, func.replace, func.override
+
+    def dispatch_replacement(impl: Callable = None, *, on: Any, **options):
         if impl is None:
-            return functools.partial(replacement, on=on)
+            return functools.partial(dispatch_replacement, on=on, **options)
+
+        return dispatch(impl, arguments=inspect.signature(impl).parameters, on=on, **options)
+
+    def dispatch_many_replacement(table: Mapping[Any, Callable], **options):
+        # Signatures are only taken once per distinct implementation.
+        parameters = {}
+        for impl in table.values():
+            if id(impl) not in parameters:
+                parameters[id(impl)] = inspect.signature(impl).parameters
+
+        dispatch_many({on: (impl, parameters[id(impl)]) for on, impl in table.items()}, **options)
+
+    def replace_replacement(impl: Callable = None, *, on: Any, **options):
+        if impl is None:
+            return functools.partial(replace_replacement, on=on, **options)
+
+        return replace(impl, arguments=inspect.signature(impl).parameters, on=on, **options)
+
+    def override_replacement(overlay: Mapping[Any, Callable]):
+        return override({on: (impl, inspect.signature(impl).parameters) for on, impl in overlay.items()})
 
-        return dispatch(impl, arguments=inspect.signature(impl).parameters, on=on)
+    def extend():
+        # Misses in the new registry fall back to this dispatcher, so nothing is copied.
+        return _function_dispatch(func, True, structural, extract, compact, adaptive, latency, keep_alive)
 
     # Type checker complains if we assign directly.
-    setattr(func, 'dispatch', replacement)
+    setattr(func, 'dispatch', dispatch_replacement)
+    setattr(func, 'dispatch_many', dispatch_many_replacement)
+    setattr(func, 'replace', replace_replacement)
+    setattr(func, 'override', override_replacement)
+    setattr(func, 'extend', extend)
+    setattr(func, 'vectorize', functools.partial(vectorize, func))
+    setattr(func, 'partitioned', functools.partial(Partitioned, func))
+    setattr(func, 'sharded', functools.partial(Sharded, func))
 
     return func
@@ -0,0 +1,54 @@
+""" Command line tools, e.g. python -m dynamic_dispatch compile pkg.module:dispatcher -o pkg/compiled.py """
+
+import argparse
+import sys
+from typing import List, Optional
+
+from ._aot import compile_module, generate
+from ._import import load
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the command given by argv.
+
+    :param argv: command line arguments, or None for those of the process.
+    :returns: exit status.
+    """
+    parser = argparse.ArgumentParser(prog='python -m dynamic_dispatch')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    compiler = commands.add_parser(
+        'compile', help='generate a module equivalent to a dispatch function, to import instead of registering',
+        description='Generates a plain module defining a function equivalent to a fully registered dispatch '
+                    'function, with its registry as a literal table, which imports its implementations but runs no '
+                    'decorators.')
+    compiler.add_argument('target', help='dispatch function, as module:name')
+    compiler.add_argument('-o', '--output', help='path to write the module to, rather than printing it')
+    compiler.add_argument('--check', action='store_true',
+                          help='only check that the module at output is up to date, exiting with 1 if not')
+
+    args = parser.parse_args(argv)
+    if args.check and args.output is None:
+        parser.error('--check requires --output')
+
+    try:
+        if args.output is None:
+            print(generate(load(args.target), args.target), end='')
+            return 0
+
+        current = compile_module(args.target, args.output, check=args.check)
+    except (ImportError, AttributeError, ValueError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+
+    if args.check and not current:
+        print(f'{args.output} is out of date with {args.target}', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+""" Finding the hottest dispatch values, to specialize entry points for them. """
+
+import collections
+import os
+import threading
+import time
+import types
+import weakref
+from typing import Any, Dict, Hashable, List, Optional
+
+
+class HotValues:
+    """
+    Counts a sample of dispatch values, and periodically picks the hottest of them.
+
+    :param interval: number of calls per sample.
+    :param window: number of samples to pick the hottest values from.
+    :param top: most values to pick.
+    :param share: least share of the samples for a value to be picked.
+    """
+
+    def __init__(self, interval: int = 16, window: int = 256, top: int = 2, share: float = 0.2):
+        self.interval = interval
+        self.window = window
+        self.top = top
+        self.share = share
+
+        self._counts = collections.Counter()
+        self._samples = 0
+
+    def sample(self, value: Hashable) -> Optional[List[Hashable]]:
+        """
+        Counts value, ending the window if it is full.
+
+        :param value: sampled dispatch value.
+        :returns: the hottest values, hottest first, if the window ended.
+        """
+        self._counts[value] += 1
+        self._samples += 1
+        if self._samples < self.window:
+            return None
+
+        hot = [value for value, count in self._counts.most_common(self.top) if count >= self.share * self._samples]
+        self._counts.clear()
+        self._samples = 0
+        return hot
+
+
+class Resampler:
+    """
+    Periodically has adaptive entry points sample their calls again, so that they
+    notice traffic shifting without counting every call once specialized.
+
+    Entry points are referred to weakly, from a daemon thread started for the first
+    of them, and restarted in children forked once it is running.
+
+    :param period: seconds between resampling.
+    """
+
+    def __init__(self, period: float):
+        self.period = period
+
+        self._lock = threading.Lock()
+        self._entries = weakref.WeakSet()
+        self._thread = None
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forked)
+
+    def add(self, entry):
+        """ Resamples the given entry point, which must have a resample() method, from now on. """
+        with self._lock:
+            self._entries.add(entry)
+            if self._thread is None:
+                self._start()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='dynamic-dispatch-resampler', daemon=True)
+        self._thread.start()
+
+    def _forked(self):
+        # Only the forking thread survives, and the lock may have been held by another.
+        self._lock = threading.Lock()
+        self._thread = None
+        if self._entries:
+            self._start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.period)
+            with self._lock:
+                entries = list(self._entries)
+
+            for entry in entries:
+                entry.resample()
+
+            # Not kept alive by this frame until the next period.
+            entries = entry = None
+
+
+# Shared by all adaptive entry points.
+RESAMPLER = Resampler(period=1.0)
+
+
+def with_constants(code: types.CodeType, constants: Dict[str, Any]) -> types.CodeType:
+    """
+    Replaces placeholder string constants of code with arbitrary objects.
+
+    Generated code refers to objects as constants rather than globals, so that
+    replacing the code itself swaps them all at once.
+
+    :param code: code compiled with placeholders.
+    :param constants: objects by placeholder.
+    :returns: code with the objects in place of their placeholders.
+    """
+    consts = tuple(constants.get(const, const) if type(const) is str else const for const in code.co_consts)
+
+    if hasattr(code, 'replace'):
+        return code.replace(co_consts=consts)
+
+    # Python 3.7 has no CodeType.replace().
+    return types.CodeType(code.co_argcount, code.co_kwonlyargcount, code.co_nlocals, code.co_stacksize,
+                          code.co_flags, code.co_code, consts, code.co_names, code.co_varnames, code.co_filename,
+                          code.co_name, code.co_firstlineno, code.co_lnotab, code.co_freevars, code.co_cellvars)
@@ -0,0 +1,181 @@
+""" Compiling dispatch functions ahead of time, into plain modules which need no registration. """
+
+import ast
+import inspect
+import operator
+import re
+from typing import Any, Callable
+
+from ._compile import entry_source, given
+from ._func import _arguments, _call
+from ._import import importable, load
+
+# Names the generated module defines itself, which the dispatch function mustn't shadow.
+_DEFINED = frozenset(('inspect', 'operator', '_arguments', '_call', '_lookup', '_default', '_generic', '_extract',
+                      '_missing', '_given', '_TABLE'))
+
+
+def _literal(value: Any, what: str) -> str:
+    """ Source of value, if it is a literal which evaluates back to an equal value of the same type. """
+    source = repr(value)
+    try:
+        same = ast.literal_eval(source)
+    except (ValueError, SyntaxError):
+        same = None
+
+    if type(same) is not type(value) or same != value:
+        raise ValueError(f'{what} {value!r} has no literal form, so cannot be compiled')
+
+    return source
+
+
+def generate(dispatcher: Callable, target: str) -> str:
+    """
+    Generates a module defining a plain function equivalent to a dispatch function.
+
+    The module holds the registry as a literal table, imports the implementations
+    from where they are defined, and defines the entry point and the adaptation of
+    arguments to implementations as dispatch would. Importing it runs no decorators
+    and inspects no signatures, unless the dispatch function is its own default, which
+    is then imported through it. Only functions whose implementations are plain,
+    importable by name, and registered for literal dispatch values can be compiled,
+    so not those registered with the dispatch decorator under a throwaway name like _.
+
+    :param dispatcher: dispatch function, fully registered.
+    :param target: where dispatcher is imported from, as module:name.
+    :returns: the source of the module.
+    """
+    describe = getattr(dispatcher, '_describe', None)
+    if describe is None:
+        raise ValueError(f'{target} is not a dispatch function, only those can be compiled')
+
+    description = describe()
+    name = description['name']
+    if description['structural']:
+        raise ValueError(f'{name} dispatches structurally, structural dispatch values cannot be compiled')
+    if name in _DEFINED or name.startswith('_ref_'):
+        raise ValueError(f'{name} would shadow the generated module\'s own names')
+
+    # Implementations are imported by alias, once per module-level name they are reached through.
+    aliases = {}
+    imports = {}
+
+    def reference(obj: Any, what: str) -> str:
+        if obj is getattr(dispatcher, '__wrapped__', None):
+            # The default implementation is shadowed by the dispatcher it was decorated as, so is reached through it.
+            module, top, attrs = importable(dispatcher, what)
+            attrs = attrs + ['__wrapped__']
+        else:
+            module, top, attrs = importable(obj, what)
+        alias = aliases.get((module, top))
+        if alias is None:
+            alias = aliases[module, top] = f'_ref_{len(aliases)}'
+            imports.setdefault(module, []).append(f'{top} as {alias}')
+
+        return '.'.join([alias] + attrs)
+
+    table = ''.join(
+        f'    {_literal(value, "dispatch value")}: ({reference(impl, f"implementation for {value!r}")}, {idx!r}),\n'
+        for value, (impl, idx) in description['entries'].items()
+    )
+
+    default = description['default']
+    default = 'None' if default is None else f'({reference(default[0], "default implementation")}, {default[1]!r})'
+
+    extract = description['extract']
+    if extract is None:
+        extract_source = ''
+    elif type(extract) in (operator.attrgetter, operator.itemgetter):
+        _, args = extract.__reduce__()
+        args = ', '.join(_literal(arg, 'dispatch attribute or item') for arg in args)
+        extract_source = f'_extract = operator.{type(extract).__name__}({args})\n'
+    else:
+        raise ValueError(f'{name} extracts its dispatch value with {extract!r}, only on_attr and on_item can be '
+                         f'compiled')
+
+    key, offset = description['key'], description['offset']
+    generic = (
+        f'def _generic(*args, **kwargs):\n'
+        f'    if {key!r} in kwargs:\n'
+        f'        value = kwargs[{key!r}]\n'
+        f'    elif len(args) > {offset}:\n'
+        f'        value = args[{offset}]\n'
+        f'    else:\n'
+        f'        raise TypeError({f"missing dispatch parameter {key!r} on {name}"!r})\n'
+        + ('' if extract is None else '    value = _extract(value)\n') +
+        f'\n'
+        f'    entry = _lookup(value, _default)\n'
+        f'    if entry is None:\n'
+        f"        raise ValueError(f'no registered implementations for {{value!r}} for {name}')\n"
+        f'\n'
+        f'    impl, idx = entry\n'
+        f'    return _call(impl, idx, {key!r}, {offset}, args, kwargs)\n'
+    )
+
+    entry = entry_source(description['parameters'], offset, extract=extract is not None)
+    if entry is None:
+        entry = f'def {name}(*args, **kwargs):\n    return _generic(*args, **kwargs)\n'
+    else:
+        entry = entry.replace('def dispatch(', f'def {name}(', 1)
+
+    # The same adaptation of arguments as dispatch, without importing inspect, which takes longer than the rest.
+    helpers = f'{inspect.getsource(_arguments)}\n\n{inspect.getsource(_call)}'
+    helpers = re.sub(r'inspect\.isclass\((\w+)\)', r'isinstance(\1, type)', helpers)
+    given_source = re.sub(r'\bMISSING\b', '_missing', inspect.getsource(given))
+    helpers += '\n\n' + given_source.replace('def given(', 'def _given(', 1)
+
+    modules = ['inspect'] if 'inspect.' in helpers else []
+    if extract is not None:
+        modules.append('operator')
+
+    header = f'""" Generated from {target} by python -m dynamic_dispatch compile, do not edit. """\n\n' \
+        f'from __future__ import annotations\n\n'
+    if modules:
+        header += ''.join(f'import {module}\n' for module in modules) + '\n'
+    if imports:
+        header += ''.join(f'from {module} import {", ".join(names)}\n' for module, names in imports.items()) + '\n'
+
+    return (
+        f'{header}'
+        f'__all__ = ({name!r},)\n'
+        f'\n'
+        f'_TABLE = {{\n'
+        f'{table}'
+        f'}}\n'
+        f'_lookup = _TABLE.get\n'
+        f'_default = {default}\n'
+        f'_missing = object()\n'
+        f'{extract_source}'
+        f'\n'
+        f'\n'
+        f'{helpers}'
+        f'\n'
+        f'\n'
+        f'{generic}'
+        f'\n'
+        f'\n'
+        f'{entry}'
+    )
+
+
+def compile_module(target: str, output: str, check: bool = False) -> bool:
+    """
+    Writes the module generated for target to output, or checks that it is up to date.
+
+    :param target: dispatch function to compile, as module:name.
+    :param output: path of the module.
+    :param check: whether to only check output rather than writing it.
+    :returns: whether output is up to date, before any writing.
+    """
+    source = generate(load(target), target)
+    try:
+        with open(output, encoding='utf-8') as file:
+            current = file.read() == source
+    except FileNotFoundError:
+        current = False
+
+    if not check and not current:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(source)
+
+    return current
@@ -0,0 +1,125 @@
+""" Load balancing between several implementations registered for one dispatch value. """
+
+import asyncio
+import bisect
+import concurrent.futures
+import functools
+import inspect
+import itertools
+import random
+import threading
+from typing import Callable, Optional, Tuple
+
+
+class Balancer:
+    """
+    Interchangeable implementations for one dispatch value, one of which is chosen per call.
+
+    Balancers are immutable once published; with_member() returns a new balancer with an
+    additional member, so the registry can swap them like any other entry.
+
+    :param call: calls a member's implementation with dispatch's arguments, given (impl, idx, args, kwargs).
+    :param members: implementations and the index of the dispatch param in each.
+    :param weights: relative weight of each member.
+    """
+
+    strategy = None
+
+    def __init__(self, call: Callable, members: Tuple[Tuple[Callable, Optional[int]], ...] = (),
+                 weights: Tuple[float, ...] = ()):
+        self._call = call
+        self.members = members
+        self.weights = weights
+
+    def with_member(self, impl: Callable, idx: Optional[int], weight: float) -> 'Balancer':
+        if weight <= 0:
+            raise ValueError(f'weight must be positive, got {weight!r}')
+
+        return type(self)(self._call, self.members + ((impl, idx),), self.weights + (weight,))
+
+    def select(self) -> int:
+        """ Chooses the index of the member to call. """
+        raise NotImplementedError
+
+    def __call__(self, *args, **kwargs):
+        impl, idx = self.members[self.select()]
+        return self._call(impl, idx, args, kwargs)
+
+
+class RoundRobin(Balancer):
+    strategy = 'round_robin'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Advancing a count is atomic, so concurrent callers never share a turn.
+        self._turns = itertools.count()
+
+    def select(self) -> int:
+        return next(self._turns) % len(self.members)
+
+
+class Random(Balancer):
+    strategy = 'random'
+
+    def select(self) -> int:
+        return random.randrange(len(self.members))
+
+
+class Weighted(Balancer):
+    strategy = 'weighted'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bounds = list(itertools.accumulate(self.weights))
+
+    def select(self) -> int:
+        return bisect.bisect_right(self._bounds, random.random() * self._bounds[-1])
+
+
+class LeastInFlight(Balancer):
+    strategy = 'least_in_flight'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight = [0] * len(self.members)
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> Tuple[int, ...]:
+        """ Number of calls currently in progress on each member. """
+        return tuple(self._in_flight)
+
+    def __call__(self, *args, **kwargs):
+        # Held only to pick and count, never during the call itself.
+        with self._lock:
+            i = min(range(len(self._in_flight)), key=self._in_flight.__getitem__)
+            self._in_flight[i] += 1
+
+        try:
+            impl, idx = self.members[i]
+            result = self._call(impl, idx, args, kwargs)
+        except BaseException:
+            self._finished(i)
+            raise
+
+        # Coroutines and submitted calls return before their work is done, and are in flight until it is.
+        if isinstance(result, (concurrent.futures.Future, asyncio.Future)):
+            result.add_done_callback(functools.partial(self._finished, i))
+        elif inspect.iscoroutine(result):
+            return self._awaited(i, result)
+        else:
+            self._finished(i)
+
+        return result
+
+    async def _awaited(self, i: int, coroutine):
+        try:
+            return await coroutine
+        finally:
+            self._finished(i)
+
+    def _finished(self, i: int, future=None):
+        with self._lock:
+            self._in_flight[i] -= 1
+
+
+STRATEGIES = {balancer.strategy: balancer for balancer in (RoundRobin, Random, Weighted, LeastInFlight)}
@@ -0,0 +1,126 @@
+""" Coalescing concurrent asyncio calls into calls to batch implementations. """
+
+import asyncio
+import inspect
+from typing import Callable, Dict, Optional
+
+
+class Batch:
+    """
+    Collects calls made on an event loop and passes them to an implementation in batches.
+
+    A batch is sent once window seconds have passed since its first call, or as soon
+    as it holds size calls. The implementation takes one list per positional argument,
+    holding that argument of each call in the batch, whether given positionally or by
+    name, and returns, or resolves to, a sequence with one result per call. Each call
+    returns an asyncio future resolving to its own result, or to the exception raised
+    by the batch.
+
+    :param arguments: adapts dispatch's arguments to impl, given (impl, idx, args, kwargs).
+    :param impl: batch implementation.
+    :param idx: index of the dispatch param in the signature of impl.
+    :param window: seconds to wait for more calls before sending a batch.
+    :param size: most calls per batch, or None for no limit.
+    """
+
+    def __init__(self, arguments: Callable, impl: Callable, idx: Optional[int], window: float = 0,
+                 size: Optional[int] = None):
+        if window < 0:
+            raise ValueError(f'batch window must not be negative, got {window!r}')
+        if size is not None and size < 1:
+            raise ValueError(f'batch size must be positive, got {size!r}')
+
+        self.impl = impl
+        self.window = window
+        self.size = size
+        self._arguments = arguments
+        self._idx = idx
+        self._signature = inspect.signature(impl)
+
+        # Batches being collected, and the timers which will send them, by event loop.
+        self._pending = {}
+        self._timers = {}
+
+        # Event loops only keep weak references to tasks, so those running batches are kept here until done.
+        self._running = set()
+
+        self._batches = 0
+        self._calls = 0
+        self._largest = 0
+
+    def __call__(self, *args, **kwargs) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+
+        args, kwargs = self._arguments(self.impl, self._idx, args, kwargs)
+        if kwargs:
+            # Arguments given by name are batched by their position, which they must have.
+            bound = self._signature.bind(*args, **kwargs)
+            if bound.kwargs:
+                raise TypeError(f'batched calls take positional arguments only, got {sorted(bound.kwargs)}')
+            args = bound.args
+
+        future = loop.create_future()
+
+        pending = self._pending.get(loop)
+        if pending is None:
+            pending = self._pending[loop] = []
+            self._timers[loop] = loop.call_later(self.window, self._send, loop)
+
+        pending.append((args, future))
+        if self.size is not None and len(pending) >= self.size:
+            self._send(loop)
+
+        return future
+
+    def stats(self) -> Dict[str, float]:
+        """ Number of batches sent and calls in them, and the largest and mean batch size. """
+        return {
+            'batches': self._batches,
+            'calls': self._calls,
+            'largest_batch': self._largest,
+            'mean_batch': self._calls / self._batches if self._batches else 0,
+        }
+
+    def _send(self, loop: asyncio.AbstractEventLoop):
+        pending = self._pending.pop(loop)
+        self._timers.pop(loop).cancel()
+
+        self._batches += 1
+        self._calls += len(pending)
+        self._largest = max(self._largest, len(pending))
+
+        task = loop.create_task(self._run(pending))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, pending):
+        try:
+            await self._resolve(pending)
+        finally:
+            # Cancelled, e.g. by the loop closing, callers waiting on the batch are cancelled too.
+            for _, future in pending:
+                future.cancel()
+
+    async def _resolve(self, pending):
+        try:
+            if len({len(args) for args, _ in pending}) > 1:
+                raise TypeError('batched calls must all pass the same number of arguments')
+
+            columns = [list(column) for column in zip(*(args for args, _ in pending))]
+            results = self.impl(*columns)
+            if inspect.isawaitable(results):
+                results = await results
+
+            results = list(results)
+            if len(results) != len(pending):
+                raise ValueError(f'batch of {len(pending)} calls returned {len(results)} results')
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(pending, results):
+            # Callers may have given up waiting.
+            if not future.done():
+                future.set_result(result)
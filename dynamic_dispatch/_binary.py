@@ -0,0 +1,150 @@
+""" Routing framed binary messages and records on a header, without copying their bodies. """
+
+import array
+import mmap
+import os
+import struct
+from typing import Callable, Dict, List, Optional
+
+
+def _bytes(buffer) -> memoryview:
+    """ Flat, byte-addressed view of buffer, without copying it. """
+    view = memoryview(buffer)
+    if view.ndim != 1 or view.format not in ('B', 'b', 'c'):
+        view = view.cast('B')
+
+    return view
+
+
+def route(dispatch: Callable, header: struct.Struct, frame, *args, **kwargs):
+    """
+    Dispatches a frame on the value of its header, passing a view of the rest as the body.
+
+    :param dispatch: dispatch function to call, with the header value and body first.
+    :param header: layout of the header at the start of each frame.
+    :param frame: bytes-like frame.
+    :returns: the result of the implementation.
+    """
+    view = _bytes(frame)
+    values = header.unpack_from(view)
+
+    return dispatch(values[0] if len(values) == 1 else values, view[header.size:], *args, **kwargs)
+
+
+def feed(dispatch: Callable, header: struct.Struct, prefix: struct.Struct, buffer, *args, **kwargs) -> int:
+    """
+    Routes each complete length-prefixed frame in buffer, as route() would.
+
+    Frames are the prefix, giving the length of the rest of the frame, followed by
+    the header and body. Bodies are views of buffer, so implementations must copy
+    anything they keep. A partial frame at the end is left for the caller to feed
+    again once the rest of it has arrived.
+
+    :param dispatch: dispatch function to call, with the header value and body first.
+    :param header: layout of the header at the start of each frame, after the prefix.
+    :param prefix: layout of the length at the start of each frame.
+    :param buffer: bytes-like stream of frames.
+    :returns: number of bytes consumed, i.e. the offset of the first incomplete frame.
+    """
+    view = _bytes(buffer)
+    size = len(view)
+
+    start = 0
+    with view:
+        while size - start >= prefix.size:
+            length, = prefix.unpack_from(view, start)
+            end = start + prefix.size + length
+            if end > size:
+                break
+            if length < header.size:
+                raise ValueError(f'frame at {start} of {length} bytes is shorter than its {header.size} byte header')
+
+            values = header.unpack_from(view, start + prefix.size)
+            dispatch(values[0] if len(values) == 1 else values, view[start + prefix.size + header.size:end],
+                     *args, **kwargs)
+            start = end
+
+    return start
+
+
+def process(dispatch: Callable, header: struct.Struct, prefix: struct.Struct, path, *args,
+            record_size: Optional[int] = None, chunk_size: Optional[int] = None, **kwargs) -> Dict:
+    """
+    Dispatches every record of a file in bulk, calling each implementation with a list of bodies.
+
+    The file is memory-mapped rather than read, and one pass over it collects the
+    offsets of the records of each header value. Each implementation is then called
+    with views of its records' bodies, all at once or in lists of up to chunk_size,
+    so no record is copied or dispatched on its own. Views are only valid during the
+    call, implementations must copy anything they keep.
+
+    :param dispatch: dispatch function to call, with the header value and bodies first.
+    :param header: layout of the header at the start of each record, after any prefix.
+    :param prefix: layout of the length at the start of each record, unless they are of record_size.
+    :param path: path of the file.
+    :param record_size: size of each record, including the header, if they are all the same size.
+    :param chunk_size: most records to pass in one call.
+    :returns: the results of the calls for each header value, in order.
+    """
+    if record_size is not None and record_size < header.size:
+        raise ValueError(f'records of {record_size} bytes are shorter than their {header.size} byte header')
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f'chunk size must be positive, got {chunk_size!r}')
+
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return {}
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # Start and end offsets of bodies, by value, flattened into compact arrays.
+            bounds = {}
+            start = 0
+            while start < size:
+                if record_size is not None:
+                    end = start + record_size
+                    body = start + header.size
+                else:
+                    if size - start < prefix.size:
+                        raise ValueError(f'truncated length prefix at {start} of {path}')
+                    length, = prefix.unpack_from(mapped, start)
+                    if length < header.size:
+                        raise ValueError(f'record at {start} of {length} bytes is shorter than its header')
+                    end = start + prefix.size + length
+                    body = start + prefix.size + header.size
+
+                if end > size:
+                    raise ValueError(f'truncated record at {start} of {path}')
+
+                values = header.unpack_from(mapped, body - header.size)
+                value = values[0] if len(values) == 1 else values
+
+                offsets = bounds.get(value)
+                if offsets is None:
+                    offsets = bounds[value] = array.array('Q')
+                offsets.append(body)
+                offsets.append(end)
+                start = end
+
+            view = memoryview(mapped)
+            try:
+                return {value: _calls(dispatch, view, value, offsets, chunk_size, args, kwargs)
+                        for value, offsets in bounds.items()}
+            finally:
+                # Any view still exported would keep the file from being unmapped.
+                view.release()
+
+
+def _calls(dispatch: Callable, view: memoryview, value, offsets: array.array, chunk_size: Optional[int],
+           args: tuple, kwargs: dict) -> List:
+    step = 2 * (chunk_size or len(offsets))
+    results = []
+    for i in range(0, len(offsets), step):
+        bodies = [view[offsets[j]:offsets[j + 1]] for j in range(i, min(i + step, len(offsets)), 2)]
+        try:
+            results.append(dispatch(value, bodies, *args, **kwargs))
+        finally:
+            for body in bodies:
+                body.release()
+
+    return results
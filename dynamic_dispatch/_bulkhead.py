@@ -0,0 +1,197 @@
+""" Limiting the number of concurrent calls to an implementation. """
+
+import asyncio
+import collections
+import concurrent.futures
+import inspect
+import threading
+import weakref
+from typing import Callable, Dict, Optional
+
+from ._executor import Submit
+
+
+class Rejected(RuntimeError):
+    """ Raised when a call would have to wait for a bulkhead whose queue is full. """
+
+
+class Bulkhead:
+    """
+    Lets at most limit calls to an implementation proceed at once; the rest wait their turn.
+
+    Coroutine functions are limited with an asyncio semaphore per event loop, and calls
+    return a coroutine; anything else is limited with a threading semaphore, blocking
+    the calling thread. Calls returning a future, e.g. submitted to an executor, hold
+    their slot until it is done. Submissions made from a running event loop mustn't
+    block it, so they wait their turn in a task instead. If queue is given, calls that
+    would wait behind that many others raise Rejected instead, so that callers fail
+    fast rather than pile up.
+
+    :param call: calls impl with dispatch's arguments, given (impl, idx, args, kwargs).
+    :param impl: implementation to limit.
+    :param idx: index of the dispatch param in the signature of impl.
+    :param limit: most calls in progress at once.
+    :param queue: most calls waiting at once, or None for no limit.
+    """
+
+    def __init__(self, call: Callable, impl: Callable, idx: Optional[int], limit: int, queue: Optional[int] = None):
+        if limit < 1:
+            raise ValueError(f'concurrency limit must be positive, got {limit!r}')
+        if queue is not None and queue < 0:
+            raise ValueError(f'queue limit must not be negative, got {queue!r}')
+
+        self.impl = impl
+        self.limit = limit
+        self.queue = queue
+        self._call = call
+        self._idx = idx
+
+        # Counters are changed under lock, never held while waiting or calling.
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._waits = 0
+        self._rejections = 0
+
+        # Turns of submissions waiting on event loops, handed the slots released before any blocked threads.
+        self._turns = collections.deque()
+
+        if inspect.iscoroutinefunction(impl):
+            # asyncio semaphores belong to the loop they are first used on.
+            self._semaphores = weakref.WeakKeyDictionary()
+            self._slots = None
+        else:
+            self._semaphores = None
+            self._slots = threading.BoundedSemaphore(limit)
+
+    def stats(self) -> Dict[str, int]:
+        """ Number of calls waiting now, and of calls which have had to wait or were rejected. """
+        return {'limit': self.limit, 'waiting': self._waiting, 'waits': self._waits, 'rejections': self._rejections}
+
+    def __call__(self, *args, **kwargs):
+        if self._slots is None:
+            return self._limited(args, kwargs)
+
+        if isinstance(self.impl, Submit):
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                return self._submit_from(loop, args, kwargs)
+
+        if not self._slots.acquire(blocking=False):
+            self._wait()
+            try:
+                self._slots.acquire()
+            finally:
+                self._done_waiting()
+
+        try:
+            result = self._call(self.impl, self._idx, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        if isinstance(result, (concurrent.futures.Future, asyncio.Future)):
+            result.add_done_callback(self._release)
+        else:
+            self._slots.release()
+
+        return result
+
+    def _release(self, future=None):
+        with self._lock:
+            while self._turns:
+                turn = self._turns.popleft()
+                if turn.cancelled():
+                    continue
+
+                try:
+                    turn.get_loop().call_soon_threadsafe(self._hand, turn)
+                except RuntimeError:
+                    # Its loop is closed.
+                    continue
+                return
+
+            self._slots.release()
+
+    def _hand(self, turn: asyncio.Future):
+        if turn.cancelled():
+            self._release()
+        else:
+            turn.set_result(None)
+
+    def _submit_from(self, loop: asyncio.AbstractEventLoop, args: tuple, kwargs: dict) -> asyncio.Future:
+        with self._lock:
+            if self._slots.acquire(blocking=False):
+                turn = None
+            else:
+                self._queue()
+                turn = loop.create_future()
+                self._turns.append(turn)
+
+        if turn is None:
+            return asyncio.wrap_future(self._submit(args, kwargs), loop=loop)
+
+        return loop.create_task(self._submit_after(turn, args, kwargs))
+
+    async def _submit_after(self, turn: asyncio.Future, args: tuple, kwargs: dict):
+        try:
+            await turn
+        except BaseException:
+            # Cancelled while waiting, it passes on the slot if it was already handed it.
+            if turn.done() and not turn.cancelled():
+                self._release()
+            raise
+        finally:
+            self._done_waiting()
+
+        return await asyncio.wrap_future(self._submit(args, kwargs))
+
+    def _submit(self, args: tuple, kwargs: dict) -> concurrent.futures.Future:
+        # Released by the submission itself rather than by a wrapping asyncio future, so not by the event loop.
+        try:
+            future = self._call(self.impl.submit, self._idx, args, kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    async def _limited(self, args: tuple, kwargs: dict):
+        loop = asyncio.get_running_loop()
+        slots = self._semaphores.get(loop)
+        if slots is None:
+            slots = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+
+        if slots.locked():
+            self._wait()
+            try:
+                await slots.acquire()
+            finally:
+                self._done_waiting()
+        else:
+            await slots.acquire()
+
+        try:
+            return await self._call(self.impl, self._idx, args, kwargs)
+        finally:
+            slots.release()
+
+    def _wait(self):
+        with self._lock:
+            self._queue()
+
+    def _queue(self):
+        """ Counts a call as waiting, unless the queue is full. Called under lock. """
+        if self.queue is not None and self._waiting >= self.queue:
+            self._rejections += 1
+            raise Rejected(f'{self.limit} calls to {self.impl!r} in progress and {self._waiting} waiting')
+
+        self._waiting += 1
+        self._waits += 1
+
+    def _done_waiting(self):
+        with self._lock:
+            self._waiting -= 1
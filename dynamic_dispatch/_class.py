@@ -2,17 +2,76 @@
 
 import functools
 import inspect
-from typing import Hashable, Type, TypeVar, Callable, Union
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Hashable, Mapping, Optional, Type, TypeVar, Callable, Union
 
 from ._typeguard import typechecked
 
 from ._func import func_dispatch
+from ._shm import SharedMemoryExecutor
 
 T_co = TypeVar('T_co', covariant=True)
 
 
+def _registrable(typ: Type[T_co], wrap: Union[Type[T_co], Callable[..., T_co]]):
+    """
+    Prepares a class or factory function for registration on a dispatch class.
+
+    :param typ: class being dispatched.
+    :param wrap: subclass or function returning a subclass of typ.
+    :returns: implementation to register and the parameters it takes.
+    """
+    if not inspect.isclass(wrap):
+        ret = inspect.signature(wrap).return_annotation
+        if ret == inspect.Parameter.empty:
+            raise TypeError(f'function {wrap.__name__} must have annotated return type') from None
+
+        if ret is not None and issubclass(ret, typ):
+            # It's a function that returns a subtype of the dispatch class, let's allow this.
+            return wrap, inspect.signature(wrap).parameters
+        else:
+            raise TypeError(f'{wrap.__name__} may not be registered for dispatch on {typ.__name__}'
+                            f'as its return type {ret!r} does not subclass the dispatch type.')
+    elif not issubclass(wrap, typ):
+        raise TypeError(f'only subclasses of {typ.__name__} can be registered for dynamic dispatch')
+    else:
+        @functools.wraps(wrap, updated=())
+        class Registered(wrap):
+            __dispatch_init = True
+
+            def __init__(self, *args, **kwargs):
+                # Certain scenarios can cause __init__ to be called twice. This prevents it.
+                if self.__class__ == __class__ and not self.__dispatch_init:
+                    return
+
+                self.__dispatch_init = False
+                super().__init__(*args, **kwargs)
+
+        return Registered, inspect.signature(wrap.__init__).parameters
+
+
+def _check_executor(wrap: Union[Type[T_co], Callable[..., T_co]], executor: Optional[Executor]):
+    """
+    Refuses to instantiate a subclass on a process pool, which could never unpickle the
+    class it is registered as, as that is defined here rather than importable by name.
+    """
+    if isinstance(executor, SharedMemoryExecutor):
+        executor = executor.executor
+    if inspect.isclass(wrap) and isinstance(executor, ProcessPoolExecutor):
+        raise TypeError(f'{wrap.__name__} cannot be instantiated on a process pool, register a module-level '
+                        f'function taking cls and returning an instance of it instead')
+
+
+def _construct(new: Callable, cls: type, *args, **kwargs):
+    """ Instantiates cls with the given __new__, as instantiating it would. """
+    instance = new(cls, *args, **kwargs)
+    instance.__init__(*args, **kwargs)
+    return instance
+
+
 @typechecked
-def class_dispatch(typ: Type[T_co], default: Hashable):
+def class_dispatch(typ: Type[T_co], default: Hashable, *, structural: bool = False,
+                   extract: Optional[Callable] = None, compact: bool = False):
     """
     Value-based dynamic-dispatch class decorator.
 
@@ -20,10 +79,18 @@ def class_dispatch(typ: Type[T_co], default: Hashable):
     behaviors depending upon the value of its first positional parameter.
     The decorated class acts as the default implementation, if default is
     specified, and additional classes may be registered using the dispatch()
-    static function of the dispatch class.
+    static function of the dispatch class. Registrations may also be changed
+    with replace(), unregister(), update() and override(), as for dispatch
+    functions. Classes registered with an executor are instantiated on it, and
+    instantiating the dispatch class returns a future of the instance instead. Only
+    functions returning instances can be registered with a process pool, as classes
+    are registered wrapped, and so cannot be pickled.
 
     :param typ: class to add dynamic dispatch to.
     :param default: whether or not to default when given an unregistered value.
+    :param structural: whether to allow unhashable dispatch values, keyed by structure.
+    :param extract: gets the dispatch value from the dispatch param, if not the param itself.
+    :param compact: whether to store the registry compactly, for very many dispatch values.
     :returns: dispatch class.
     """
     if inspect.isabstract(typ) and default:
@@ -34,45 +101,75 @@ def class_dispatch(typ: Type[T_co], default: Hashable):
     class Dispatcher(typ):
         # Dynamic dispatch on a class is equivalent to dynamic dispatch on __new__.
         # Note: the parameters for dispatch here are those of __init__ instead.
-        @func_dispatch(default=default, clazz=typ)
+        @func_dispatch(default=default, clazz=typ, structural=structural, extract=extract, compact=compact)
         def __new__(cls, *args, **kwargs):
             return super().__new__(cls)
 
         @classmethod
         @typechecked(always=True)
-        def dispatch(cls, wrap: Union[Type[T_co], Callable[..., T_co]] = None, *, on: Hashable):
+        def dispatch(cls, wrap: Union[Type[T_co], Callable[..., T_co]] = None, *, on: Any, **options):
             if wrap is None:
-                return functools.partial(cls.dispatch, on=on)
-
-            if not inspect.isclass(wrap):
-                ret = inspect.signature(wrap).return_annotation
-                if ret == inspect.Parameter.empty:
-                    raise TypeError(f'function {wrap.__name__} must have annotated return type') from None
-
-                if ret is not None and issubclass(ret, typ):
-                    # It's a function that returns a subtype of the dispatch class, let's allow this.
-                    cls.__new__.dispatch(wrap, arguments=inspect.signature(wrap).parameters, on=on)
-                    return wrap
-                else:
-                    raise TypeError(f'{wrap.__name__} may not be registered for dispatch on {typ.__name__}'
-                                    f'as its return type {ret!r} does not subclass the dispatch type.')
-            elif not issubclass(wrap, typ):
-                raise TypeError(f'only subclasses of {typ.__name__} can be registered for dynamic dispatch')
+                return functools.partial(cls.dispatch, on=on, **options)
+
+            _check_executor(wrap, options.get('executor'))
+            impl, arguments = _registrable(typ, wrap)
+            cls.__new__.dispatch(impl, arguments=arguments, on=on, **options)
+
+            return impl
+
+        @classmethod
+        def dispatch_many(cls, table: Mapping[Any, Union[Type[T_co], Callable[..., T_co]]], **options):
+            # Each distinct class is only prepared once, so values registered together share it.
+            registrable = {}
+            for wrap in table.values():
+                if id(wrap) not in registrable:
+                    _check_executor(wrap, options.get('executor'))
+                    registrable[id(wrap)] = _registrable(typ, wrap)
+
+            cls.__new__.dispatch_many({on: registrable[id(wrap)] for on, wrap in table.items()}, **options)
+
+        @classmethod
+        @typechecked(always=True)
+        def replace(cls, wrap: Union[Type[T_co], Callable[..., T_co]] = None, *, on: Any, **options):
+            if wrap is None:
+                return functools.partial(cls.replace, on=on, **options)
+
+            _check_executor(wrap, options.get('executor'))
+            impl, arguments = _registrable(typ, wrap)
+            cls.__new__.replace(impl, arguments=arguments, on=on, **options)
+
+            return impl
+
+        @classmethod
+        def unregister(cls, on: Any):
+            cls.__new__.unregister(on)
+
+        @classmethod
+        def resolve(cls, value: Any):
+            new = cls.__new__
+            resolved = new.resolve(value)
+            if resolved is None:
+                return None
+
+            if resolved.args[:1] == (new.__wrapped__,):
+                # The default __new__ leaves __init__ to instantiation, which would dispatch again.
+                resolved = functools.partial(_construct, new.__wrapped__, cls)
             else:
-                @functools.wraps(wrap, updated=())
-                class Registered(wrap):
-                    __dispatch_init = True
+                resolved = functools.partial(resolved, cls)
 
-                    def __init__(self, *args, **kwargs):
-                        # Certain scenarios can cause __init__ to be called twice. This prevents it.
-                        if self.__class__ == __class__ and not self.__dispatch_init:
-                            return
+            resolved.version = new.version
+            return resolved
 
-                        self.__dispatch_init = False
-                        super().__init__(*args, **kwargs)
+        @classmethod
+        def stats(cls, on: Any):
+            return cls.__new__.stats(on)
 
-                cls.__new__.dispatch(Registered, arguments=inspect.signature(wrap.__init__).parameters, on=on)
+        @classmethod
+        def update(cls):
+            return cls.__new__.update()
 
-                return Registered
+        @classmethod
+        def override(cls, overlay: Mapping[Any, Union[Type[T_co], Callable[..., T_co]]]):
+            return cls.__new__.override({on: _registrable(typ, wrap) for on, wrap in overlay.items()})
 
     return Dispatcher
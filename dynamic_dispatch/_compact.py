@@ -0,0 +1,183 @@
+""" Compact storage for registries with many dispatch values sharing few implementations. """
+
+import array
+from typing import Hashable, Iterator, Mapping, Optional, Tuple
+
+# Dense int keys may leave at most this many unused slots per key, plus some slack.
+_SPARSITY = 4
+_SLACK = 1 << 16
+
+
+class CompactRegistry:
+    """
+    Registry storing each distinct entry once, and keys as indices of entries.
+
+    Non-negative int keys index an array of entry numbers directly, as long as they
+    are reasonably dense, at two or four bytes per slot rather than a dict item, a
+    key object and an entry per key. Other keys map to entry numbers in a dict.
+
+    Reads are safe concurrently with a single writer, as with dict. As in a dict, other
+    numbers equal to an int key, e.g. NumPy integers, are the same key, though finding
+    them takes a second lookup.
+    """
+
+    def __init__(self):
+        # Distinct entries, the number of keys referring to each, and free slots.
+        self._entries = [None]
+        self._counts = [0]
+        self._free = []
+        self._slots = {}
+
+        # Entry numbers by int key, 0 for none, and by any other key.
+        self._dense = array.array('H')
+        self._sparse = {}
+        self._size = 0
+
+    def get(self, key: Hashable, default=None):
+        if (type(key) is int or type(key) is bool) and 0 <= key < len(self._dense):
+            slot = self._dense[key]
+            if slot:
+                return self._entries[slot]
+
+        # Int keys which were too sparse when set remain here.
+        slot = self._sparse.get(key)
+        if slot is None and type(key) is not int and type(key) is not bool:
+            index = self._equal_index(key)
+            if index is not None:
+                slot = self._dense[index]
+
+        return default if slot is None else self._entries[slot]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: Hashable) -> Tuple:
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+
+        return entry
+
+    def __setitem__(self, key: Hashable, entry: Tuple):
+        key = self._normalize(key)
+
+        # Acquired before the old entry is released, so readers never see a freed slot.
+        slot = self._acquire(entry)
+        if key not in self._sparse and self._dense_key(key):
+            old, self._dense[key] = self._dense[key], slot
+        else:
+            old = self._sparse.get(key, 0)
+            self._sparse[key] = slot
+
+        if old:
+            self._release(old)
+        else:
+            self._size += 1
+
+    def __delitem__(self, key: Hashable):
+        key = self._normalize(key)
+        if (type(key) is int or type(key) is bool) and 0 <= key < len(self._dense) and self._dense[key]:
+            slot, self._dense[key] = self._dense[key], 0
+        else:
+            slot = self._sparse.pop(key)
+
+        self._release(slot)
+        self._size -= 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Hashable]:
+        for key, slot in enumerate(self._dense):
+            if slot:
+                yield key
+
+        yield from self._sparse
+
+    def items(self) -> Iterator[Tuple[Hashable, Tuple]]:
+        for key in self:
+            yield key, self[key]
+
+    def update(self, entries: Mapping[Hashable, Tuple]):
+        for key, entry in entries.items():
+            self[key] = entry
+
+    def copy(self) -> 'CompactRegistry':
+        other = type(self)()
+        other._entries = list(self._entries)
+        other._counts = list(self._counts)
+        other._free = list(self._free)
+        other._slots = dict(self._slots)
+        other._dense = array.array(self._dense.typecode, self._dense)
+        other._sparse = dict(self._sparse)
+        other._size = self._size
+        return other
+
+    def _equal_index(self, key: Hashable) -> Optional[int]:
+        """ Index of the int key stored densely which key equals, if any. """
+        # Numbers equal to an int hash the same as it, as dicts rely on.
+        index = hash(key)
+        if 0 <= index < len(self._dense) and self._dense[index] and key == index:
+            return index
+
+        return None
+
+    def _normalize(self, key: Hashable) -> Hashable:
+        """ The int key stored densely which key equals, if any, so that they are changed as one key. """
+        if type(key) is int or type(key) is bool or key in self._sparse:
+            return key
+
+        index = self._equal_index(key)
+        return key if index is None else index
+
+    def _dense_key(self, key: Hashable) -> bool:
+        if type(key) is not int and type(key) is not bool:
+            return False
+        if key < 0 or key >= _SPARSITY * (self._size + 1) + _SLACK:
+            return False
+
+        if key >= len(self._dense):
+            # Grow geometrically, so that ascending keys are amortized.
+            grow = max(key + 1, 2 * len(self._dense)) - len(self._dense)
+            self._dense.frombytes(bytes(grow * self._dense.itemsize))
+
+        return True
+
+    def _acquire(self, entry: Tuple) -> int:
+        try:
+            slot = self._slots.get(entry)
+        except TypeError:
+            # Unhashable implementations can't be shared, but can still be stored.
+            slot = None
+
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._entries[slot] = entry
+            else:
+                slot = len(self._entries)
+                self._entries.append(entry)
+                self._counts.append(0)
+
+                if slot >= 1 << (8 * self._dense.itemsize):
+                    self._dense = array.array('I', self._dense)
+
+            try:
+                self._slots[entry] = slot
+            except TypeError:
+                pass
+
+        self._counts[slot] += 1
+        return slot
+
+    def _release(self, slot: int):
+        self._counts[slot] -= 1
+        if not self._counts[slot]:
+            # Unregistered implementations aren't kept alive, and their slot is reused.
+            try:
+                self._slots.pop(self._entries[slot], None)
+            except TypeError:
+                pass
+
+            self._entries[slot] = None
+            self._free.append(slot)
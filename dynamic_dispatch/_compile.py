@@ -0,0 +1,195 @@
+""" Generates dispatch entry points specialized to the signature of the dispatch function. """
+
+import inspect
+import sys
+from typing import Callable, Dict, Optional, Sequence
+
+# Names the generated code uses itself, which parameters therefore must not shadow.
+_RESERVED = frozenset(('_lookup', '_default', '_generic', '_overlays', '_overlay', '_extract', '_value', '_args',
+                       '_kwargs', '_entry', '_impl', '_idx', '_countdown', '_sample', '_ticks', '_timed', '_missing',
+                       '_given'))
+
+
+class _Missing:
+    """ Default of every parameter of an entry point, so that calls omitting some can be told apart. """
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return '<missing>'
+
+
+MISSING = _Missing()
+
+
+def given(generic: Callable, values: tuple, kwargs: dict):
+    """
+    Calls generic with only the arguments an entry point was actually given, for calls omitting some.
+
+    :param generic: generic dispatch.
+    :param values: values of the parameters of the entry point, MISSING for those omitted.
+    :param kwargs: any keyword args given.
+    :returns: result of generic.
+    """
+    # Parameters are positional-only, so those given precede those omitted.
+    args = []
+    for value in values:
+        if value is MISSING:
+            break
+        args.append(value)
+
+    return generic(*args, **kwargs)
+
+
+def entry_source(parameters: Sequence[inspect.Parameter], offset: int, overlay: bool = False,
+                 extract: bool = False, sample: bool = False,
+                 hot: Sequence[Optional[int]] = (), timed: bool = False) -> Optional[str]:
+    """
+    Generates the source of an entry point that spells out the given parameters.
+
+    The common call, passing exactly the declared parameters positionally or by
+    name, looks up the dispatch param directly by name and calls implementations
+    taking all or all but the dispatch param, in any position among the declared
+    ones, without repacking them. Anything else is deferred to _generic, as are
+    misses and unhashable dispatch values. Calls omitting any of the parameters are
+    deferred to _generic through _given, with only the arguments given, for which each
+    parameter defaults to _missing. The generated code expects _lookup, _default,
+    _generic, _missing and _given in its globals.
+
+    With overlay, entries are first looked up in the mapping returned by _overlays,
+    also expected in its globals, unless that returns None.
+
+    With extract, entries are looked up by what _extract, also expected in its globals,
+    returns for the dispatch param, rather than by the param itself.
+
+    With sample, every so many calls pass the dispatch param to _sample, counting them
+    down in _countdown, which _sample is expected to reset. With hot, the common call
+    first compares the dispatch value to the constants '<hot value 0>', '<hot value 1>'
+    and so on, before any lookup, and calls the matching '<hot impl 0>', '<hot impl 1>'
+    and so on directly, given the index of the dispatch param in each. Those are only
+    placeholders, for the actual values and implementations to replace in the code.
+
+    With timed, calls are counted down in _ticks, and those reaching zero deferred to
+    _timed instead, which is expected to reset it.
+
+    :param parameters: parameters of the dispatch function.
+    :param offset: number of leading parameters before the dispatch param, e.g. self.
+    :param overlay: whether to look up entries in overlays first.
+    :param extract: whether to look up entries by a value extracted from the dispatch param.
+    :param sample: whether to sample dispatch params of calls.
+    :param hot: index of the dispatch param in the implementation for each hot value.
+    :param timed: whether to defer some calls to _timed.
+    :returns: the source, or None if the signature is not supported.
+    """
+    if len(parameters) <= offset or sys.version_info < (3, 8):
+        return None
+
+    for param in parameters:
+        if param.kind != inspect.Parameter.POSITIONAL_OR_KEYWORD or param.default is not inspect.Parameter.empty:
+            return None
+        if param.name in _RESERVED:
+            return None
+
+    names = [param.name for param in parameters]
+    key = names[offset]
+    everything = ', '.join(names)
+    others = names[:offset] + names[offset + 1:]
+
+    def arguments(idx: Optional[int]) -> str:
+        if idx is None:
+            return ', '.join(others)
+
+        # Implementations taking the dispatch param later than the others are called in their order.
+        return ', '.join(others[:idx] + [key] + others[idx:])
+
+    reordered = ''.join(
+        f'    if _idx == {idx}:\n'
+        f'        return _impl({arguments(idx)})\n'
+        for idx in range(offset + 1, len(names))
+    )
+
+    source = (
+        f'def dispatch({", ".join(f"{name}=_missing" for name in names)}, /, *_args, **_kwargs):\n'
+        f'    if {" or ".join(f"{name} is _missing" for name in names)}:\n'
+        f'        return _given(_generic, ({everything},), _kwargs)\n'
+    )
+    if timed:
+        source += (
+            f'    global _ticks\n'
+            f'    _ticks -= 1\n'
+            f'    if _ticks <= 0:\n'
+            f'        return _timed({everything}, *_args, **_kwargs)\n'
+        )
+    if sample:
+        source += (
+            f'    global _countdown\n'
+            f'    _countdown -= 1\n'
+            f'    if _countdown <= 0:\n'
+            f'        _sample({key})\n'
+        )
+
+    source += (
+        f'    if _args or _kwargs:\n'
+        f'        return _generic({everything}, *_args, **_kwargs)\n'
+    )
+
+    if extract:
+        # Whatever this raises, the generic path would raise too.
+        value = '_value'
+        source += f'    _value = _extract({key})\n'
+    else:
+        value = key
+
+    if hot:
+        indent = '    '
+        if overlay:
+            indent += '    '
+            source += '    if _overlays() is None:\n'
+
+        # Each miss costs a comparison, so the hot value is compared as is, without first checking identity.
+        for i, idx in enumerate(hot):
+            source += (
+                f"{indent}if {value} == '<hot value {i}>':\n"
+                f"{indent}    _impl = '<hot impl {i}>'\n"
+                f'{indent}    return _impl({arguments(idx)})\n'
+            )
+
+    if overlay:
+        lookup = (
+            f'        _overlay = _overlays()\n'
+            f'        if _overlay is None:\n'
+            f'            _entry = _lookup({value}, _default)\n'
+            f'        else:\n'
+            f'            _entry = _overlay.get({value}) or _lookup({value}, _default)\n'
+        )
+    else:
+        lookup = f'        _entry = _lookup({value}, _default)\n'
+
+    return source + (
+        f'    try:\n'
+        f'{lookup}'
+        f'    except TypeError:\n'
+        f'        _entry = None\n'
+        f'    if _entry is None:\n'
+        f'        return _generic({everything})\n'
+        f'    _impl, _idx = _entry\n'
+        f'    if _idx is None:\n'
+        f'        return _impl({arguments(None)})\n'
+        f'    if _idx == {offset}:\n'
+        f'        return _impl({everything})\n'
+        f'{reordered}'
+        f'    return _generic({everything})\n'
+    )
+
+
+def compile_entry(name: str, source: str, scope: Dict) -> Callable:
+    """
+    Compiles an entry point, using scope as its globals.
+
+    :param name: name of the dispatch function, for tracebacks.
+    :param source: source generated by entry_source().
+    :param scope: globals of the entry point.
+    :returns: the entry point.
+    """
+    exec(compile(source, f'<dispatch {name}>', 'exec'), scope)
+    return scope.pop('dispatch')
@@ -0,0 +1,171 @@
+""" Generated entry points of dispatch functions, recompiled as overlays are enabled and hot values change. """
+
+import inspect
+import threading
+import types
+from typing import Callable, List, Optional, Sequence
+
+from ._adaptive import RESAMPLER, HotValues, with_constants
+from ._compile import MISSING, compile_entry, entry_source, given
+
+
+class EntryPoint:
+    """
+    An entry point generated for the signature of a dispatch function, see entry_source().
+
+    Changes to the registry are published to it, and it is only recompiled, under the
+    registry lock, as overrides are first made or, if adaptive, when the hot values it
+    is specialized for change. Compiled code is cached, as traffic shifting back and
+    forth recompiles the same entry points.
+
+    Adaptive entry points sample calls until they pick the hot values, then count no
+    calls at all until RESAMPLER has them sample again, to notice traffic shifting.
+
+    :param name: name of the dispatch function.
+    :param signature: parameters of the dispatch function.
+    :param offset: number of leading parameters before the dispatch param, e.g. self.
+    :param source: source of the initial entry point.
+    :param lookup: gets the entry for a dispatch value from the registry.
+    :param default: entry of the default implementation, or None.
+    :param generic: generic dispatch, for whatever the entry point doesn't handle.
+    :param extract: gets the dispatch value from the dispatch param, if not the param itself.
+    :param adaptive: whether to specialize for the hottest dispatch values.
+    :param latency: times one in every so many calls, if given, with timed.
+    :param timed: dispatches as generic would, timing the implementation.
+    :param lock: lock held while changing the registry.
+    """
+
+    def __init__(self, name: str, signature: Sequence[inspect.Parameter], offset: int, source: str,
+                 lookup: Callable, default: Optional[tuple], generic: Callable, extract: Optional[Callable],
+                 adaptive: bool, latency: Optional[int], timed: Callable, lock: threading.RLock):
+        self._name = name
+        self._signature = signature
+        self._offset = offset
+        self._extract = extract
+        self._latency = latency
+        self._time = timed
+        self._lock = lock
+
+        # Values the entry point is specialized for, with their implementation and its index of the dispatch param.
+        self.hot = []
+        self.hot_values = HotValues() if adaptive else None
+
+        # Whether calls are counted down to those sampled, only until the hot values are picked.
+        self.counting = adaptive
+        self._sampling = threading.Lock()
+
+        # Calls are counted down in _ticks as sampled ones are in _countdown, and _timed resets it.
+        self.scope = {'_lookup': lookup, '_default': default, '_generic': generic, '_missing': MISSING,
+                      '_given': given, '_overlays': None, '_extract': extract, '_sample': self.sample,
+                      '_countdown': self.hot_values.interval if adaptive else 0, '_timed': self._timed,
+                      '_ticks': latency}
+
+        self.function = compile_entry(name, source, self.scope)
+        self._compiled = {(False, self.counting, ()): self.function.__code__}
+
+        if adaptive:
+            RESAMPLER.add(self)
+
+    @classmethod
+    def generate(cls, name: str, signature: Sequence[inspect.Parameter], offset: int, lookup: Callable,
+                 default: Optional[tuple], generic: Callable, extract: Optional[Callable], adaptive: bool,
+                 latency: Optional[int], timed: Callable, lock: threading.RLock) -> Optional['EntryPoint']:
+        """
+        Generates an entry point for a dispatch function, parameters as for EntryPoint.
+
+        :returns: the entry point, or None if the signature is not supported.
+        """
+        source = entry_source(signature, offset, extract=extract is not None, sample=adaptive,
+                              timed=latency is not None)
+        if source is None:
+            return None
+
+        return cls(name, signature, offset, source, lookup, default, generic, extract, adaptive, latency, timed, lock)
+
+    def _timed(self, *args, **kwargs):
+        self.scope['_ticks'] = self._latency
+        return self._time(*args, **kwargs)
+
+    def _code(self, overlay: bool) -> types.CodeType:
+        """ Compiles the entry point for the current hot values, with or without overlays, unless already compiled. """
+        key = (overlay, self.counting, tuple(idx for _, _, idx in self.hot))
+        code = self._compiled.get(key)
+        if code is None:
+            source = entry_source(self._signature, self._offset, overlay=overlay, extract=self._extract is not None,
+                                  sample=self.counting, hot=key[2], timed=self._latency is not None)
+            code = self._compiled[key] = compile_entry(self._name, source, self.scope).__code__
+
+        return code
+
+    def recompile(self):
+        """ Regenerates the entry point, for any overlays and the current hot values. """
+        code = self._code(bool(self.scope['_overlays']))
+
+        constants = {}
+        for i, (value, impl, _) in enumerate(self.hot):
+            constants[f'<hot value {i}>'] = value
+            constants[f'<hot impl {i}>'] = impl
+
+        # Hot values and their implementations are constants, so they are swapped along with the code.
+        self.function.__code__ = with_constants(code, constants)
+
+    def published(self, lookup: Callable):
+        """ Makes the registry's changes visible. Called under lock. """
+        self.scope['_lookup'] = lookup
+        if self.hot:
+            # Hot values may have been changed, or removed.
+            self.specialize([value for value, _, _ in self.hot], self.counting)
+
+    def enable_overlays(self, get: Callable):
+        """ Has the entry point check the overlays returned by get, as only those overridden pay to. """
+        with self._lock:
+            if not self.scope['_overlays']:
+                self.scope['_overlays'] = get
+                self.recompile()
+
+    def warm(self):
+        """ Compiles the entry point with overlays, so that overriding then only swaps the code. """
+        with self._lock:
+            self._code(True)
+
+    def specialize(self, values: List, sample: bool):
+        """ Specializes the entry point for the given values, if they are registered, sampling calls or not. """
+        # Dispatch mustn't wait for whoever is changing the registry, it can specialize next time.
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            lookup = self.scope['_lookup']
+            self.hot = []
+            for value in values:
+                entry = lookup(value)
+                if entry is not None and (entry[1] is None or self._offset <= entry[1] < len(self._signature)):
+                    self.hot.append((value, *entry))
+
+            self.counting = sample
+            self.scope['_countdown'] = self.hot_values.interval
+            self.recompile()
+        finally:
+            self._lock.release()
+
+    def sample(self, param):
+        """ Samples the dispatch param of a call, specializing for the hottest values at the end of a window. """
+        self.scope['_countdown'] = self.hot_values.interval
+        if not self._sampling.acquire(blocking=False):
+            return
+
+        try:
+            values = self.hot_values.sample(param if self._extract is None else self._extract(param))
+        except Exception:
+            # Unhashable or without the extracted field, dispatch will tell the caller.
+            return
+        finally:
+            self._sampling.release()
+
+        if values is not None:
+            self.specialize(values, False)
+
+    def resample(self):
+        """ Has the entry point sample calls again, if it stopped. Called periodically, off the hot path. """
+        if not self.counting:
+            self.specialize([value for value, _, _ in self.hot], True)
@@ -0,0 +1,41 @@
+""" Running implementations on concurrent.futures executors. """
+
+import asyncio
+from concurrent.futures import Executor, Future
+from typing import Callable, Optional
+
+
+class Submit:
+    """
+    Submits an implementation to an executor rather than calling it.
+
+    Calls return the concurrent.futures.Future of the submission or, when made from
+    a running asyncio event loop, an awaitable asyncio.Future wrapping it. With a
+    process pool, the implementation and its arguments must be picklable.
+
+    :param executor: executor to submit to.
+    :param arguments: adapts dispatch's arguments to impl, given (impl, idx, args, kwargs).
+    :param impl: implementation to submit.
+    :param idx: index of the dispatch param in the signature of impl.
+    """
+
+    def __init__(self, executor: Executor, arguments: Callable, impl: Callable, idx: Optional[int]):
+        self.executor = executor
+        self.impl = impl
+        self._arguments = arguments
+        self._idx = idx
+
+    def __call__(self, *args, **kwargs):
+        future = self.submit(*args, **kwargs)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return future
+
+        return asyncio.wrap_future(future, loop=loop)
+
+    def submit(self, *args, **kwargs) -> Future:
+        """ Submits the implementation, returning the concurrent.futures.Future even from an event loop. """
+        args, kwargs = self._arguments(self.impl, self._idx, args, kwargs)
+        return self.executor.submit(self.impl, *args, **kwargs)
@@ -1,19 +1,38 @@
 """ Like functools.singledispatch, but dynamic, value-based function dispatch. """
 
+import contextlib
+import contextvars
 import functools
 import inspect
+import time
+import weakref
+from concurrent.futures import Executor
 from types import MappingProxyType
-from typing import Callable, Hashable, Type
+from typing import Any, Callable, Hashable, Mapping, Optional, Tuple
 
+from ._balance import STRATEGIES, Balancer
+from ._batch import Batch
+from ._bulkhead import Bulkhead
+from ._compact import CompactRegistry
+from ._entry import EntryPoint
+from ._executor import Submit
+from ._keys import StructuralKeys
+from ._latency import LatencyHistograms
+from ._registry import Registry
 from ._typeguard import typechecked
+from ._weak import KeepAlive, Weak
 
+# Every dispatcher, so that warmup() can build their lazy state before forking.
+DISPATCHERS = weakref.WeakSet()
 
-def _lookup(key: str, typ: Type, *args, **kwargs) -> Hashable:
+
+def _lookup(key: str, offset: int, name: str, args: tuple, kwargs: dict) -> Hashable:
     """
-    Gets the value of the given key in args, defaulting to the first positional.
+    Gets the value of the given key in args, defaulting to the first positional after offset.
 
     :param key: key to find value of in args.
-    :param typ: type that dispatch is being perform on.
+    :param offset: number of leading positionals before the dispatch param, e.g. self.
+    :param name: name of what dispatch is being performed on.
     :param args: positional args.
     :param kwargs: keyword args.
     :return: value of the key in the given args.
@@ -22,18 +41,108 @@ def _lookup(key: str, typ: Type, *args, **kwargs) -> Hashable:
         value = kwargs[key]
     else:
         try:
-            if typ.__qualname__.endswith('.__new__'):
-                value = args[1]
-            else:
-                value = args[0]
+            value = args[offset]
         except IndexError:
-            raise TypeError(f'missing dispatch parameter {key!r} on {typ.__name__}')
+            raise TypeError(f'missing dispatch parameter {key!r} on {name}')
 
     return value
 
 
+def _arguments(impl: Callable, idx: Optional[int], key: str, offset: int, args: tuple, kwargs: dict,
+               construct: bool = False):
+    """
+    Adapts the arguments given to dispatch to the signature of an implementation.
+
+    :param impl: implementation to adapt to.
+    :param idx: index of the dispatch param in the signature of impl, see _index().
+    :param key: name of the dispatch param.
+    :param offset: number of leading positionals before the dispatch param, e.g. self.
+    :param args: positional args given to dispatch.
+    :param kwargs: keyword args given to dispatch, which may be altered.
+    :param construct: whether dispatch is __new__ of a class, whose subclasses are registered by their __init__.
+    :return: positional and keyword args for impl.
+    """
+    skip = offset
+    if construct and inspect.isclass(impl):
+        # Classes are instantiated without cls, and self is implicit.
+        args = args[1:]
+        skip = 0
+
+        if idx is not None:
+            idx -= 1
+
+    if idx is None:
+        # Dispatch param is not desired, remove it.
+        if key in kwargs:
+            del kwargs[key]
+        else:
+            # Not in kwargs, must be the first parameter after any self.
+            args = args[:skip] + args[skip + 1:]
+    elif idx > skip and key not in kwargs:
+        if len(args) > idx:
+            # Dispatch param is desired and it's not the first argument, so rearrange.
+            args = args[:skip] + args[skip + 1:idx + 1] + args[skip:skip + 1] + args[idx + 1:]
+        else:
+            # Too few others are given positionally to put it in its place, so it is given by name.
+            kwargs[key] = args[skip]
+            args = args[:skip] + args[skip + 1:]
+
+    return args, kwargs
+
+
+def _call(impl: Callable, idx: Optional[int], key: str, offset: int, args: tuple, kwargs: dict,
+          construct: bool = False):
+    """
+    Calls an implementation with the arguments given to dispatch, adapted to its signature.
+    Parameters are as for _arguments().
+
+    :return: result of impl.
+    """
+    args, kwargs = _arguments(impl, idx, key, offset, args, kwargs, construct)
+    return impl(*args, **kwargs)
+
+
+def _index(key: str, arguments: MappingProxyType) -> Optional[int]:
+    """
+    Determines the index of the dispatch param in a signature.
+
+    :param key: name of the dispatch param.
+    :param arguments: parameters of the signature.
+    :return: index of key, -1 if it is keyword-only, or None if absent.
+    """
+    idx = None
+    for i, parameter in enumerate(arguments.values()):
+        if parameter.name == key:
+            if parameter.kind == inspect.Parameter.KEYWORD_ONLY:
+                # Parameter is keyword-only, so it has no 'index'.
+                idx = -1
+            else:
+                idx = i
+
+    return idx
+
+
+def _in_class_body(func: Callable) -> bool:
+    """ Whether func was defined directly in the body of a class, as methods are. """
+    outer, _, _ = func.__qualname__.rpartition('.')
+    return bool(outer) and not outer.endswith('<locals>')
+
+
+def _receiver(param: inspect.Parameter, offset: int, method: bool) -> bool:
+    """
+    Whether param is a receiver passed through to implementations rather than dispatched on.
+
+    :param param: parameter before the dispatch param has been found.
+    :param offset: number of receivers before param.
+    :param method: whether the dispatch function was defined in a class body.
+    """
+    return param.name == 'self' or (method and offset == 0 and param.name == 'cls')
+
+
 @typechecked
-def func_dispatch(func: Callable = None, *, default: bool, clazz=None):
+def func_dispatch(func: Callable = None, *, default: bool, clazz=None, structural: bool = False,
+                  extract: Optional[Callable] = None, compact: bool = False, adaptive: bool = False,
+                  latency: Optional[int] = None, keep_alive: Optional[int] = None):
     """
     Value-based dynamic-dispatch function decorator.
 
@@ -43,13 +152,36 @@ def func_dispatch(func: Callable = None, *, default: bool, clazz=None):
     and additional functions may be registered using the dispatch() attribute of
     the dispatch function.
 
+    Implementations may be swapped with replace() or removed with unregister(), and
+    several changes may be published at once inside a "with update():" block. The
+    version attribute is incremented each time changes are published.
+
+    Implementations may also be overridden within a context, without changing the
+    registry, in a "with override(overlay):" block.
+
+    If the parameters of func are all plain positional-or-keyword parameters, the
+    returned function is generated with the same parameters, so that calls which
+    pass exactly those skip the generic argument handling.
+
     :param func: function to add dynamic dispatch to.
     :param default: whether or not to default when given an unregistered value.
     :param clazz: class that func is __new__ for, or None.
+    :param structural: whether to dispatch unhashable values by their structural key.
+    :param extract: gets the dispatch value from the dispatch param, if not the param itself.
+    :param compact: whether to store the registry compactly, for very many dispatch values.
+    :param adaptive: whether to specialize the entry point for the hottest dispatch values.
+    :param latency: times one in every so many calls, if given, for the histograms of latency().
+    :param keep_alive: most weakly registered implementations to hold strongly, the most recently used.
     :returns: dispatch function.
     """
     if func is None:
-        return functools.partial(func_dispatch, default=default, clazz=clazz)
+        return functools.partial(func_dispatch, default=default, clazz=clazz, structural=structural, extract=extract,
+                                 compact=compact, adaptive=adaptive, latency=latency, keep_alive=keep_alive)
+
+    if adaptive and structural:
+        raise ValueError('structural dispatch values cannot be specialized for')
+    if latency is not None and latency < 1:
+        raise ValueError(f'latency must time one in a positive number of calls, got {latency!r}')
 
     if inspect.ismethod(func):
         raise NotImplementedError('member functions are not supported')
@@ -61,19 +193,50 @@ def func_dispatch(func: Callable = None, *, default: bool, clazz=None):
         name = clazz.__name__
         parameters = inspect.signature(clazz.__init__).parameters
 
-    registry = {}
+    # Subclasses registered on a class are constructed without its cls, taking the parameters of their __init__.
+    # Any other class is called like a function.
+    construct = clazz is not None
+
+    keys = StructuralKeys() if structural else None
+    keep = KeepAlive(keep_alive) if keep_alive is not None else None
+
+    # Allow default to dispatch func, which we know has the dispatch param at index 0.
+    default_entry = (func, 0) if default else None
 
     # Find the first explicit (non-splat) positional argument. This is the dispatch parameter.
-    parameters = iter(parameters.values())
+    # Any self before it, of a method or of __init__ for a class, is passed through untouched, as is the cls of a
+    # classmethod. Methods are only told apart from functions by these names.
+    signature = list(parameters.values())
+    method = _in_class_body(func)
+    parameters = iter(signature)
     param = None
-    while param is None or param.name == 'self' or param.name == 'return' or \
+    offset = 0
+    while param is None or _receiver(param, offset, method) or param.name == 'return' or \
             param.kind == inspect.Parameter.VAR_POSITIONAL or param.kind == inspect.Parameter.VAR_KEYWORD:
+        if param is not None and _receiver(param, offset, method):
+            offset += 1
         try:
             param = next(parameters)
         except StopIteration:
             raise TypeError('dispatch function does not have any explicit positional arguments') from None
     key = param.name
 
+    # Defined in a class body without a receiver named as such, it may be a method dispatching on its instance.
+    hint = '' if not method or offset else \
+        ' (methods must name their first parameter self or cls to be dispatched on the next one)'
+
+    # Overlays set by override() for the current context, consulted before the registry.
+    overlays = contextvars.ContextVar(f'{name}_overlays', default=None)
+
+    def find(value: Hashable):
+        overlay = overlays.get()
+        if overlay is not None:
+            entry = overlay.get(value)
+            if entry is not None:
+                return entry
+
+        return lookup(value, default_entry)
+
     @functools.wraps(func)
     def dispatch(*args, **kwargs):
         # If dispatching a class, the first argument indicates the type of class desired.
@@ -90,64 +253,494 @@ def func_dispatch(func: Callable = None, *, default: bool, clazz=None):
                         raise TypeError(f'cls argument for __new__ must be subclass of {clazz!r}, got {klass!r}')
 
         # Find dispatch param by position or key.
-        value = _lookup(key, func, *args, **kwargs)
+        value = _lookup(key, offset, name, args, kwargs)
+        if extract is not None:
+            value = extract(value)
 
-        if default:
-            # Allow default to dispatch func, which we know has the dispatch param at index 0.
-            impl, idx = registry.get(value, (func, 0))
-        else:
-            try:
-                impl, idx = registry[value]
-            except KeyError:
-                raise ValueError(f'no registered implementations for {value!r} for {name}') from None
+        try:
+            entry = find(value)
+        except TypeError:
+            # Unhashable, only allowed if dispatching structurally.
+            if keys is None:
+                raise
+            entry = find(keys(value))
 
-        if inspect.isclass(impl):
-            args = args[1:]
+        if entry is None:
+            raise ValueError(f'no registered implementations for {value!r} for {name}{hint}')
+        impl, idx = entry
 
-            if idx is not None:
-                idx -= 1
+        return _call(impl, idx, key, offset, args, kwargs, construct)
 
-        if idx is None:
-            # Dispatch param is not desired, remove it.
-            if key in kwargs:
-                del kwargs[key]
-            else:
-                # Not in kwargs, must be the first parameter.
-                args = args[1:]
-        elif idx > 0 and key not in kwargs:
-            # Dispatch param is desired and it's not the first argument, so rearrange.
-            args = args[1:idx + 1] + args[0:1] + args[idx + 1:]
+    def published(table):
+        """
+        Makes a changed registry visible to dispatch, and invalidates anything derived from it.
+        """
+        nonlocal lookup
+        lookup = table.get
+        if entry_point is not None:
+            entry_point.published(lookup)
+
+        dispatcher.version += 1
+
+    # Dispatch looks entries up in the published table, changed through the registry.
+    registry = Registry(CompactRegistry() if compact else {}, published)
+    lookup = registry.table.get
+
+    def key_of(on):
+        return on if keys is None else keys(on)
+
+    def missing(*args, **kwargs):
+        """
+        Dispatches as if the collected weak implementation being called were no longer registered.
+        """
+        if default_entry is None:
+            value = _lookup(key, offset, name, args, kwargs)
+            if extract is not None:
+                value = extract(value)
+            raise ValueError(f'no registered implementations for {value!r} for {name}{hint}')
+
+        return adapt(*default_entry, args, kwargs)
+
+    def adapt(impl: Callable, idx: Optional[int], args: tuple, kwargs: dict):
+        return _call(impl, idx, key, offset, args, kwargs, construct)
+
+    def arguments_for(impl: Callable, idx: Optional[int], args: tuple, kwargs: dict):
+        return _arguments(impl, idx, key, offset, args, kwargs, construct)
+
+    def entry_for(impl: Callable, arguments: MappingProxyType, executor: Optional[Executor],
+                  batch_window: Optional[float], batch_size: Optional[int], concurrency: Optional[int],
+                  queue_limit: Optional[int], weak: bool):
+        entry = impl, _index(key, arguments)
+        if weak:
+            if clazz is not None:
+                raise ValueError(f'only implementations of dispatch functions can be registered weakly, on {name}')
+            if executor is not None or batch_window is not None or batch_size is not None or \
+                    concurrency is not None or queue_limit is not None:
+                raise ValueError(f'weak implementations cannot also use an executor, be batched or be limited, '
+                                 f'on {name}')
+
+            # Collected implementations are unregistered the next time the registry changes.
+            weak = registry.track_weak(keep)
+            return Weak(adapt, *entry, missing=missing, collected=weak.died, keep=keep), offset
+
+        if concurrency is None and queue_limit is not None:
+            raise ValueError(f'queue_limit requires a concurrency limit, on {name}')
+
+        if batch_window is not None or batch_size is not None:
+            if executor is not None:
+                raise ValueError(f'batched implementations cannot also use an executor, on {name}')
+            if concurrency is not None:
+                raise ValueError(f'batched implementations cannot also be limited, on {name}')
+
+            # Batches take the arguments as given to dispatch, and adapt them for impl per call.
+            entry = Batch(arguments_for, *entry, window=batch_window or 0, size=batch_size), offset
+        elif executor is not None:
+            # Submissions take the arguments as given to dispatch, and adapt them for impl.
+            entry = Submit(executor, arguments_for, *entry), offset
+
+        if concurrency is not None:
+            # Limited in the caller, before any submission, so that calls waiting for a slot don't hold the
+            # executor's workers, and rejections are raised to the caller.
+            entry = Bulkhead(adapt, *entry, limit=concurrency, queue=queue_limit), offset
 
-        return impl(*args, **kwargs)
+        return entry
 
     @typechecked(always=True)
-    def register(impl: Callable = None, *, arguments: MappingProxyType, on: Hashable):
+    def register(impl: Callable = None, *, arguments: MappingProxyType, on: Any, balance: Optional[str] = None,
+                 weight: float = 1, executor: Optional[Executor] = None, batch_window: Optional[float] = None,
+                 batch_size: Optional[int] = None, concurrency: Optional[int] = None,
+                 queue_limit: Optional[int] = None, weak: bool = False):
         """
         Registers a new implementation for the given value of key.
 
-        :param on: dispatch value to register this implementation on.
+        If balance is specified, more implementations may be registered for the same
+        value with the same strategy, and each call picks one of them:
+
+            - round_robin: each in turn.
+            - random: uniformly at random.
+            - weighted: at random, in proportion to their weight.
+            - least_in_flight: whichever has the fewest calls in progress.
+
+        If executor is specified, calls for value submit impl to it and return a future
+        of its result, or an asyncio future if called from a running event loop.
+
+        If batch_window or batch_size is specified, impl is a batch implementation, and
+        calls for value must be made from a running event loop. Calls made within
+        batch_window seconds of the first, up to batch_size of them, are coalesced into
+        one call of impl, passing it a list per positional argument, holding that argument
+        of each call. It must return a sequence with one result per call, or an awaitable
+        resolving to one, and each call returns an asyncio future of its own result.
+
+        If concurrency is specified, at most that many calls of impl run at once, and
+        the rest wait, blocking their thread, or their task if impl is a coroutine
+        function. If queue_limit is also specified, calls which would wait behind that
+        many others raise Rejected instead.
+
+        If weak is specified, the registry only refers to impl weakly, and value is
+        unregistered once impl has been garbage collected, as of the next change to the
+        registry. Until then, calls for value are dispatched as if it were unregistered.
+        Only those implementations the dispatcher keeps alive, if any, or which are
+        referred to elsewhere, stay registered.
+
+        Unless dispatching structurally, on may also be a list of values, for which
+        impl is registered at once as by register_many().
+
+        :param on: dispatch value or list of values to register this implementation on.
         :param arguments: parameters to impl.
         :param impl: implementation to associate with value.
+        :param balance: strategy for balancing between implementations for value.
+        :param weight: relative weight of impl, for weighted balancing.
+        :param executor: executor to run impl on.
+        :param batch_window: seconds to wait for more calls to coalesce with the first.
+        :param batch_size: most calls to coalesce into one.
+        :param concurrency: most calls of impl in progress at once.
+        :param queue_limit: most calls waiting for impl at once.
+        :param weak: whether to only refer to impl weakly.
         """
         if impl is None:
-            return functools.partial(register, arguments=arguments, on=on)
-
-        if on in registry:
-            raise ValueError(f'duplicate implementation for {on!r} for {name}')
-
-        # Determine index of dispatch parameter in this signature.
-        idx = None
-        for i, parameter in enumerate(arguments.values()):
-            if parameter.name == key:
-                if parameter.kind == inspect.Parameter.KEYWORD_ONLY:
-                    # Parameter is keyword-only, so it has no 'index'.
-                    idx = -1
+            return functools.partial(register, arguments=arguments, on=on, balance=balance, weight=weight,
+                                     executor=executor, batch_window=batch_window, batch_size=batch_size,
+                                     concurrency=concurrency, queue_limit=queue_limit, weak=weak)
+
+        if isinstance(on, list) and keys is None:
+            if not on:
+                raise TypeError(f'no dispatch values to register on for {name}')
+            if balance is not None:
+                raise ValueError(f'balanced implementations must be registered one value at a time, on {name}')
+
+            register_many({value: (impl, arguments) for value in on}, executor=executor, batch_window=batch_window,
+                          batch_size=batch_size, concurrency=concurrency, queue_limit=queue_limit, weak=weak)
+            return impl
+
+        on = key_of(on)
+        entry = entry_for(impl, arguments, executor, batch_window, batch_size, concurrency, queue_limit, weak)
+        with registry.changing():
+            existing = registry.get(on)
+            if balance is not None:
+                if isinstance(entry[0], Weak):
+                    raise ValueError(f'weak implementations cannot be balanced, on {name}')
+                if balance not in STRATEGIES:
+                    raise ValueError(f'unknown balancing strategy {balance!r}, expected one of {sorted(STRATEGIES)}')
+                if isinstance(entry[0], Batch):
+                    raise ValueError(f'batched implementations cannot be balanced, on {name}')
+
+                if existing is None:
+                    balancer = STRATEGIES[balance](adapt)
+                elif isinstance(existing[0], Balancer) and existing[0].strategy == balance:
+                    balancer = existing[0]
                 else:
-                    idx = i
+                    raise ValueError(f'duplicate implementation for {on!r} for {name}')
+
+                # Balancers take the arguments as given to dispatch, and adapt them per implementation.
+                entry = balancer.with_member(*entry, weight), offset
+            elif existing is not None:
+                raise ValueError(f'duplicate implementation for {on!r} for {name}')
+
+            registry.set(on, entry)
+
+        return impl
+
+    @typechecked(always=True)
+    def register_many(table: Mapping, *, executor: Optional[Executor] = None, batch_window: Optional[float] = None,
+                      batch_size: Optional[int] = None, concurrency: Optional[int] = None,
+                      queue_limit: Optional[int] = None, weak: bool = False):
+        """
+        Registers implementations for many values of key at once.
+
+        The parameters of each distinct implementation are only examined once, and
+        dispatch sees all of the registrations at once, or none of them if any value
+        is already registered. Options apply to each value as for register().
+
+        :param table: implementations and their parameters, by dispatch value.
+        :param executor: executor to run implementations on.
+        :param batch_window: seconds to wait for more calls to coalesce with the first.
+        :param batch_size: most calls to coalesce into one.
+        :param concurrency: most calls of an implementation in progress at once, per value.
+        :param queue_limit: most calls waiting for an implementation at once, per value.
+        :param weak: whether to only refer to implementations weakly.
+        """
+        # Wrapped entries keep state per value, plain ones are shared by every value of the same impl.
+        wrapped = executor is not None or batch_window is not None or batch_size is not None or \
+            concurrency is not None or queue_limit is not None
+
+        shared = {}
+        entries = {}
+        duplicates = []
+        for on, (impl, arguments) in table.items():
+            on = key_of(on)
+            if on in entries:
+                duplicates.append(on)
+            elif wrapped:
+                entries[on] = entry_for(impl, arguments, executor, batch_window, batch_size, concurrency, queue_limit,
+                                        weak)
+            else:
+                entry = shared.get(id(impl))
+                if entry is None:
+                    entry = shared[id(impl)] = entry_for(impl, arguments, None, None, None, None, None, weak)
+                entries[on] = entry
 
-        registry[on] = impl, idx
+        with registry.changing():
+            duplicates.extend(on for on in entries if on in registry)
+            if duplicates:
+                raise ValueError(f'duplicate implementations for {duplicates!r} for {name}')
+
+            registry.set_many(entries)
+
+    @typechecked(always=True)
+    def replace(impl: Callable = None, *, arguments: MappingProxyType, on: Any, executor: Optional[Executor] = None,
+                batch_window: Optional[float] = None, batch_size: Optional[int] = None,
+                concurrency: Optional[int] = None, queue_limit: Optional[int] = None, weak: bool = False):
+        """
+        Replaces the implementation registered for the given value of key.
+
+        :param on: dispatch value to replace the implementation of.
+        :param arguments: parameters to impl.
+        :param impl: new implementation to associate with value.
+        :param executor: executor to run impl on, as for register().
+        :param batch_window: seconds to wait for more calls to coalesce, as for register().
+        :param batch_size: most calls to coalesce into one, as for register().
+        :param concurrency: most calls of impl in progress at once, as for register().
+        :param queue_limit: most calls waiting for impl at once, as for register().
+        :param weak: whether to only refer to impl weakly, as for register().
+        """
+        if impl is None:
+            return functools.partial(replace, arguments=arguments, on=on, executor=executor,
+                                     batch_window=batch_window, batch_size=batch_size, concurrency=concurrency,
+                                     queue_limit=queue_limit, weak=weak)
+
+        on = key_of(on)
+        entry = entry_for(impl, arguments, executor, batch_window, batch_size, concurrency, queue_limit, weak)
+        with registry.changing():
+            if on not in registry:
+                raise ValueError(f'no registered implementations for {on!r} for {name}')
+
+            registry.set(on, entry)
 
         return impl
 
-    dispatch.dispatch = register
-    return dispatch
+    def unregister(on: Any):
+        """
+        Removes the implementation registered for the given value of key.
+
+        :param on: dispatch value to remove the implementation of.
+        """
+        on = key_of(on)
+        with registry.changing():
+            if on not in registry:
+                raise ValueError(f'no registered implementations for {on!r} for {name}')
+
+            registry.set(on, None)
+
+    def adapted(impl: Callable, idx: Optional[int], *args, **kwargs):
+        return _call(impl, idx, key, offset, args, kwargs, construct)
+
+    def resolve(value: Any) -> Optional[Callable]:
+        """
+        Finds what dispatch would call for the given value of key, so that it may be
+        called repeatedly without dispatching each time.
+
+        The result takes the same arguments as dispatch, adapted as dispatch would for
+        the implementation. It is not updated by later changes to the registry; its
+        version attribute is that of the dispatcher when it was resolved, and differs
+        from the dispatcher's from the first such change.
+
+        :param value: dispatch value to resolve.
+        :returns: the implementation, or None if there is none.
+        """
+        try:
+            entry = find(value)
+        except TypeError:
+            if keys is None:
+                raise
+            entry = find(keys(value))
+
+        if entry is None:
+            return None
+
+        impl, idx = entry
+        if idx == offset and not (construct and inspect.isclass(impl)):
+            # Takes the arguments as they are.
+            resolved = functools.partial(impl)
+        else:
+            resolved = functools.partial(adapted, impl, idx)
+
+        resolved.version = dispatcher.version
+        return resolved
+
+    def stats(on: Any) -> Mapping[str, float]:
+        """
+        Metrics of the implementation registered for the given value of key, e.g. the
+        sizes of the batches it has been called with, or the calls which waited for its
+        concurrency limit. Plain implementations have none.
+
+        :param on: dispatch value to get the metrics of.
+        :returns: metrics by name.
+        """
+        entry = registry.get(key_of(on))
+        if entry is None:
+            raise ValueError(f'no registered implementations for {on!r} for {name}')
+
+        impl = entry[0]
+        if isinstance(impl, Submit):
+            impl = impl.impl
+
+        return impl.stats() if hasattr(impl, 'stats') else {}
+
+    # Latencies of the implementations of one in every so many calls.
+    latencies = LatencyHistograms()
+
+    def timed(*args, **kwargs):
+        """
+        Dispatches as dispatch would, timing the implementation.
+        """
+        value = _lookup(key, offset, name, args, kwargs)
+        if extract is not None:
+            value = extract(value)
+
+        try:
+            entry = find(value)
+        except TypeError:
+            if keys is None:
+                raise
+            value = keys(value)
+            entry = find(value)
+
+        if entry is None:
+            raise ValueError(f'no registered implementations for {value!r} for {name}{hint}')
+        impl, idx = entry
+
+        args, kwargs = _arguments(impl, idx, key, offset, args, kwargs, construct)
+        start = time.perf_counter_ns()
+        try:
+            return impl(*args, **kwargs)
+        finally:
+            latencies.record(value, time.perf_counter_ns() - start)
+
+    def weak_stats() -> Mapping[str, int]:
+        """
+        Metrics of weakly registered implementations: how many are alive and registered,
+        the values they are registered on, the values unregistered as theirs were
+        collected, and how many are kept alive and have been evicted from those kept.
+
+        :returns: metrics by name.
+        """
+        with registry.changing():
+            if registry.weak is not None:
+                return registry.weak.stats(registry)
+
+        return {'implementations': 0, 'values': 0, 'collected': 0, 'kept': 0, 'evicted': 0}
+
+    def latency_histograms(reset: bool = False) -> Mapping[Any, Mapping[str, Any]]:
+        """
+        Summarizes the latencies of the timed calls for each dispatch value, see
+        LatencyHistograms.snapshot(). Latencies are those of the implementations alone,
+        and of coroutine functions and executors only until they return an awaitable
+        or a future.
+
+        :param reset: whether to start over.
+        :returns: summaries by dispatch value.
+        """
+        return latencies.snapshot(reset)
+
+    def latency_text() -> str:
+        """
+        Exports the latency histograms in the Prometheus text format.
+
+        :returns: the histograms.
+        """
+        return latencies.text(name)
+
+    def warm():
+        """
+        Builds what dispatch would otherwise build on first use, see warmup().
+        """
+        if entry_point is not None:
+            entry_point.warm()
+
+    def describe() -> dict:
+        """
+        Describes the dispatcher and a snapshot of its registry, for compiling it ahead of time.
+
+        :returns: its name, parameters, offset, dispatch param, default and registry entries, and how
+            it takes the dispatch value from the dispatch param.
+        """
+        entries = registry.items()
+        return {'name': name, 'parameters': signature, 'offset': offset, 'key': key, 'default': default_entry,
+                'entries': entries, 'extract': extract, 'structural': keys is not None}
+
+    @contextlib.contextmanager
+    def update():
+        """
+        Groups changes to the registry, which dispatch sees all at once when the block exits.
+
+        Changes are discarded if the block raises. Other threads wanting to change the
+        registry wait for the block to exit, while dispatch continues uninterrupted.
+        """
+        with registry.staged():
+            yield
+
+    @contextlib.contextmanager
+    def override(overlay: Mapping[Any, Tuple[Callable, MappingProxyType]]):
+        """
+        Overrides implementations within the current context, e.g. thread or asyncio task.
+
+        Overrides nest, with the innermost taking precedence, and are reverted when the
+        block exits. The registry itself is unaffected.
+
+        :param overlay: implementations and their parameters, by dispatch value.
+        """
+        entries = {key_of(on): (impl, _index(key, arguments)) for on, (impl, arguments) in overlay.items()}
+
+        if entry_point is not None:
+            # Only dispatchers which have been overridden pay to check for overlays.
+            entry_point.enable_overlays(overlays.get)
+
+        outer = overlays.get()
+        token = overlays.set(entries if outer is None else {**outer, **entries})
+        try:
+            yield
+        finally:
+            overlays.reset(token)
+
+    # Classes need the checks on cls in the generic dispatch.
+    entry_point = EntryPoint.generate(name, signature, offset, lookup, default_entry, dispatch, extract, adaptive,
+                                      latency, timed, registry.lock) if clazz is None else None
+    if entry_point is not None:
+        dispatcher = functools.wraps(func)(entry_point.function)
+    elif latency is not None:
+        ticks = latency
+
+        @functools.wraps(func)
+        def dispatcher(*args, **kwargs):
+            nonlocal ticks
+            ticks -= 1
+            if ticks <= 0:
+                ticks = latency
+                return timed(*args, **kwargs)
+
+            return dispatch(*args, **kwargs)
+    else:
+        dispatcher = dispatch
+
+    dispatcher.dispatch = register
+    dispatcher.dispatch_many = register_many
+    dispatcher.replace = replace
+    dispatcher.unregister = unregister
+    dispatcher.update = update
+    dispatcher.override = override
+    dispatcher.resolve = resolve
+    dispatcher.stats = stats
+    dispatcher.weak_stats = weak_stats
+    dispatcher.latency = latency_histograms
+    dispatcher.latency_text = latency_text
+    dispatcher.version = 0
+
+    # Only for python -m dynamic_dispatch compile, and warmup().
+    dispatcher._describe = describe
+    dispatcher._warm = warm
+
+    # For partitioned() and sharded() to place calls by what is dispatched on.
+    dispatcher._extract = extract
+    DISPATCHERS.add(dispatcher)
+
+    return dispatcher
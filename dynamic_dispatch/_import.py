@@ -0,0 +1,48 @@
+""" Referring to module-level objects by name, so that other processes and generated modules can import them. """
+
+import importlib
+import sys
+from typing import Any, Callable, List, Tuple
+
+
+def load(target: str) -> Callable:
+    """
+    Imports what target names.
+
+    :param target: module and qualified name within it, e.g. 'pkg.module:dispatcher'.
+    :returns: the object.
+    """
+    module, _, qualname = target.partition(':')
+    if not module or not qualname:
+        raise ValueError(f'expected a target of the form module:name, got {target!r}')
+
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+
+    return obj
+
+
+def importable(obj: Any, what: str) -> Tuple[str, str, List[str]]:
+    """
+    Finds the name obj is importable by.
+
+    :param obj: object to refer to.
+    :param what: description of obj, for errors.
+    :returns: its module, top-level name and any further attributes.
+    """
+    module = getattr(obj, '__module__', None)
+    qualname = getattr(obj, '__qualname__', None)
+    if module is None or qualname is None or module == '__main__' or '<' in qualname:
+        raise ValueError(f'{what} {obj!r} is not a module-level function or class, so cannot be imported')
+
+    found = sys.modules.get(module)
+    attrs = qualname.split('.')
+    for attr in attrs:
+        found = getattr(found, attr, None)
+
+    if found is not obj:
+        raise ValueError(f'{what} {obj!r} is not importable as {module}.{qualname}, e.g. as it is named _ or '
+                         f'is the dispatch function itself')
+
+    return module, attrs[0], attrs[1:]
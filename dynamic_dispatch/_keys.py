@@ -0,0 +1,121 @@
+""" Hashable structural keys for dispatching on unhashable values. """
+
+import collections
+import sys
+import threading
+from typing import Any, Hashable
+
+
+class _Tag:
+    """ Marks the type of container a fingerprint was frozen from, so that no other value can equal it. """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f'<{self.name}>'
+
+
+_LIST = _Tag('list')
+_TUPLE = _Tag('tuple')
+_DICT = _Tag('dict')
+_SET = _Tag('set')
+_FROZENSET = _Tag('frozenset')
+_BYTES = _Tag('bytes')
+_ARRAY = _Tag('array')
+
+
+class StructuralKeys:
+    """
+    Converts unhashable dispatch values into hashable fingerprints.
+
+    Lists, tuples, dicts, sets and frozensets become tuples tagged with the kind of
+    container, holding a tuple of their items, or a frozenset of their items or
+    entries, so that e.g. a list never equals a tuple with the same items. Bytearrays
+    and memoryviews become their bytes, and array-likes (e.g. NumPy arrays) their dtype,
+    shape and raw bytes, also tagged. Zero-dimensional arrays and NumPy scalars become
+    the equivalent Python scalar. Conversion is recursive.
+
+    Fingerprints of recently seen objects are memoized by identity, so the same
+    payload dispatched repeatedly is only frozen once. As a consequence, objects
+    must not be mutated after they have been used as a dispatch value. The memo holds
+    on to the objects, so it is bounded by their approximate size in bytes, evicting
+    the oldest first, and objects larger than that bound are not memoized at all.
+
+    :param memo_bytes: most bytes of objects to memoize.
+    :param max_bytes: largest array, in bytes, that may be used as a key.
+    """
+
+    def __init__(self, memo_bytes: int = 1 << 20, max_bytes: int = 4096):
+        self._memo = collections.OrderedDict()
+        self._memo_bytes = memo_bytes
+        self._memoized = 0
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def __call__(self, value: Any) -> Hashable:
+        try:
+            hash(value)
+        except TypeError:
+            pass
+        else:
+            return value
+
+        ident = id(value)
+        entry = self._memo.get(ident)
+        if entry is not None and entry[0] is value:
+            return entry[1]
+
+        sizes = []
+        key = self._freeze(value, sizes)
+        size = sum(sizes)
+        if size > self._memo_bytes:
+            return key
+
+        with self._lock:
+            # Keep a reference to value so that its id cannot be reused while memoized.
+            old = self._memo.pop(ident, None)
+            if old is not None:
+                self._memoized -= old[2]
+            self._memo[ident] = value, key, size
+            self._memoized += size
+
+            while self._memoized > self._memo_bytes:
+                _, (_, _, evicted) = self._memo.popitem(last=False)
+                self._memoized -= evicted
+
+        return key
+
+    def _freeze(self, value: Any, sizes: list) -> Hashable:
+        sizes.append(sys.getsizeof(value))
+
+        if isinstance(value, list):
+            return _LIST, tuple(self._freeze(item, sizes) for item in value)
+        if isinstance(value, tuple):
+            return _TUPLE, tuple(self._freeze(item, sizes) for item in value)
+        if isinstance(value, dict):
+            return _DICT, frozenset((self._freeze(k, sizes), self._freeze(v, sizes)) for k, v in value.items())
+        if isinstance(value, (set, frozenset)):
+            tag = _SET if isinstance(value, set) else _FROZENSET
+            return tag, frozenset(self._freeze(item, sizes) for item in value)
+        if isinstance(value, (bytearray, memoryview)):
+            return _BYTES, bytes(value)
+
+        # Array-likes, recognized structurally so NumPy need not be imported.
+        if hasattr(value, 'dtype') and hasattr(value, 'tobytes'):
+            if getattr(value, 'ndim', 0) == 0:
+                return value.item()
+            if value.nbytes > self._max_bytes:
+                raise TypeError(f'array of {value.nbytes} bytes is too large to dispatch on '
+                                f'(limit is {self._max_bytes})')
+            sizes.append(value.nbytes)
+            return _ARRAY, value.dtype.str, value.shape, value.tobytes()
+
+        try:
+            hash(value)
+        except TypeError:
+            raise TypeError(f'cannot build a structural key for {type(value).__name__!r}') from None
+
+        return value
@@ -0,0 +1,143 @@
+""" Histograms of sampled implementation latencies, per dispatch value. """
+
+import threading
+from typing import Dict, Hashable, List, Sequence
+
+# Bucket i counts latencies of i significant bits, i.e. from 2 ** (i - 1) up to 2 ** i nanoseconds. The last one
+# counts anything longer, from about 4.6 minutes.
+BUCKETS = 40
+
+
+def _quantile(counts: Sequence[int], count: int, q: float) -> int:
+    """ Upper bound, in nanoseconds, of the bucket holding the q quantile of count latencies. """
+    rank = q * count
+    seen = 0
+    for i, n in enumerate(counts):
+        seen += n
+        if seen >= rank and n:
+            return 1 << i
+
+    return 1 << (len(counts) - 1)
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class LatencyHistograms:
+    """
+    Log-scale histograms of latencies by dispatch value, accumulated per thread.
+
+    Each thread records into histograms of its own, without locking, and snapshots
+    merge those of every thread. Resetting starts new histograms for every thread,
+    so a recording in progress at the time may be lost.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._generation = 0
+
+    def record(self, value: Hashable, elapsed: int):
+        """
+        Counts a latency for value.
+
+        :param value: dispatch value.
+        :param elapsed: latency in nanoseconds.
+        """
+        local = self._local
+        histograms = getattr(local, 'histograms', None)
+        if histograms is None or local.generation != self._generation:
+            histograms = local.histograms = {}
+            local.generation = self._generation
+            with self._lock:
+                self._threads.append(histograms)
+
+        counts = histograms.get(value)
+        if counts is None:
+            # Bucket counts, then the total latency.
+            counts = histograms[value] = [0] * (BUCKETS + 1)
+
+        counts[min(elapsed.bit_length(), BUCKETS - 1)] += 1
+        counts[BUCKETS] += elapsed
+
+    def merged(self, reset: bool = False) -> Dict[Hashable, List[int]]:
+        """
+        Merges the histograms of every thread.
+
+        :param reset: whether to start over.
+        :returns: bucket counts followed by the total latency, by dispatch value.
+        """
+        with self._lock:
+            threads = self._threads
+            if reset:
+                self._threads = []
+                self._generation += 1
+
+        merged = {}
+        for histograms in threads:
+            # Copied at once, as their thread may be adding to them.
+            for value, counts in histograms.copy().items():
+                total = merged.get(value)
+                if total is None:
+                    merged[value] = list(counts)
+                else:
+                    for i, n in enumerate(counts):
+                        total[i] += n
+
+        return merged
+
+    def snapshot(self, reset: bool = False) -> Dict[Hashable, Dict]:
+        """
+        Summarizes the latencies of each dispatch value. Quantiles are the upper bounds
+        of their buckets, so are within a factor of two of the actual latencies.
+
+        :param reset: whether to start over.
+        :returns: count, mean, median, 90th and 99th percentiles in nanoseconds, and the
+            count of each non-empty bucket by its upper bound in nanoseconds, by dispatch value.
+        """
+        summaries = {}
+        for value, counts in self.merged(reset).items():
+            buckets = counts[:BUCKETS]
+            count = sum(buckets)
+            summaries[value] = {
+                'count': count,
+                'mean_ns': counts[BUCKETS] / count,
+                'p50_ns': _quantile(buckets, count, 0.5),
+                'p90_ns': _quantile(buckets, count, 0.9),
+                'p99_ns': _quantile(buckets, count, 0.99),
+                'buckets': {1 << i: n for i, n in enumerate(buckets) if n},
+            }
+
+        return summaries
+
+    def text(self, name: str) -> str:
+        """
+        Exports the histograms in the Prometheus text format, as the histogram
+        dispatch_latency_seconds labelled with the function name and the repr of the
+        dispatch value. Buckets are cumulative, and listed up to the last non-empty one.
+
+        :param name: name of the dispatch function.
+        :returns: the histograms.
+        """
+        lines = [
+            '# HELP dispatch_latency_seconds Sampled latency of dispatched implementations.',
+            '# TYPE dispatch_latency_seconds histogram',
+        ]
+        for value, counts in self.merged().items():
+            labels = f'function="{_label(name)}",value="{_label(repr(value))}"'
+            buckets = counts[:BUCKETS]
+            last = max(i for i, n in enumerate(buckets) if n)
+
+            seen = 0
+            for i in range(min(last + 1, BUCKETS - 1)):
+                seen += buckets[i]
+                lines.append(f'dispatch_latency_seconds_bucket{{{labels},le="{(1 << i) / 1e9:g}"}} {seen}')
+
+            count = sum(buckets)
+            lines.append(f'dispatch_latency_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'dispatch_latency_seconds_sum{{{labels}}} {counts[BUCKETS] / 1e9:g}')
+            lines.append(f'dispatch_latency_seconds_count{{{labels}}} {count}')
+
+        return '\n'.join(lines) + '\n'
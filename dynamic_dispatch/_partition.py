@@ -0,0 +1,241 @@
+""" Running asyncio calls concurrently across dispatch values, and in order for each value. """
+
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Partition:
+    """ Calls waiting for one partition, and whether a worker has been asked to run them. """
+
+    __slots__ = ('queue', 'pending', 'scheduled')
+
+    def __init__(self, size: int):
+        self.queue = asyncio.Queue(size)
+        # Calls waiting to be queued, queued, or running.
+        self.pending = 0
+        self.scheduled = False
+
+
+class Partitioned:
+    """
+    Runs calls of a dispatch function on a fixed number of asyncio worker tasks,
+    partitioned by dispatch value, so that calls for the same value run one at a time
+    in the order they were submitted, while calls for different values run concurrently.
+
+    Each partition has a queue of at most queue_size calls, and submitting to a full
+    one waits for room. Workers take turns between partitions, one call at a time. With
+    buckets, values are partitioned by their hash into that many partitions, bounding
+    the number of queues for many distinct values at the cost of ordering, and running
+    one at a time, calls for values sharing a bucket.
+
+    Use as an async context manager, which waits for the submitted calls to finish on
+    exit, or call start() and close().
+
+    :Example:
+
+        >>> async with handle.partitioned(workers=8) as runtime:
+        >>>     future = await runtime.submit(kind, message)
+        >>>     result = await future
+
+    :param dispatch: dispatch function, whose implementations may be coroutine functions.
+    :param workers: number of worker tasks.
+    :param queue_size: most calls queued per partition.
+    :param buckets: number of partitions to hash values into, or None for one per value.
+    :param key: gets the value to partition on from the dispatch param, by default as dispatch does, e.g. by on_attr.
+    """
+
+    def __init__(self, dispatch: Callable, workers: int = 8, queue_size: int = 64, buckets: Optional[int] = None,
+                 key: Optional[Callable[[Any], Hashable]] = None):
+        if workers < 1:
+            raise ValueError(f'number of workers must be positive, got {workers!r}')
+        if queue_size < 1:
+            raise ValueError(f'queue size must be positive, got {queue_size!r}')
+        if buckets is not None and buckets < 1:
+            raise ValueError(f'number of buckets must be positive, got {buckets!r}')
+
+        self.workers = workers
+        self.queue_size = queue_size
+        self.buckets = buckets
+        self._dispatch = dispatch
+        self._key = key if key is not None else getattr(dispatch, '_extract', None)
+
+        self._partitions = {}
+        self._ready = None
+        self._tasks = []
+        self._idle = None
+        self._pending = 0
+        self._busy = 0
+        self._calls = 0
+        self._closing = False
+
+    async def __aenter__(self) -> 'Partitioned':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                await self.join()
+        finally:
+            await self.close()
+
+    def start(self):
+        """ Starts the workers on the running event loop. """
+        if self._tasks:
+            raise RuntimeError('partitioned workers have already been started')
+
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """ Stops the workers, cancelling the calls still waiting for them. """
+        self._closing = True
+        try:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            self._closing = False
+        self._tasks = []
+
+        for partition in self._partitions.values():
+            while not partition.queue.empty():
+                _, _, future = partition.queue.get_nowait()
+                future.cancel()
+        self._partitions.clear()
+
+    async def join(self):
+        """ Waits until every call submitted so far has finished. """
+        await self._idle.wait()
+
+    def partition(self, value: Any) -> Hashable:
+        """ Partition of the given dispatch param. """
+        if self._key is not None:
+            value = self._key(value)
+
+        return value if self.buckets is None else hash(value) % self.buckets
+
+    async def submit(self, *args, **kwargs) -> asyncio.Future:
+        """
+        Queues a call of the dispatch function, waiting for room in its partition's queue.
+        The dispatch param must be passed first, positionally.
+
+        :returns: future of the result of the call.
+        """
+        if not self._tasks:
+            raise RuntimeError('partitioned workers have not been started')
+        if not args:
+            raise TypeError('partitioned calls take the dispatch param first, positionally')
+
+        key = self.partition(args[0])
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = self._partitions[key] = _Partition(self.queue_size)
+
+        future = asyncio.get_running_loop().create_future()
+
+        # Counted while waiting for room too, so that the partition isn't dropped in the meantime.
+        partition.pending += 1
+        self._pending += 1
+        self._idle.clear()
+        try:
+            await partition.queue.put((args, kwargs, future))
+        except BaseException:
+            self._finished(key, partition)
+            raise
+
+        if not partition.scheduled:
+            partition.scheduled = True
+            self._ready.put_nowait(key)
+
+        return future
+
+    async def call(self, *args, **kwargs):
+        """
+        Submits a call and waits for its result.
+
+        :returns: the result of the call.
+        """
+        return await (await self.submit(*args, **kwargs))
+
+    def depths(self) -> Dict[Hashable, int]:
+        """
+        Number of calls queued in each partition with calls queued, running or waiting for room.
+
+        :returns: queue depth by partition.
+        """
+        return {key: partition.queue.qsize() for key, partition in self._partitions.items()}
+
+    def stats(self) -> Dict[str, float]:
+        """ Number of partitions, calls queued, deepest queue, calls in progress and calls finished. """
+        depths = [partition.queue.qsize() for partition in self._partitions.values()]
+        return {
+            'partitions': len(depths),
+            'queued': sum(depths),
+            'max_depth': max(depths, default=0),
+            'pending': self._pending,
+            'busy_workers': self._busy,
+            'calls': self._calls,
+        }
+
+    async def _work(self):
+        while True:
+            key = await self._ready.get()
+            partition = self._partitions[key]
+            args, kwargs, future = partition.queue.get_nowait()
+
+            self._busy += 1
+            try:
+                await self._run(args, kwargs, future)
+            finally:
+                self._busy -= 1
+                self._calls += 1
+
+                # Back of the line, so that workers take turns between partitions.
+                if partition.queue.empty():
+                    partition.scheduled = False
+                else:
+                    self._ready.put_nowait(key)
+
+                self._finished(key, partition)
+
+    async def _run(self, args: tuple, kwargs: dict, future: asyncio.Future):
+        """ Runs a call, settling its future, and only raises if the worker itself is being cancelled. """
+        try:
+            result = self._dispatch(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            future.cancel()
+            # Implementations may raise it too, which mustn't stop the worker.
+            if self._cancelling():
+                raise
+        except Exception as e:
+            if not future.done():
+                # Without the worker's frame, which may still be running when the caller clears the traceback's
+                # frames, e.g. as unittest's assertRaises does.
+                future.set_exception(e.with_traceback(e.__traceback__.tb_next))
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    def _cancelling(self) -> bool:
+        """ Whether the running worker is being cancelled. """
+        task = asyncio.current_task()
+        if hasattr(task, 'cancelling'):
+            return task.cancelling() > 0
+
+        # Before Python 3.11, tasks don't tell until they are done, so only close() is recognized.
+        return self._closing
+
+    def _finished(self, key: Hashable, partition: _Partition):
+        partition.pending -= 1
+        if not partition.pending:
+            del self._partitions[key]
+
+        self._pending -= 1
+        if not self._pending:
+            self._idle.set()
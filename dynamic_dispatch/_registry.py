@@ -0,0 +1,110 @@
+""" The registry of a dispatcher, changed under lock and published to dispatch all at once. """
+
+import contextlib
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from ._weak import KeepAlive, WeakEntries
+
+
+class Registry:
+    """
+    Entries of a dispatcher, as (impl, idx), by dispatch value.
+
+    Dispatch reads the published table without locking, while changes are made under
+    lock. Within staged(), they are made to a copy of the table instead, which is
+    published when the outermost block exits.
+
+    :param table: initial table, a dict or CompactRegistry.
+    :param published: called with the table, under lock, whenever changes are published.
+    """
+
+    def __init__(self, table, published: Callable):
+        self.table = table
+        self.lock = threading.RLock()
+
+        # Tracks weakly registered implementations, once there are any.
+        self.weak = None
+
+        self._published = published
+        self._staged = None
+
+    def get(self, on: Hashable) -> Optional[tuple]:
+        """ The entry for on, including any staged change. """
+        return (self.table if self._staged is None else self._staged).get(on)
+
+    def __contains__(self, on: Hashable) -> bool:
+        return on in (self.table if self._staged is None else self._staged)
+
+    def track_weak(self, keep: Optional[KeepAlive]) -> WeakEntries:
+        """ The tracker of weakly registered implementations, created for the first of them. """
+        with self.lock:
+            if self.weak is None:
+                self.weak = WeakEntries(keep)
+
+            return self.weak
+
+    def set(self, on: Hashable, entry: Optional[tuple]):
+        """ Sets or, if entry is None, removes the entry for on. Called under lock. """
+        table = self.table if self._staged is None else self._staged
+
+        old = table.get(on)
+        if entry is None:
+            del table[on]
+        else:
+            table[on] = entry
+
+        if self.weak is not None:
+            self.weak.changed(on, old, entry)
+
+        if self._staged is None:
+            self._published(self.table)
+
+    def set_many(self, entries: Dict[Hashable, tuple]):
+        """ Adds entries for values which have none, all at once. Called under lock. """
+        if self._staged is not None:
+            self._staged.update(entries)
+        else:
+            # Dispatch sees either none or all of them.
+            table = self.table.copy()
+            table.update(entries)
+            self.table = table
+            self._published(table)
+
+        if self.weak is not None:
+            for on, entry in entries.items():
+                self.weak.changed(on, None, entry)
+
+    def items(self) -> Dict[Hashable, tuple]:
+        """ A snapshot of the published entries. """
+        with self.lock:
+            return dict(self.table.items())
+
+    @contextlib.contextmanager
+    def changing(self):
+        """ Holds the lock for a change, first unregistering the values of collected weak implementations. """
+        with self.lock:
+            # Within staged(), purging could be rolled back along with the block, so it waits for the next change.
+            if self.weak is not None and self._staged is None:
+                self.weak.purge(self)
+
+            yield
+
+    @contextlib.contextmanager
+    def staged(self):
+        """ Stages changes within the block, published when it exits, or discarded if it raises. """
+        with self.lock:
+            if self._staged is not None:
+                # Nested, the outermost block publishes.
+                yield
+                return
+
+            self._staged = self.table.copy()
+            try:
+                yield
+            except BaseException:
+                self._staged = None
+                raise
+
+            self.table, self._staged = self._staged, None
+            self._published(self.table)
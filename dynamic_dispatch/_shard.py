@@ -0,0 +1,298 @@
+""" Running calls on worker processes, each dispatch value always on the same one. """
+
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import numbers
+import pickle
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import connection
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from ._import import importable, load
+
+
+def _digest(text: str) -> int:
+    # Unlike hash(), the same in every process and every run.
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def _canonical(value: Hashable) -> Hashable:
+    """ Equal numbers, e.g. 1, 1.0 and True, which dispatch treats as the same value, as the same int or float. """
+    if type(value) is tuple:
+        return tuple(_canonical(item) for item in value)
+    if type(value) is int or type(value) is str or not isinstance(value, numbers.Number):
+        return value
+
+    if isinstance(value, numbers.Complex) and not isinstance(value, numbers.Real):
+        if value.imag:
+            return complex(value)
+        value = value.real
+
+    try:
+        integral = int(value)
+    except (ValueError, OverflowError):
+        # Not finite.
+        return float(value)
+
+    return integral if integral == value else float(value)
+
+
+class HashRing:
+    """
+    Consistent hashing of dispatch values onto shards.
+
+    Values are hashed by their repr, so are placed the same in every process and every
+    run as long as their repr is deterministic, e.g. for str, int and tuples of them.
+    Numbers are first made int, or else float, so that equal ones are placed together.
+    Each shard owns replicas points on the ring, and values go to the shard owning the
+    next point, so adding a shard only moves about 1 / shards of the values, all of them
+    onto the new shard.
+
+    :param shards: number of shards.
+    :param replicas: points per shard, more of which spread values more evenly.
+    """
+
+    def __init__(self, shards: int, replicas: int = 128):
+        if shards < 1:
+            raise ValueError(f'number of shards must be positive, got {shards!r}')
+        if replicas < 1:
+            raise ValueError(f'number of replicas must be positive, got {replicas!r}')
+
+        self.shards = shards
+        self.replicas = replicas
+
+        points = sorted((_digest(f'{shard}:{replica}'), shard)
+                        for shard in range(shards) for replica in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard(self, value: Hashable) -> int:
+        """ Index of the shard value is placed on. """
+        i = bisect.bisect(self._points, _digest(repr(_canonical(value))))
+        return self._owners[i % len(self._owners)]
+
+
+def _pickled(ok: bool, value: Any) -> bytes:
+    """ Pickles the outcome of a call, or if that fails, an error saying so. """
+    try:
+        outcome = pickle.dumps((ok, value))
+        if not ok:
+            # Exceptions may pickle and yet not unpickle, e.g. if their __init__ takes other arguments than they
+            # pass on to Exception's.
+            pickle.loads(outcome)
+    except Exception as e:
+        outcome = pickle.dumps((False, RuntimeError(f'the outcome of the call could not be sent back: {e!r}')))
+
+    return outcome
+
+
+def _serve(target: str, conn):
+    """ Runs calls received on conn one at a time, in order, sending back their outcomes. """
+    dispatch = load(target)
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        call, args, kwargs = request
+        try:
+            outcome = _pickled(True, dispatch(*args, **kwargs))
+        except Exception as e:
+            outcome = _pickled(False, e)
+
+        # Pickled separately from the call, so that failing to unpickle it fails only that call.
+        conn.send((call, outcome))
+
+
+class Sharded:
+    """
+    Runs calls of a dispatch function on worker processes, placing each dispatch value
+    on one of them by consistent hashing, so that state an implementation keeps per
+    value, e.g. caches, stays in one process, and calls for one value run one at a time,
+    in the order they were submitted.
+
+    Workers are spawned rather than forked, and import the dispatch function by the
+    module and name it is defined as, so it must be defined at module level and have its
+    implementations registered on import. Arguments and results are pickled.
+
+    Values are placed by their repr, the same across runs and for any number of workers,
+    with growing from n to n + 1 workers only moving about 1 / (n + 1) of the values.
+
+    :Example:
+
+        >>> with handle.sharded(workers=4) as executor:
+        >>>     future = executor.submit(kind, message)
+        >>>     result = future.result()
+
+    :param dispatch: dispatch function, importable by name.
+    :param workers: number of worker processes, or None for the number of CPUs.
+    :param replicas: points per worker on the hash ring.
+    :param key: gets the value to place from the dispatch param, by default as dispatch does, e.g. by on_attr.
+    :param mp_context: multiprocessing context to start workers with, or None for spawn.
+    """
+
+    def __init__(self, dispatch: Callable, workers: Optional[int] = None, replicas: int = 128,
+                 key: Optional[Callable[[Any], Hashable]] = None, mp_context=None):
+        module, top, attrs = importable(dispatch, 'dispatch function')
+        self.target = f'{module}:{".".join([top] + attrs)}'
+        self.ring = HashRing(workers or multiprocessing.cpu_count(), replicas)
+        self.workers = self.ring.shards
+        self._key = key if key is not None else getattr(dispatch, '_extract', None)
+
+        context = mp_context or multiprocessing.get_context('spawn')
+        self._calls = itertools.count()
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._pending = [{} for _ in range(self.workers)]
+        self._broken = [None] * self.workers
+
+        self._conns, self._sends, self._processes = [], [], []
+        for shard in range(self.workers):
+            conn, child = context.Pipe()
+            process = context.Process(target=_serve, args=(self.target, child), name=f'dispatch-shard-{shard}',
+                                      daemon=True)
+            process.start()
+            # Only the worker's end left open, so the worker exiting closes the connection.
+            child.close()
+
+            self._conns.append(conn)
+            self._sends.append(threading.Lock())
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect, name='dispatch-shard-collector', daemon=True)
+        self._collector.start()
+
+    def __enter__(self) -> 'Sharded':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shard(self, value: Any) -> int:
+        """ Index of the worker which calls for the given dispatch param run on. """
+        if self._key is not None:
+            value = self._key(value)
+
+        return self.ring.shard(value)
+
+    def submit(self, *args, **kwargs) -> Future:
+        """
+        Sends a call of the dispatch function to the worker for its dispatch value. The
+        dispatch param must be passed first, positionally.
+
+        :returns: future of the result of the call.
+        """
+        if not args:
+            raise TypeError('sharded calls take the dispatch param first, positionally')
+
+        shard = self.shard(args[0])
+        call = next(self._calls)
+        future = Future()
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot submit calls after shutdown')
+            if self._broken[shard] is not None:
+                raise self._broken[shard]
+            self._pending[shard][call] = future
+
+        try:
+            with self._sends[shard]:
+                self._conns[shard].send((call, args, kwargs))
+        except BaseException:
+            with self._lock:
+                self._pending[shard].pop(call, None)
+            raise
+
+        return future
+
+    def pending(self) -> Dict[int, int]:
+        """
+        Number of calls sent to each worker and not yet finished.
+
+        :returns: calls by worker index.
+        """
+        with self._lock:
+            return {shard: len(calls) for shard, calls in enumerate(self._pending)}
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the workers once they have run the calls submitted so far.
+
+        :param wait: whether to wait for them to stop.
+        """
+        with self._lock:
+            shutdown, self._shutdown = self._shutdown, True
+
+        if not shutdown:
+            for shard, conn in enumerate(self._conns):
+                try:
+                    with self._sends[shard]:
+                        conn.send(None)
+                except OSError:
+                    # Already gone.
+                    pass
+
+        if wait:
+            for process in self._processes:
+                process.join()
+            self._collector.join()
+
+    def _collect(self):
+        """ Resolves futures with the outcomes workers send back, until every worker has stopped. """
+        shards = {conn: shard for shard, conn in enumerate(self._conns)}
+        sentinels = {process.sentinel: shard for shard, process in enumerate(self._processes)}
+
+        while sentinels:
+            for ready in connection.wait(list(shards) + list(sentinels)):
+                if ready in shards:
+                    try:
+                        self._resolve(shards[ready], ready.recv())
+                    except EOFError:
+                        del shards[ready]
+                elif ready in sentinels:
+                    shard = sentinels.pop(ready)
+                    shards.pop(self._conns[shard], None)
+                    self._stopped(shard)
+
+    def _resolve(self, shard: int, message):
+        call, outcome = message
+        with self._lock:
+            future = self._pending[shard].pop(call)
+
+        try:
+            ok, value = pickle.loads(outcome)
+        except Exception as e:
+            ok, value = False, RuntimeError(f'the outcome of the call could not be received: {e!r}')
+
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _stopped(self, shard: int):
+        conn = self._conns[shard]
+        # Outcomes sent before stopping may not have been received yet.
+        try:
+            while conn.poll():
+                self._resolve(shard, conn.recv())
+        except (EOFError, OSError):
+            pass
+
+        with self._lock:
+            calls, self._pending[shard] = self._pending[shard], {}
+            if not self._shutdown or calls:
+                self._broken[shard] = BrokenProcessPool(
+                    f'worker {shard} for {self.target} stopped with exit code {self._processes[shard].exitcode}')
+
+        for future in calls.values():
+            future.set_exception(self._broken[shard])
+        conn.close()
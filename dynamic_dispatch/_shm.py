@@ -0,0 +1,333 @@
+""" Passing large buffers to and from worker processes through shared memory rather than pickling them. """
+
+import collections
+import sys
+import threading
+import weakref
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Before Python 3.8.
+    resource_tracker = shared_memory = None
+
+# Segments attached to in a worker process, by name. Pooled segments are reused for call after call, so staying
+# attached saves mapping them again each time. Those the caller has since unlinked stay mapped until closed, so at
+# most so many bytes of them stay attached, the most recently used.
+_ATTACHED = collections.OrderedDict()
+_MOST_ATTACHED = 256 << 20
+
+
+class _Shared:
+    """ Where a buffer was placed in shared memory, and how to rebuild it. """
+
+    __slots__ = ('name', 'kind', 'nbytes', 'dtype', 'shape', 'order')
+
+    def __init__(self, name: str, kind: str, nbytes: int, dtype: Optional[str] = None, shape: tuple = (),
+                 order: str = 'C'):
+        self.name = name
+        self.kind = kind
+        self.nbytes = nbytes
+        self.dtype = dtype
+        self.shape = shape
+        self.order = order
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+def _shareable(value: Any, threshold: int) -> bool:
+    """ Whether value is a buffer large enough to pass through shared memory. """
+    if type(value) in (bytes, bytearray):
+        return len(value) >= threshold
+
+    # Without numpy imported, there can be no arrays, so it needn't be imported to check.
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and type(value) is numpy.ndarray and not value.dtype.hasobject and \
+        value.nbytes >= threshold
+
+
+def _nbytes(value: Any) -> int:
+    return len(value) if type(value) in (bytes, bytearray) else value.nbytes
+
+
+def _place(value: Any, segment: 'shared_memory.SharedMemory') -> _Shared:
+    """ Copies value into segment. """
+    if type(value) in (bytes, bytearray):
+        segment.buf[:len(value)] = value
+        return _Shared(segment.name, type(value).__name__, len(value))
+
+    import numpy
+
+    # Keeping Fortran order, as pickling would.
+    order = 'F' if value.flags.f_contiguous and not value.flags.c_contiguous else 'C'
+    placed = numpy.ndarray(value.shape, value.dtype, buffer=segment.buf, order=order)
+    placed[...] = value
+    del placed
+
+    return _Shared(segment.name, 'ndarray', value.nbytes, value.dtype.str, value.shape, order)
+
+
+def _view(shared: _Shared, segment: 'shared_memory.SharedMemory') -> Any:
+    """ The buffer shared describes, as a view of segment for arrays, or a copy for bytes and bytearrays. """
+    if shared.kind == 'bytes':
+        return bytes(segment.buf[:shared.nbytes])
+    if shared.kind == 'bytearray':
+        return bytearray(segment.buf[:shared.nbytes])
+
+    import numpy
+    return numpy.ndarray(shared.shape, numpy.dtype(shared.dtype), buffer=segment.buf, order=shared.order)
+
+
+def _attach(name: str) -> 'shared_memory.SharedMemory':
+    segment = _ATTACHED.get(name)
+    if segment is not None:
+        _ATTACHED.move_to_end(name)
+        return segment
+
+    segment = _ATTACHED[name] = shared_memory.SharedMemory(name)
+    return segment
+
+
+def _detach():
+    """ Closes the least recently used segments beyond _MOST_ATTACHED bytes, once no call has views of them. """
+    attached = sum(segment.size for segment in _ATTACHED.values())
+    while attached > _MOST_ATTACHED:
+        _, evicted = _ATTACHED.popitem(last=False)
+        attached -= evicted.size
+        try:
+            evicted.close()
+        except BufferError:
+            # An implementation kept a view of its argument, which keeps the mapping until it is collected.
+            pass
+
+
+def _run(fn: Callable, args: tuple, kwargs: dict, threshold: int):
+    """ Calls fn in a worker with the buffers shared with it, sharing its result back if large enough. """
+    args = tuple(_view(arg, _attach(arg.name)) if type(arg) is _Shared else arg for arg in args)
+    kwargs = {name: _view(arg, _attach(arg.name)) if type(arg) is _Shared else arg for name, arg in kwargs.items()}
+
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        del args, kwargs
+        _detach()
+
+    if not _shareable(result, threshold):
+        return result
+
+    # Unlinked by the caller once it has copied the result out.
+    segment = shared_memory.SharedMemory(create=True, size=_nbytes(result))
+    try:
+        shared = _place(result, segment)
+    except BaseException:
+        segment.unlink()
+        raise
+    finally:
+        segment.close()
+
+    return shared
+
+
+class SegmentPool:
+    """
+    Shared memory segments kept for reuse, in sizes of powers of two.
+
+    Segments in use are only unlinked once released, and at most limit bytes of free
+    ones are kept. Closing unlinks every free segment and any released afterwards.
+
+    :param limit: most bytes of free segments to keep.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.created = 0
+        self.reused = 0
+        self._free = {}
+        self._free_bytes = 0
+        self._in_use = set()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> 'shared_memory.SharedMemory':
+        """ A segment of at least size bytes, not used by any other call. """
+        bits = max(size - 1, 1).bit_length()
+        with self._lock:
+            free = self._free.get(bits)
+            if free:
+                segment = free.pop()
+                self._free_bytes -= segment.size
+                self.reused += 1
+                self._in_use.add(segment)
+                return segment
+
+        segment = shared_memory.SharedMemory(create=True, size=1 << bits)
+        with self._lock:
+            self.created += 1
+            self._in_use.add(segment)
+
+        return segment
+
+    def release(self, segment: 'shared_memory.SharedMemory'):
+        """ Returns a segment for reuse, or unlinks it if the pool is full or closed. """
+        with self._lock:
+            self._in_use.discard(segment)
+            keep = not self._closed and self._free_bytes + segment.size <= self.limit
+            if keep:
+                self._free.setdefault(segment.size.bit_length() - 1, []).append(segment)
+                self._free_bytes += segment.size
+
+        if not keep:
+            _unlink(segment)
+
+    def close(self):
+        """ Unlinks every free segment, and those in use once they are released. """
+        with self._lock:
+            self._closed = True
+            free = [segment for segments in self._free.values() for segment in segments]
+            self._free.clear()
+            self._free_bytes = 0
+
+        for segment in free:
+            _unlink(segment)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'in_use': len(self._in_use),
+                'free': sum(map(len, self._free.values())),
+                'free_bytes': self._free_bytes,
+            }
+
+
+def _unlink(segment: 'shared_memory.SharedMemory'):
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _collect(shared: _Shared) -> Any:
+    """ Copies a result out of the segment a worker placed it in, and unlinks the segment. """
+    segment = shared_memory.SharedMemory(shared.name)
+    try:
+        view = _view(shared, segment)
+        result = view.copy(order='K') if shared.kind == 'ndarray' else view
+        del view
+    finally:
+        _unlink(segment)
+
+    return result
+
+
+class SharedMemoryExecutor(Executor):
+    """
+    Wraps a process pool so that large arguments and results are passed through shared
+    memory, and only a description of where to find them is pickled.
+
+    Positional and keyword arguments which are NumPy arrays, bytes or bytearrays of at
+    least threshold bytes are copied into pooled shared memory segments, reused by later
+    calls, and implementations get arrays as views of them, without copying. Results of
+    those types are placed in a segment by the worker, and copied out and unlinked by
+    the caller. Buffers nested within other arguments are pickled as usual.
+
+    Arguments are only valid for the duration of the call, as their segments are reused
+    by later calls once it finishes. Segments are unlinked on shutdown, or when this
+    executor is collected, and those of calls still in progress once they finish. The
+    pool should be wrapped before it starts any workers, so that should they crash,
+    their segments are unlinked when this process exits rather than when they do.
+
+    :Example:
+
+        >>> pool = SharedMemoryExecutor(ProcessPoolExecutor())
+        >>> handle.dispatch(impl, on=value, executor=pool)
+
+    :param executor: process pool to run calls on.
+    :param threshold: fewest bytes of a buffer to pass through shared memory.
+    :param pool_size: most bytes of unused segments to keep for reuse.
+    """
+
+    def __init__(self, executor: Executor, threshold: int = 1 << 20, pool_size: int = 1 << 30):
+        if shared_memory is None:
+            raise RuntimeError('passing buffers through shared memory requires Python 3.8 or later')
+        if threshold < 1:
+            raise ValueError(f'threshold must be positive, got {threshold!r}')
+
+        self.executor = executor
+        self.threshold = threshold
+        self.segments = SegmentPool(pool_size)
+        self._finalizer = weakref.finalize(self, self.segments.close)
+
+        # Started before the pool forks its workers, so that they share it rather than each starting one which
+        # would unlink the segments they attach to when they exit.
+        resource_tracker.ensure_running()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        used = []
+        try:
+            args = tuple(self._share(arg, used) for arg in args)
+            kwargs = {name: self._share(arg, used) for name, arg in kwargs.items()}
+            submitted = self.executor.submit(_run, fn, args, kwargs, self.threshold)
+        except BaseException:
+            for segment in used:
+                self.segments.release(segment)
+            raise
+
+        future = Future()
+
+        def cancel(future: Future):
+            if future.cancelled():
+                submitted.cancel()
+
+        def done(submitted: Future):
+            for segment in used:
+                self.segments.release(segment)
+
+            try:
+                if submitted.cancelled():
+                    future.cancel()
+                    return
+
+                error = submitted.exception()
+                if error is None:
+                    result = submitted.result()
+                    if type(result) is _Shared:
+                        # Collected even if the call was cancelled meanwhile, so that its segment is unlinked.
+                        result = _collect(result)
+            except BaseException as e:
+                error = e
+
+            if future.set_running_or_notify_cancel():
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+        future.add_done_callback(cancel)
+        submitted.add_done_callback(done)
+        return future
+
+    def _share(self, value: Any, used: List['shared_memory.SharedMemory']) -> Any:
+        if not _shareable(value, self.threshold):
+            return value
+
+        segment = self.segments.acquire(_nbytes(value))
+        used.append(segment)
+        return _place(value, segment)
+
+    def shutdown(self, wait: bool = True, **kwargs):
+        self.executor.shutdown(wait, **kwargs)
+        self._finalizer()
+
+    def stats(self) -> Dict[str, int]:
+        """ Segments created and reused, and those in use or free now, as for SegmentPool. """
+        return self.segments.stats()
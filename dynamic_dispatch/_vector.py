@@ -0,0 +1,64 @@
+""" Vectorized dispatch over arrays of dispatch values, using NumPy if it's installed. """
+
+from typing import Callable
+
+
+def _numpy():
+    try:
+        import numpy
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError('vectorized dispatch requires numpy, install dynamic_dispatch[numpy]') from None
+
+    return numpy
+
+
+def vectorize(dispatch: Callable, codes, *columns):
+    """
+    Dispatches every row of a set of columns on the matching dispatch value in codes.
+
+    Rows are partitioned by their dispatch value, and each implementation is called
+    once with the slices of the columns that belong to it. Implementations return
+    either an array with one element per row of their slice, or a scalar for all of
+    them, and the results are scattered back in the original row order.
+
+    :param dispatch: dispatch function to call.
+    :param codes: one-dimensional array-like of dispatch values.
+    :param columns: array-likes with one row per dispatch value.
+    :returns: array of results, one per row.
+    """
+    np = _numpy()
+
+    codes = np.asarray(codes)
+    if codes.ndim != 1:
+        raise ValueError(f'dispatch values must be one-dimensional, got shape {codes.shape}')
+
+    columns = [np.asarray(column) for column in columns]
+    for column in columns:
+        if len(column) != len(codes):
+            raise ValueError(f'column of length {len(column)} does not match {len(codes)} dispatch values')
+
+    values, inverse = np.unique(codes, return_inverse=True)
+    inverse = inverse.ravel()
+
+    # Group rows by value with one stable sort, each group is then a contiguous run of order.
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(values)))
+
+    out = None
+    start = 0
+    for value, stop in zip(values.tolist(), bounds.tolist()):
+        rows = order[start:stop]
+        result = np.asarray(dispatch(value, *(column[rows] for column in columns)))
+
+        if out is None:
+            out = np.empty((len(codes),) + result.shape[1:], dtype=result.dtype)
+        elif not np.can_cast(result.dtype, out.dtype):
+            out = out.astype(np.result_type(out.dtype, result.dtype))
+
+        out[rows] = result
+        start = stop
+
+    if out is None:
+        out = np.empty(0)
+
+    return out
@@ -0,0 +1,154 @@
+""" Implementations registered by weak reference, for dispatchers with implementations generated at runtime. """
+
+import collections
+import inspect
+import threading
+import weakref
+from typing import Callable, Dict, Hashable, Optional
+
+
+class KeepAlive:
+    """
+    Holds the most recently used of weakly registered implementations strongly, so that
+    those in use aren't collected as soon as nothing else refers to them.
+
+    :param size: most implementations to hold.
+    """
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError(f'must keep a positive number of implementations alive, got {size!r}')
+
+        self.size = size
+        self.evictions = 0
+        self._impls = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._impls)
+
+    def touch(self, impl: Callable):
+        """ Marks impl as the most recently used, evicting the least recently used if full. """
+        # Keyed by identity, as implementations needn't be hashable. Holding impl keeps its id unique.
+        try:
+            # Each operation on the dict is atomic, so those already kept need no lock.
+            self._impls.move_to_end(id(impl))
+        except KeyError:
+            with self._lock:
+                self._impls[id(impl)] = impl
+                self._impls.move_to_end(id(impl))
+                if len(self._impls) > self.size:
+                    self._impls.popitem(last=False)
+                    self.evictions += 1
+
+
+class Weak:
+    """
+    Calls an implementation which the registry only refers to weakly.
+
+    Once the implementation is collected, collected is called with the wrapper, to
+    unregister it, and any calls until it has been are passed to missing instead.
+
+    :param call: calls the implementation with dispatch's arguments, given (impl, idx, args, kwargs).
+    :param impl: implementation to call.
+    :param idx: index of the dispatch param in the signature of impl.
+    :param missing: called with dispatch's arguments once impl has been collected.
+    :param collected: called with the wrapper when impl is collected.
+    :param keep: holds recently used implementations strongly, if given.
+    """
+
+    def __init__(self, call: Callable, impl: Callable, idx: Optional[int], missing: Callable,
+                 collected: Callable[['Weak'], None], keep: Optional[KeepAlive] = None):
+        self._call = call
+        self._idx = idx
+        self._missing = missing
+        self._keep = keep
+
+        # Bound methods are created per access, only the method of a live object can be referred to weakly.
+        ref = weakref.WeakMethod if inspect.ismethod(impl) else weakref.ref
+        try:
+            self._ref = ref(impl, lambda _: collected(self))
+        except TypeError:
+            raise TypeError(f'{impl!r} cannot be registered weakly, as it cannot be referred to weakly') from None
+
+        if keep is not None:
+            keep.touch(impl)
+
+    @property
+    def impl(self) -> Optional[Callable]:
+        """ The implementation, or None once it has been collected. """
+        return self._ref()
+
+    def __call__(self, *args, **kwargs):
+        impl = self._ref()
+        if impl is None:
+            return self._missing(*args, **kwargs)
+
+        if self._keep is not None:
+            self._keep.touch(impl)
+
+        return self._call(impl, self._idx, args, kwargs)
+
+    def stats(self) -> Dict[str, float]:
+        return {'alive': self._ref() is not None}
+
+
+class WeakEntries:
+    """
+    Tracks the values weak implementations are registered on, to unregister them once
+    the implementations are collected.
+
+    :param keep: holds recently used implementations strongly, if given.
+    """
+
+    def __init__(self, keep: Optional[KeepAlive]):
+        self.keep = keep
+        self.collected = 0
+
+        # Values by the wrapper registered on them, and the wrappers whose implementations have been collected since.
+        self._values = {}
+        self._dead = collections.deque()
+
+    def died(self, wrapper: Weak):
+        """ Notes that the implementation of wrapper was collected, called back by the wrapper. """
+        self._dead.append(wrapper)
+
+    def changed(self, on: Hashable, old: Optional[tuple], new: Optional[tuple]):
+        """ Notes that the entry for on changed from old to new, either of which may be None. """
+        if old is not None and isinstance(old[0], Weak):
+            values = self._values.get(old[0])
+            if values is not None:
+                values.discard(on)
+                if not values:
+                    del self._values[old[0]]
+
+        if new is not None and isinstance(new[0], Weak):
+            self._values.setdefault(new[0], set()).add(on)
+
+    def purge(self, registry):
+        """ Unregisters the values of collected implementations from registry, a Registry. Called under its lock. """
+        if not self._dead:
+            return
+
+        with registry.staged():
+            while self._dead:
+                wrapper = self._dead.popleft()
+                for on in self._values.pop(wrapper, ()):
+                    entry = registry.get(on)
+                    if entry is not None and entry[0] is wrapper:
+                        registry.set(on, None)
+                        self.collected += 1
+
+    def stats(self, registry) -> Dict[str, int]:
+        """ Metrics of the implementations registered in registry, see weak_stats(). Called under its lock. """
+        implementations = values = 0
+        for wrapper, ons in self._values.items():
+            # Values may have been replaced since, e.g. within a staged change which was rolled back.
+            live = sum(1 for on in ons if (registry.get(on) or (None,))[0] is wrapper)
+            if live and wrapper.impl is not None:
+                implementations += 1
+                values += live
+
+        return {'implementations': implementations, 'values': values, 'collected': self.collected,
+                'kept': len(self.keep) if self.keep is not None else 0,
+                'evicted': self.keep.evictions if self.keep is not None else 0}
@@ -1,8 +1,16 @@
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from typing import Callable
 from unittest import TestCase
 
-from dynamic_dispatch import dynamic_dispatch
+from dynamic_dispatch import SharedMemoryExecutor, dynamic_dispatch
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Before Python 3.8.
+    shared_memory = None
 
 
 class EmptyInit:
@@ -18,6 +26,19 @@ class OneArgInit:
         self.abc_count = getattr(self, 'abc_count', 0) + 1
 
 
+@dynamic_dispatch(default=True)
+class Shape(OneArgInit):
+    pass
+
+
+class Square(Shape):
+    pass
+
+
+def _square(cls, abc) -> Square:
+    return Square(abc)
+
+
 class TestClassDispatch(TestCase):
     def test_returns_class(self):
         self.assertIsInstance(dynamic_dispatch(OneArgInit), type)
@@ -169,6 +190,105 @@ class TestClassDispatch(TestCase):
         with self.assertRaises(TypeError):
             wrapped.dispatch(type('foo', (OneArgInit,), {}), on=[])
 
+    def test_register_structural(self):
+        wrapped = dynamic_dispatch(OneArgInit, structural=True)
+
+        class Foo(OneArgInit):
+            pass
+
+        wrapped.dispatch(Foo, on=['a', 'b'])
+        obj = wrapped(['a', 'b'])
+
+        self.assertIsInstance(obj, Foo)
+        self.assertEqual(obj.abc, ['a', 'b'])
+        self.assertEqual(obj.abc_count, 1)
+
+    def test_replace(self):
+        wrapped = dynamic_dispatch(OneArgInit)
+        wrapped.dispatch(type('foo', (OneArgInit,), {}), on=1)
+
+        bar = type('bar', (OneArgInit,), {})
+        reg = wrapped.replace(bar, on=1)
+
+        obj = wrapped(1)
+        self.assertIsInstance(obj, bar)
+        self.assertIs(type(obj), reg)
+
+    def test_unregister(self):
+        wrapped = dynamic_dispatch(OneArgInit, default=True)
+        wrapped.dispatch(type('foo', (OneArgInit,), {}), on=1)
+
+        with wrapped.update():
+            wrapped.unregister(1)
+            wrapped.dispatch(type('bar', (OneArgInit,), {}), on=2)
+
+        self.assertIs(type(wrapped(1)), wrapped)
+        self.assertEqual(type(wrapped(2)).__name__, 'bar')
+
+    def test_override(self):
+        wrapped = dynamic_dispatch(OneArgInit)
+        foo = wrapped.dispatch(type('foo', (OneArgInit,), {}), on=1)
+
+        with wrapped.override({1: type('bar', (OneArgInit,), {})}):
+            obj = wrapped(1)
+
+        self.assertEqual(type(obj).__name__, 'bar')
+        self.assertEqual(obj.abc, 1)
+        self.assertIsInstance(wrapped(1), foo)
+
+    def test_balance(self):
+        wrapped = dynamic_dispatch(OneArgInit)
+        foo = wrapped.dispatch(type('foo', (OneArgInit,), {}), on=1, balance='round_robin')
+        bar = wrapped.dispatch(type('bar', (OneArgInit,), {}), on=1, balance='round_robin')
+
+        objs = [wrapped(1) for _ in range(4)]
+
+        self.assertEqual([type(obj) for obj in objs], [foo, bar, foo, bar])
+        self.assertEqual([obj.abc for obj in objs], [1] * 4)
+
+    def test_executor(self):
+        wrapped = dynamic_dispatch(OneArgInit, default=True)
+
+        class Foo(OneArgInit):
+            def __init__(self, bar):
+                super().__init__(1)
+                self.bar = bar
+                self.thread = threading.current_thread()
+
+        with ThreadPoolExecutor(1) as pool:
+            wrapped.dispatch(Foo, on=1, executor=pool)
+
+            future = wrapped(1, 2)
+            self.assertIsInstance(future, Future)
+
+            obj = future.result()
+            self.assertIsInstance(obj, Foo)
+            self.assertEqual(obj.abc, 1)
+            self.assertEqual(obj.abc_count, 1)
+            self.assertEqual(obj.bar, 2)
+            self.assertIsNot(obj.thread, threading.current_thread())
+
+        self.assertIsInstance(wrapped(2), OneArgInit)
+
+    def test_executor_process(self):
+        with ProcessPoolExecutor(1) as pool:
+            with self.assertRaisesRegex(TypeError, 'cannot be instantiated on a process pool'):
+                Shape.dispatch(Square, on='square', executor=pool)
+            if shared_memory is not None:
+                with self.assertRaisesRegex(TypeError, 'cannot be instantiated on a process pool'):
+                    Shape.dispatch(Square, on='square', executor=SharedMemoryExecutor(pool))
+            with self.assertRaisesRegex(TypeError, 'cannot be instantiated on a process pool'):
+                Shape.dispatch_many({'square': Square}, executor=pool)
+
+            Shape.dispatch(_square, on='square', executor=pool)
+            try:
+                square = Shape('square').result()
+            finally:
+                Shape.unregister('square')
+
+        self.assertIsInstance(square, Square)
+        self.assertEqual(square.abc, 'square')
+
     def test_register_no_value(self):
         wrapped = dynamic_dispatch(OneArgInit)
 
@@ -569,3 +689,69 @@ class TestClassDispatch(TestCase):
         self.assertEqual(obj.d_count, 1)
         self.assertEqual(obj.e, 'e')
         self.assertEqual(obj.e_count, 1)
+
+    def test_on_item(self):
+        @dynamic_dispatch(default=True, on_item='type')
+        class Foo(OneArgInit):
+            pass
+
+        @Foo.dispatch(on='bar')
+        class Bar(Foo):
+            pass
+
+        self.assertIsInstance(Foo({'type': 'bar'}), Bar)
+        self.assertEqual(Foo({'type': 'bar'}).abc, {'type': 'bar'})
+        self.assertNotIsInstance(Foo({'type': 'baz'}), Bar)
+
+        with self.assertRaises(KeyError):
+            Foo({})
+
+    def test_resolve(self):
+        @dynamic_dispatch(default=True)
+        class Foo(OneArgInit):
+            pass
+
+        @Foo.dispatch(on=1)
+        class Bar(Foo):
+            def __init__(self, a):
+                super().__init__(1)
+                self.a = a
+
+        bar = Foo.resolve(1)(1, 2)
+        self.assertIsInstance(bar, Bar)
+        self.assertEqual(bar.a, 2)
+        self.assertEqual(bar.abc_count, 1)
+
+        foo = Foo.resolve(2)(2)
+        self.assertIs(type(foo), Foo)
+        self.assertEqual(foo.abc, 2)
+        self.assertEqual(foo.abc_count, 1)
+
+    def test_resolve_no_default(self):
+        @dynamic_dispatch
+        class Foo(OneArgInit):
+            pass
+
+        self.assertIsNone(Foo.resolve(1))
+        Foo.dispatch(Foo, on=1)
+        self.assertEqual(Foo.resolve(1).version, 1)
+
+    def test_dispatch_many(self):
+        @dynamic_dispatch
+        class Foo(OneArgInit):
+            pass
+
+        class Bar(Foo):
+            pass
+
+        class Baz(Foo):
+            pass
+
+        Foo.dispatch_many({1: Bar, 2: Bar, 3: Baz})
+        Foo.dispatch(Baz, on=[4, 5])
+
+        self.assertIsInstance(Foo(1), Bar)
+        self.assertIs(type(Foo(1)), type(Foo(2)))
+        self.assertIsInstance(Foo(3), Baz)
+        self.assertIsInstance(Foo(5), Baz)
+        self.assertEqual(Foo(5).abc_count, 1)
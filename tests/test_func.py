@@ -1,8 +1,49 @@
+import asyncio
+import gc
+import inspect
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Callable
-from unittest import TestCase
-from unittest.mock import create_autospec
+from unittest import TestCase, skipIf, skipUnless
+from unittest.mock import create_autospec, patch
 
-from dynamic_dispatch import dynamic_dispatch
+from dynamic_dispatch import Rejected, SharedMemoryExecutor, binary_dispatch, dynamic_dispatch
+from dynamic_dispatch.__main__ import main
+from dynamic_dispatch import _shm
+from dynamic_dispatch._adaptive import RESAMPLER
+from dynamic_dispatch._keys import StructuralKeys
+from dynamic_dispatch._shard import HashRing
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Before Python 3.8.
+    shared_memory = None
+
+
+def _square(x):
+    return x * x
+
+
+def _scaled(a, factor=1):
+    return a * factor, a.flags.f_contiguous
+
+
+def _reversed(data):
+    return data[::-1]
 
 
 class TestFuncDispatch(TestCase):
@@ -354,3 +395,1950 @@ class TestFuncDispatch(TestCase):
                 @dynamic_dispatch
                 def member(self):
                     pass
+
+    def test_dispatch_unhashable_type_error(self):
+        wrapped = dynamic_dispatch(lambda _: _, default=True)
+
+        with self.assertRaises(TypeError):
+            wrapped([1, 2])
+
+    def test_register_structural(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+
+        impl = create_autospec(lambda a: a)
+        wrapped.dispatch(impl, on=[1, {'a': [2]}])
+
+        wrapped([1, {'a': [2]}], 3)
+        impl.assert_called_once_with(3)
+
+    def test_register_structural_duplicate_value(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+        wrapped.dispatch(lambda _: _, on=[1, 2])
+
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda _: _, on=[1, 2])
+
+    def test_register_structural_container_types(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+        wrapped.dispatch(lambda: 'list', on=[1, 2])
+        wrapped.dispatch(lambda: 'tuple', on=(1, 2))
+        wrapped.dispatch(lambda: 'dict', on={'a': 1})
+        wrapped.dispatch(lambda: 'set', on={('a', 1)})
+        wrapped.dispatch(lambda: 'nested list', on=[[1]])
+        wrapped.dispatch(lambda: 'nested set', on=[{1}])
+        wrapped.dispatch(lambda: 'nested frozenset', on=[frozenset({1})])
+
+        self.assertEqual(wrapped([1, 2]), 'list')
+        self.assertEqual(wrapped((1, 2)), 'tuple')
+        self.assertEqual(wrapped({'a': 1}), 'dict')
+        self.assertEqual(wrapped({('a', 1)}), 'set')
+        self.assertEqual(wrapped([[1]]), 'nested list')
+        self.assertEqual(wrapped([{1}]), 'nested set')
+        self.assertEqual(wrapped([frozenset({1})]), 'nested frozenset')
+
+        with self.assertRaises(ValueError):
+            wrapped([(1,)])
+
+    def test_structural_memo_bounded(self):
+        keys = StructuralKeys(memo_bytes=10000)
+
+        values = [[i] * 100 for i in range(100)]
+        for value in values:
+            self.assertEqual(keys(value), keys([value[0]] * 100))
+
+        self.assertLessEqual(keys._memoized, 10000)
+        self.assertLess(len(keys._memo), 100)
+        self.assertIs(keys._memo[id(values[-1])][0], values[-1])
+
+        large = list(range(10000))
+        keys(large)
+        self.assertNotIn(id(large), keys._memo)
+
+    def test_dispatch_structural_hashable(self):
+        default = create_autospec(lambda _: _)
+        wrapped = dynamic_dispatch(default, default=True, structural=True)
+
+        impl = create_autospec(lambda: None)
+        wrapped.dispatch(impl, on=1)
+
+        wrapped(1)
+        wrapped({'b': 2})
+
+        impl.assert_called_once_with()
+        default.assert_called_once_with({'b': 2})
+
+    def test_dispatch_structural_passes_original(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+
+        impl = create_autospec(lambda _: _)
+        wrapped.dispatch(impl, on={'a': {1, 2}})
+
+        value = {'a': {2, 1}}
+        wrapped(value)
+        wrapped(value)
+
+        impl.assert_called_with(value)
+        self.assertIs(impl.call_args[0][0], value)
+        self.assertEqual(impl.call_count, 2)
+
+    def test_dispatch_structural_unknown(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+        wrapped.dispatch(lambda: None, on=[1])
+
+        with self.assertRaises(ValueError):
+            wrapped([2])
+
+    def test_unregister(self):
+        default = create_autospec(lambda _: _)
+        wrapped = dynamic_dispatch(default, default=True)
+        wrapped.dispatch(lambda: None, on=1)
+
+        wrapped.unregister(1)
+        wrapped(1)
+
+        default.assert_called_once_with(1)
+
+    def test_unregister_unknown(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.unregister(1)
+
+    def test_unregister_structural(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+        wrapped.dispatch(lambda: None, on=[1])
+
+        wrapped.unregister([1])
+
+        with self.assertRaises(ValueError):
+            wrapped([1])
+
+    def test_replace(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 1, on=1)
+
+        impl = create_autospec(lambda _: _)
+        self.assertIs(wrapped.replace(impl, on=1), impl)
+        wrapped(1)
+
+        impl.assert_called_once_with(1)
+
+    def test_replace_decorator(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 1, on=1)
+
+        @wrapped.replace(on=1)
+        def _():
+            return 2
+
+        self.assertEqual(wrapped(1), 2)
+
+    def test_replace_unknown(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.replace(lambda: None, on=1)
+
+    def test_update(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 1, on=1)
+        version = wrapped.version
+
+        with wrapped.update():
+            wrapped.unregister(1)
+            wrapped.dispatch(lambda: 2, on=2)
+            wrapped.replace(lambda: 3, on=2)
+
+            # Nothing is visible until the block exits.
+            self.assertEqual(wrapped(1), 1)
+            with self.assertRaises(ValueError):
+                wrapped(2)
+
+            with wrapped.update():
+                wrapped.dispatch(lambda: 4, on=4)
+            self.assertEqual(wrapped.version, version)
+
+        self.assertEqual(wrapped.version, version + 1)
+        self.assertEqual(wrapped(2), 3)
+        self.assertEqual(wrapped(4), 4)
+        with self.assertRaises(ValueError):
+            wrapped(1)
+
+    def test_update_rollback(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 1, on=1)
+        version = wrapped.version
+
+        with self.assertRaises(KeyError):
+            with wrapped.update():
+                wrapped.unregister(1)
+                raise KeyError
+
+        self.assertEqual(wrapped.version, version)
+        self.assertEqual(wrapped(1), 1)
+
+    def test_update_blocks_other_threads(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        started = threading.Event()
+
+        def register():
+            started.set()
+            wrapped.dispatch(lambda: 2, on=2)
+
+        with wrapped.update():
+            wrapped.dispatch(lambda: 1, on=1)
+
+            thread = threading.Thread(target=register)
+            thread.start()
+            started.wait()
+            thread.join(0.05)
+
+            self.assertTrue(thread.is_alive())
+            with self.assertRaises(ValueError):
+                wrapped(2)
+
+        thread.join()
+        self.assertEqual(wrapped(1), 1)
+        self.assertEqual(wrapped(2), 2)
+
+    def test_override(self):
+        default = create_autospec(lambda _: _)
+        wrapped = dynamic_dispatch(default, default=True)
+        wrapped.dispatch(lambda: 1, on=1)
+
+        with wrapped.override({1: lambda: -1, 2: lambda _: -_}):
+            self.assertEqual(wrapped(1), -1)
+            self.assertEqual(wrapped(2), -2)
+
+            with wrapped.override({2: lambda: -3}):
+                self.assertEqual(wrapped(1), -1)
+                self.assertEqual(wrapped(2), -3)
+
+            self.assertEqual(wrapped(2), -2)
+
+        self.assertEqual(wrapped(1), 1)
+        wrapped(2)
+        default.assert_called_once_with(2)
+
+    def test_override_generic(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda a: a, on=1)
+
+        with wrapped.override({1: lambda a, b: (a, b)}):
+            self.assertEqual(wrapped(1, 2, 3), (2, 3))
+
+        self.assertEqual(wrapped(1, 2), 2)
+
+    def test_override_threads(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'registry', on=1)
+
+        results = []
+        with wrapped.override({1: lambda: 'overlay'}):
+            thread = threading.Thread(target=lambda: results.append(wrapped(1)))
+            thread.start()
+            thread.join()
+
+            self.assertEqual(wrapped(1), 'overlay')
+
+        self.assertEqual(results, ['registry'])
+
+    def test_override_tasks(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'registry', on=1)
+
+        async def overridden(started, done):
+            with wrapped.override({1: lambda: 'overlay'}):
+                started.set()
+                await done.wait()
+                return wrapped(1)
+
+        async def main():
+            started, done = asyncio.Event(), asyncio.Event()
+            task = asyncio.ensure_future(overridden(started, done))
+
+            await started.wait()
+            result = wrapped(1)
+            done.set()
+
+            return result, await task
+
+        self.assertEqual(asyncio.run(main()), ('registry', 'overlay'))
+
+    def test_override_structural(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+        wrapped.dispatch(lambda: 1, on=[1])
+        wrapped.dispatch(lambda: 1, on=({1},))
+
+        with wrapped.override({(1,): lambda: 2, (frozenset({1}),): lambda: 3}):
+            self.assertEqual(wrapped([1]), 1)
+            self.assertEqual(wrapped((1,)), 2)
+            self.assertEqual(wrapped(({1},)), 1)
+            self.assertEqual(wrapped((frozenset({1}),)), 3)
+
+    def test_balance_round_robin(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'a', on=1, balance='round_robin')
+        wrapped.dispatch(lambda _: _ + 1, on=1, balance='round_robin')
+
+        @wrapped.dispatch(on=1, balance='round_robin')
+        def _(x, _):
+            return x
+
+        self.assertEqual([wrapped(1, 'x') if i % 3 == 2 else wrapped(1) for i in range(6)], ['a', 2, 'x'] * 2)
+
+    def test_balance_random(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'a', on=1, balance='random')
+        wrapped.dispatch(lambda: 'b', on=1, balance='random')
+
+        random.seed(0)
+        self.assertEqual({wrapped(1) for _ in range(100)}, {'a', 'b'})
+
+    def test_balance_weighted(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'a', on=1, balance='weighted', weight=1)
+        wrapped.dispatch(lambda: 'b', on=1, balance='weighted', weight=3)
+
+        random.seed(0)
+        results = [wrapped(1) for _ in range(1000)]
+        self.assertAlmostEqual(results.count('b') / len(results), 0.75, delta=0.05)
+
+    def test_balance_weight_positive(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, balance='weighted', weight=0)
+
+    def test_balance_least_in_flight(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait()
+            return 'slow'
+
+        wrapped.dispatch(slow, on=1, balance='least_in_flight')
+        wrapped.dispatch(lambda: 'fast', on=1, balance='least_in_flight')
+
+        thread = threading.Thread(target=wrapped, args=(1,))
+        thread.start()
+        started.wait()
+
+        # The first is busy, so calls go to the second.
+        self.assertEqual([wrapped(1), wrapped(1)], ['fast', 'fast'])
+
+        release.set()
+        thread.join()
+
+    def test_balance_least_in_flight_async(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        release = None
+
+        async def slow():
+            await release.wait()
+            return 'slow'
+
+        async def fast():
+            return 'fast'
+
+        wrapped.dispatch(slow, on=1, balance='least_in_flight')
+        wrapped.dispatch(fast, on=1, balance='least_in_flight')
+        balancer = wrapped._describe()['entries'][1][0]
+
+        async def run():
+            # Created on the loop it is awaited on, as before Python 3.10 events bind to the loop current then.
+            nonlocal release
+            release = asyncio.Event()
+
+            # Still counted once the call has returned its coroutine, until that finishes.
+            task = asyncio.ensure_future(wrapped(1))
+            await asyncio.sleep(0)
+            self.assertEqual(balancer.in_flight(), (1, 0))
+
+            self.assertEqual([await wrapped(1), await wrapped(1)], ['fast', 'fast'])
+
+            release.set()
+            self.assertEqual(await task, 'slow')
+            self.assertEqual(balancer.in_flight(), (0, 0))
+
+        asyncio.run(run())
+
+    def test_balance_least_in_flight_executor(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        release = threading.Event()
+
+        with ThreadPoolExecutor(2) as executor:
+            wrapped.dispatch(lambda: release.wait() and 'slow', on=1, balance='least_in_flight', executor=executor)
+            wrapped.dispatch(lambda: 'fast', on=1, balance='least_in_flight', executor=executor)
+            balancer = wrapped._describe()['entries'][1][0]
+
+            slow = wrapped(1)
+            self.assertEqual(balancer.in_flight(), (1, 0))
+            self.assertEqual([wrapped(1).result(), wrapped(1).result()], ['fast', 'fast'])
+
+            release.set()
+            self.assertEqual(slow.result(), 'slow')
+            # Done callbacks run after result() returns.
+            executor.shutdown()
+            self.assertEqual(balancer.in_flight(), (0, 0))
+
+    def test_balance_unknown_strategy(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, balance='fastest')
+
+    def test_balance_duplicate(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: None, on=1)
+        wrapped.dispatch(lambda: None, on=2, balance='random')
+
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, balance='random')
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=2)
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=2, balance='round_robin')
+
+    def test_balance_update(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'a', on=1, balance='round_robin')
+
+        with wrapped.update():
+            wrapped.dispatch(lambda: 'b', on=1, balance='round_robin')
+            self.assertEqual({wrapped(1) for _ in range(4)}, {'a'})
+
+        self.assertEqual({wrapped(1) for _ in range(4)}, {'a', 'b'})
+
+    def test_executor(self):
+        wrapped = dynamic_dispatch(lambda _: _, default=True)
+
+        with ThreadPoolExecutor(1) as pool:
+            wrapped.dispatch(lambda a: (threading.current_thread(), a), on=1, executor=pool)
+
+            future = wrapped(1, 2)
+            self.assertIsInstance(future, Future)
+
+            thread, a = future.result()
+            self.assertIsNot(thread, threading.current_thread())
+            self.assertEqual(a, 2)
+
+            # Other values are still called directly.
+            self.assertEqual(wrapped(2), 2)
+
+    def test_executor_process(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with ProcessPoolExecutor(1) as pool:
+            wrapped.dispatch(_square, on='square', executor=pool)
+
+            self.assertEqual(wrapped('square', 3).result(), 9)
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    @skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_executor_shared_memory(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with SharedMemoryExecutor(ProcessPoolExecutor(1), threshold=1024, pool_size=1 << 20) as pool:
+            wrapped.dispatch(_scaled, on='scale', executor=pool)
+            wrapped.dispatch(_reversed, on='reverse', executor=pool)
+
+            array = numpy.arange(10_000, dtype=numpy.float64).reshape(100, 100)
+            for _ in range(3):
+                result, fortran = wrapped('scale', array, factor=2).result()
+                numpy.testing.assert_array_equal(result, array * 2)
+                self.assertFalse(fortran)
+
+            # Layout is kept, as when pickling.
+            result, fortran = wrapped('scale', numpy.asfortranarray(array)).result()
+            numpy.testing.assert_array_equal(result, array)
+            self.assertTrue(fortran)
+            self.assertTrue(result.flags.f_contiguous)
+
+            data = bytes(range(256)) * 16
+            self.assertEqual(wrapped('reverse', data).result(), data[::-1])
+            self.assertEqual(wrapped('reverse', bytearray(data)).result(), bytearray(data[::-1]))
+
+            # Small arguments are pickled as usual.
+            self.assertEqual(wrapped('reverse', b'abc').result(), b'cba')
+            with self.assertRaises(TypeError):
+                wrapped('scale', None).result()
+
+            # One segment per size is reused for call after call, and none are left in use.
+            stats = pool.stats()
+            self.assertEqual(stats['created'], 2)
+            self.assertEqual(stats['reused'], 4)
+            self.assertEqual(stats['in_use'], 0)
+
+            names = [segment.name for segments in pool.segments._free.values() for segment in segments]
+
+        self.assertEqual(pool.stats()['free'], 0)
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name)
+
+        with self.assertRaises(ValueError):
+            SharedMemoryExecutor(ThreadPoolExecutor(1), threshold=0)
+
+    @skipIf(shared_memory is None, 'shared memory requires Python 3.8 or later')
+    def test_executor_shared_memory_detached(self):
+        segments = [shared_memory.SharedMemory(create=True, size=1 << 16) for _ in range(3)]
+        try:
+            # Workers stay attached to the most recently used segments, up to a bound in bytes.
+            with patch.object(_shm, '_MOST_ATTACHED', sum(segment.size for segment in segments[1:])):
+                for segment in segments:
+                    shared = _shm._place(bytes(1 << 16), segment)
+                    self.assertEqual(_shm._run(len, (shared,), {}, 1 << 20), 1 << 16)
+
+                self.assertEqual(list(_shm._ATTACHED), [segment.name for segment in segments[1:]])
+        finally:
+            while _shm._ATTACHED:
+                _shm._ATTACHED.popitem()[1].close()
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+    def test_executor_asyncio(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        async def main():
+            return await wrapped(1, 3)
+
+        with ThreadPoolExecutor(1) as pool:
+            wrapped.dispatch(lambda a: a + 1, on=1, executor=pool)
+
+            self.assertEqual(asyncio.run(main()), 4)
+
+    def test_executor_balance(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with ThreadPoolExecutor(1) as pool:
+            wrapped.dispatch(lambda: 'pool', on=1, balance='round_robin', executor=pool)
+            wrapped.dispatch(lambda: 'direct', on=1, balance='round_robin')
+
+            self.assertEqual(wrapped(1).result(), 'pool')
+            self.assertEqual(wrapped(1), 'direct')
+
+    def test_executor_replace(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 'direct', on=1)
+
+        with ThreadPoolExecutor(1) as pool:
+            wrapped.replace(lambda: 'pool', on=1, executor=pool)
+
+            self.assertEqual(wrapped(1).result(), 'pool')
+
+    def test_batch(self):
+        @dynamic_dispatch
+        def load(kind, key):
+            pass
+
+        batches = []
+
+        @load.dispatch(on='user', batch_size=3)
+        async def _(keys):
+            batches.append(keys)
+            return [key * 10 for key in keys]
+
+        async def main():
+            return await asyncio.gather(*(load('user', key) for key in range(5)))
+
+        self.assertEqual(asyncio.run(main()), [0, 10, 20, 30, 40])
+        self.assertEqual(batches, [[0, 1, 2], [3, 4]])
+        self.assertEqual(load.stats('user'), {'batches': 2, 'calls': 5, 'largest_batch': 3, 'mean_batch': 2.5})
+
+    def test_batch_window(self):
+        @dynamic_dispatch
+        def load(kind, a, b):
+            pass
+
+        batches = []
+
+        @load.dispatch(on=1, batch_window=0.05)
+        def _(a, b):
+            batches.append((a, b))
+            return [x + y for x, y in zip(a, b)]
+
+        async def main():
+            first = load(1, 1, 2)
+            await asyncio.sleep(0)
+            second = load(1, b=4, a=3)
+            return await first, await second
+
+        self.assertEqual(asyncio.run(main()), (3, 7))
+        self.assertEqual(batches, [([1, 3], [2, 4])])
+
+    def test_batch_errors(self):
+        wrapped = dynamic_dispatch(lambda _, a: _)
+
+        @wrapped.dispatch(on=1, batch_size=2)
+        def _(a):
+            raise KeyError(a)
+
+        @wrapped.dispatch(on=2, batch_size=2)
+        def _(a):
+            return a[:1]
+
+        async def main():
+            return await asyncio.gather(wrapped(1, 1), wrapped(1, 2), wrapped(2, 1), wrapped(2, 2),
+                                        return_exceptions=True)
+
+        failed, _, short, _ = asyncio.run(main())
+        self.assertIsInstance(failed, KeyError)
+        self.assertIsInstance(short, ValueError)
+
+        with self.assertRaises(RuntimeError):
+            wrapped(1, 1)
+
+    def test_batch_cancelled(self):
+        wrapped = dynamic_dispatch(lambda _, a: _)
+        started = None
+
+        @wrapped.dispatch(on=1, batch_size=2)
+        async def _(a):
+            started.set()
+            await asyncio.Event().wait()
+
+        batch = wrapped._describe()['entries'][1][0]
+
+        async def main():
+            # Created on the loop it is awaited on, as before Python 3.10 events bind to the loop current then.
+            nonlocal started
+            started = asyncio.Event()
+
+            calls = asyncio.gather(wrapped(1, 1), wrapped(1, 2), return_exceptions=True)
+            await started.wait()
+
+            # The batch is only referred to by the dispatcher, yet survives a collection.
+            gc.collect()
+            running, = batch._running
+            running.cancel()
+
+            results = await calls
+            self.assertFalse(batch._running)
+            return results
+
+        for result in asyncio.run(main()):
+            self.assertIsInstance(result, asyncio.CancelledError)
+
+    def test_batch_invalid(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, batch_size=0)
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, batch_window=-1)
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, batch_size=2, balance='random')
+        with ThreadPoolExecutor(1) as pool, self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, batch_size=2, executor=pool)
+
+        wrapped.dispatch(lambda: None, on=2)
+        self.assertEqual(wrapped.stats(2), {})
+        with self.assertRaises(ValueError):
+            wrapped.stats(3)
+
+    def test_concurrency(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        entered, release = threading.Semaphore(0), threading.Event()
+
+        @wrapped.dispatch(on=1, concurrency=2, queue_limit=1)
+        def _():
+            entered.release()
+            release.wait()
+
+        wrapped.dispatch(lambda: 'healthy', on=2)
+
+        threads = [threading.Thread(target=wrapped, args=(1,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+
+        # Two calls are in progress and the third waits, so a fourth is turned away.
+        entered.acquire()
+        entered.acquire()
+        while wrapped.stats(1)['waiting'] < 1:
+            pass
+
+        with self.assertRaises(Rejected):
+            wrapped(1)
+        self.assertEqual(wrapped(2), 'healthy')
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(wrapped.stats(1), {'limit': 2, 'waiting': 0, 'waits': 1, 'rejections': 1})
+
+    def test_concurrency_async(self):
+        wrapped = dynamic_dispatch(lambda _, a: _)
+        in_progress, most = 0, 0
+
+        @wrapped.dispatch(on=1, concurrency=2)
+        async def _(a):
+            nonlocal in_progress, most
+            in_progress += 1
+            most = max(most, in_progress)
+            await asyncio.sleep(0.01)
+            in_progress -= 1
+            return a
+
+        async def main():
+            return await asyncio.gather(*(wrapped(1, a) for a in range(5)))
+
+        self.assertEqual(asyncio.run(main()), list(range(5)))
+        self.assertEqual(most, 2)
+        self.assertEqual(wrapped.stats(1)['waits'], 3)
+
+    def test_concurrency_executor(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        entered, release = threading.Event(), threading.Event()
+
+        def impl():
+            entered.set()
+            return release.wait()
+
+        with ThreadPoolExecutor(2) as pool:
+            wrapped.dispatch(impl, on=1, concurrency=1, queue_limit=0, executor=pool)
+
+            first = wrapped(1)
+            entered.wait()
+
+            # Rejected by the caller, before submitting.
+            with self.assertRaises(Rejected):
+                wrapped(1)
+            release.set()
+            self.assertTrue(first.result())
+
+            # The slot is released once the future is done.
+            self.assertTrue(wrapped(1).result())
+
+        self.assertEqual(wrapped.stats(1)['rejections'], 1)
+
+    def test_concurrency_executor_async(self):
+        wrapped = dynamic_dispatch(lambda _, a: _)
+
+        def impl(a):
+            time.sleep(0.01)
+            return a
+
+        async def main():
+            # The second call waits its turn without blocking the loop the first call's future completes on.
+            first, second = wrapped(1, 'first'), wrapped(1, 'second')
+            self.assertEqual(wrapped.stats(1)['waiting'], 1)
+            return await asyncio.wait_for(asyncio.gather(first, second), 5)
+
+        with ThreadPoolExecutor(2) as pool:
+            wrapped.dispatch(impl, on=1, concurrency=1, executor=pool)
+            self.assertEqual(asyncio.run(main()), ['first', 'second'])
+
+            # Slots released to callers on the loop are available to any caller after.
+            self.assertEqual(wrapped(1, 'third').result(timeout=5), 'third')
+
+        self.assertEqual(wrapped.stats(1), {'limit': 1, 'waiting': 0, 'waits': 1, 'rejections': 0})
+
+    def test_concurrency_executor_waits_in_caller(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        entered, release = threading.Event(), threading.Event()
+
+        def slow():
+            entered.set()
+            return release.wait()
+
+        with ThreadPoolExecutor(2) as pool:
+            wrapped.dispatch(slow, on='slow', concurrency=1, executor=pool)
+            wrapped.dispatch(lambda: 'fast', on='fast', executor=pool)
+
+            futures = []
+            callers = [threading.Thread(target=lambda: futures.append(wrapped('slow'))) for _ in range(3)]
+            for caller in callers:
+                caller.start()
+            entered.wait()
+            while wrapped.stats('slow')['waiting'] < 2:
+                time.sleep(0.001)
+
+            # Calls waiting for the slow implementation wait in their callers, not on the pool's workers.
+            self.assertEqual(wrapped('fast').result(timeout=5), 'fast')
+
+            release.set()
+            for caller in callers:
+                caller.join()
+            self.assertEqual([future.result() for future in futures], [True] * 3)
+
+    def test_concurrency_invalid(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, concurrency=0)
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, queue_limit=1)
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: None, on=1, concurrency=1, batch_size=2)
+
+    def test_on_attr(self):
+        class Message:
+            def __init__(self, kind):
+                self.kind = kind
+
+        @dynamic_dispatch(default=True, on_attr='kind')
+        def handle(msg, extra):
+            return 'default'
+
+        @handle.dispatch(on='ping')
+        def _(msg, extra):
+            return msg, extra
+
+        ping = Message('ping')
+        self.assertEqual(handle(ping, 1), (ping, 1))
+        self.assertEqual(handle(extra=2, msg=ping), (ping, 2))
+        self.assertEqual(handle(Message('pong'), 1), 'default')
+
+        with handle.override({'pong': lambda msg, extra: 'overridden'}):
+            self.assertEqual(handle(Message('pong'), 1), 'overridden')
+
+        derived = handle.extend()
+        derived.dispatch(lambda msg, extra: 'derived', on='pong')
+        self.assertEqual(derived(Message('pong'), 1), 'derived')
+        self.assertEqual(derived(ping, 1), (ping, 1))
+
+        with self.assertRaises(AttributeError):
+            handle(object(), 1)
+
+    def test_on_item(self):
+        @dynamic_dispatch(on_item='type', structural=True)
+        def handle(msg):
+            pass
+
+        @handle.dispatch(on=['a', 'b'])
+        def _(msg):
+            return msg['body']
+
+        self.assertEqual(handle({'type': ['a', 'b'], 'body': 1}), 1)
+
+        with self.assertRaises(KeyError):
+            handle({})
+        with self.assertRaises(ValueError):
+            dynamic_dispatch(lambda msg: None, on_attr='kind', on_item='type')
+
+    def test_binary_route(self):
+        @binary_dispatch(header='>H', default=True)
+        def handle(kind, body, extra):
+            return kind
+
+        @handle.dispatch(on=1)
+        def _(body, extra):
+            return body, extra
+
+        frame = bytearray(b'\x00\x01hello')
+        body, extra = handle.route(frame, 'extra')
+        self.assertIsInstance(body, memoryview)
+        self.assertIs(body.obj, frame)
+        self.assertEqual(bytes(body), b'hello')
+        self.assertEqual(extra, 'extra')
+
+        self.assertEqual(handle.route(memoryview(b'\x00\x02'), extra=None), 2)
+        self.assertEqual(handle(1, b'direct', None), (b'direct', None))
+
+    def test_binary_header_fields(self):
+        @binary_dispatch(header='>2xBB')
+        def handle(kind, body):
+            pass
+
+        handle.dispatch(lambda kind, body: kind, on=(1, 2))
+
+        self.assertEqual(handle.route(b'\xff\xff\x01\x02'), (1, 2))
+
+    def test_binary_feed(self):
+        @binary_dispatch(header='B', prefix='>H')
+        def handle(kind, body, out):
+            pass
+
+        handle.dispatch(lambda body, out: out.append(('a', bytes(body))), on=1)
+        handle.dispatch(lambda body, out: out.append(('b', bytes(body))), on=2)
+
+        stream = bytearray(b'\x00\x03\x01hi\x00\x01\x02\x00\x06\x01par')
+        out = []
+        consumed = handle.feed(stream, out)
+
+        self.assertEqual(out, [('a', b'hi'), ('b', b'')])
+        self.assertEqual(consumed, 8)
+
+        # Nothing holds on to the stream, so the consumed frames can be dropped.
+        del stream[:consumed]
+        stream += b'ts'
+        self.assertEqual(handle.feed(stream, out), 8)
+        self.assertEqual(out[-1], ('a', b'parts'))
+
+        with self.assertRaises(ValueError):
+            handle.feed(b'\x00\x00', out)
+
+    def test_binary_process(self):
+        @binary_dispatch(header='B', prefix='>H')
+        def handle(kind, bodies):
+            pass
+
+        kept = []
+
+        @handle.dispatch(on=1)
+        def _(bodies):
+            kept.extend(bodies)
+            return [bytes(body) for body in bodies]
+
+        handle.dispatch(lambda bodies: len(bodies), on=2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'records')
+            with open(path, 'wb') as file:
+                file.write(b'\x00\x03\x01ab\x00\x01\x02\x00\x02\x01c\x00\x01\x02\x00\x01\x02')
+
+            self.assertEqual(handle.process(path), {1: [[b'ab', b'c']], 2: [3]})
+            self.assertEqual(handle.process(path, chunk_size=2), {1: [[b'ab', b'c']], 2: [2, 1]})
+
+            # Views are released once the implementation returns, so the file can be unmapped.
+            with self.assertRaises(ValueError):
+                bytes(kept[0])
+
+            with open(path, 'ab') as file:
+                file.write(b'\x00\x05\x01')
+            with self.assertRaises(ValueError):
+                handle.process(path)
+
+            open(path, 'wb').close()
+            self.assertEqual(handle.process(path), {})
+
+    def test_binary_process_fixed(self):
+        @binary_dispatch(header='>H', default=True)
+        def handle(kind, bodies, scale):
+            return [int.from_bytes(body, 'big') * scale for body in bodies]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'records')
+            with open(path, 'wb') as file:
+                file.write(b'\x00\x01\x05\x00\x02\x06\x00\x01\x07')
+
+            self.assertEqual(handle.process(path, 10, record_size=3), {1: [[50, 70]], 2: [[60]]})
+
+            with self.assertRaises(ValueError):
+                handle.process(path, 10, record_size=2)
+
+    def test_resolve(self):
+        @dynamic_dispatch
+        def foo(kind, a, b):
+            pass
+
+        foo.dispatch(lambda kind, a, b: (kind, a, b), on=1)
+        foo.dispatch(lambda a, b: (a, b), on=2)
+
+        one, two = foo.resolve(1), foo.resolve(2)
+        self.assertEqual(one(1, 2, 3), (1, 2, 3))
+        self.assertEqual(two(2, 3, b=4), (3, 4))
+        self.assertIsNone(foo.resolve(3))
+
+        self.assertEqual(one.version, foo.version)
+        foo.dispatch(lambda: None, on=3)
+        self.assertNotEqual(one.version, foo.version)
+
+        with foo.override({1: lambda a, b: 'overridden'}):
+            self.assertEqual(foo.resolve(1)(1, 2, 3), 'overridden')
+
+    def test_resolve_default(self):
+        wrapped = dynamic_dispatch(lambda kind, a: (kind, a), default=True, structural=True)
+
+        self.assertEqual(wrapped.resolve([1])([1], 2), ([1], 2))
+
+    def test_compact(self):
+        @dynamic_dispatch(compact=True)
+        def foo(code, a):
+            pass
+
+        def even(a):
+            return 'even', a
+
+        def odd(a):
+            return 'odd', a
+
+        with foo.update():
+            for code in range(1000):
+                foo.dispatch(odd if code % 2 else even, on=code)
+
+        foo.dispatch(even, on=10 ** 12)
+        foo.dispatch(odd, on='code')
+
+        self.assertEqual(foo(998, 1), ('even', 1))
+        self.assertEqual(foo(999, a=2), ('odd', 2))
+        self.assertEqual(foo(10 ** 12, 3), ('even', 3))
+        self.assertEqual(foo('code', 4), ('odd', 4))
+        with self.assertRaises(ValueError):
+            foo(1000, 5)
+        with self.assertRaises(ValueError):
+            foo(-1, 5)
+        self.assertEqual(foo(True, 5), ('odd', 5))
+
+        foo.replace(odd, on=0)
+        foo.unregister(2)
+        self.assertEqual(foo(0, 6), ('odd', 6))
+        with self.assertRaises(ValueError):
+            foo(2, 7)
+        with self.assertRaises(ValueError), foo.update():
+            foo.unregister(4)
+            raise ValueError
+        self.assertEqual(foo(4, 8), ('even', 8))
+
+    def test_compact_equal_numbers(self):
+        wrapped = dynamic_dispatch(lambda code: code, compact=True)
+        wrapped.dispatch(lambda: 'five', on=5)
+        wrapped.dispatch(lambda: 'huge', on=10 ** 12)
+
+        self.assertEqual(wrapped(5.0), 'five')
+        self.assertEqual(wrapped(10.0 ** 12), 'huge')
+        if numpy is not None:
+            self.assertEqual(wrapped(numpy.int64(5)), 'five')
+            self.assertEqual(wrapped(numpy.uint8(5)), 'five')
+
+        # Equal numbers are the same key, as in a dict.
+        with self.assertRaises(ValueError):
+            wrapped.dispatch(lambda: 'float', on=5.0)
+        wrapped.replace(lambda: 'replaced', on=5.0)
+        self.assertEqual(wrapped(5), 'replaced')
+        wrapped.unregister(5.0)
+        self.assertIsNone(wrapped.resolve(5))
+
+    def test_compact_releases(self):
+        wrapped = dynamic_dispatch(lambda code: code, compact=True)
+        impl = create_autospec(lambda: None)
+
+        wrapped.dispatch(impl, on=1)
+        wrapped.dispatch(impl, on=2)
+        wrapped.unregister(1)
+        wrapped(2)
+        impl.assert_called_once_with()
+
+        wrapped.unregister(2)
+        self.assertIsNone(wrapped.resolve(2))
+
+    def test_dispatch_many(self):
+        @dynamic_dispatch
+        def foo(kind, a):
+            pass
+
+        def first(a):
+            return 'first', a
+
+        def second(kind, a):
+            return kind, a
+
+        foo.dispatch_many({1: first, 2: first, 3: second})
+        foo.dispatch(lambda a: a, on=[4, 5])
+
+        self.assertEqual(foo(1, 'a'), ('first', 'a'))
+        self.assertEqual(foo(2, 'b'), ('first', 'b'))
+        self.assertEqual(foo(3, 'c'), (3, 'c'))
+        self.assertEqual(foo(5, 'd'), 'd')
+
+        # Nothing is registered if any value already is.
+        version = foo.version
+        with self.assertRaises(ValueError):
+            foo.dispatch_many({6: first, 1: first, 2: second})
+        with self.assertRaises(ValueError):
+            foo(6, 'e')
+        self.assertEqual(foo.version, version)
+
+        with self.assertRaises(ValueError):
+            foo.dispatch(first, on=[7, 8], balance='random')
+
+    def test_dispatch_many_options(self):
+        wrapped = dynamic_dispatch(lambda _: _, compact=True)
+
+        with ThreadPoolExecutor(1) as pool:
+            wrapped.dispatch(lambda: 'pool', on=[1, 2], executor=pool, concurrency=1)
+
+            self.assertEqual(wrapped(1).result(), 'pool')
+            self.assertEqual(wrapped(2).result(), 'pool')
+
+        # Limits are per value.
+        self.assertEqual(wrapped.stats(1)['limit'], 1)
+        self.assertIsNot(wrapped.resolve(1).func, wrapped.resolve(2).func)
+
+    def test_dispatch_many_structural(self):
+        wrapped = dynamic_dispatch(lambda _: _, structural=True)
+        wrapped.dispatch(lambda: 'list', on=[1, 2])
+
+        self.assertEqual(wrapped([1, 2]), 'list')
+        with self.assertRaises(ValueError):
+            wrapped(1)
+
+        wrapped.dispatch_many({(1, 2): lambda: 'tuple'})
+        self.assertEqual(wrapped((1, 2)), 'tuple')
+        self.assertEqual(wrapped([1, 2]), 'list')
+
+    @skipIf(sys.version_info < (3, 8), 'dispatch functions are only specialized from Python 3.8')
+    def test_adaptive(self):
+        @dynamic_dispatch(default=True, adaptive=True)
+        def foo(kind, a):
+            return 'default'
+
+        def hot(a):
+            return 'hot', a
+
+        foo.dispatch(hot, on='hot')
+        foo.dispatch(lambda kind, a: ('cold', kind, a), on='cold')
+
+        for i in range(100_000):
+            self.assertEqual(foo('hot' if i % 10 else 'cold', i), ('hot', i) if i % 10 else ('cold', 'cold', i))
+
+        # The entry point now calls the hottest implementation itself.
+        self.assertIn(hot, foo.__code__.co_consts)
+        self.assertEqual(foo('other', 1), 'default')
+        self.assertEqual(foo(a=2, kind='hot'), ('hot', 2))
+
+        with foo.override({'hot': lambda a: 'overridden'}):
+            self.assertEqual(foo('hot', 1), 'overridden')
+        self.assertIn(hot, foo.__code__.co_consts)
+
+        foo.replace(lambda kind, a: ('replaced', a), on='hot')
+        self.assertNotIn(hot, foo.__code__.co_consts)
+        self.assertEqual(foo('hot', 3), ('replaced', 3))
+
+        foo.unregister('hot')
+        self.assertEqual(foo('hot', 4), 'default')
+
+    @skipIf(sys.version_info < (3, 8), 'dispatch functions are only specialized from Python 3.8')
+    def test_adaptive_resample(self):
+        @dynamic_dispatch(adaptive=True)
+        def foo(kind):
+            pass
+
+        def first():
+            return 'first'
+
+        def second():
+            return 'second'
+
+        # Resampled only by the test, rather than whenever the resampler's period ends.
+        entry, = (entry for entry in list(RESAMPLER._entries) if entry.function is foo)
+        RESAMPLER._entries.discard(entry)
+
+        foo.dispatch_many({1: first, 2: second})
+        for _ in range(10_000):
+            foo(1)
+
+        # Once specialized, calls are no longer counted.
+        self.assertIn(first, foo.__code__.co_consts)
+        self.assertNotIn('_sample', foo.__code__.co_names)
+
+        entry.resample()
+        self.assertIn('_sample', foo.__code__.co_names)
+
+        # Sampled again, the shifted traffic is noticed.
+        for _ in range(10_000):
+            self.assertEqual(foo(2), 'second')
+        self.assertIn(second, foo.__code__.co_consts)
+        self.assertNotIn(first, foo.__code__.co_consts)
+        self.assertNotIn('_sample', foo.__code__.co_names)
+
+    @skipIf(sys.version_info < (3, 8), 'dispatch functions are only specialized from Python 3.8')
+    def test_adaptive_extract(self):
+        @dynamic_dispatch(on_item='type', adaptive=True)
+        def handle(msg):
+            pass
+
+        handle.dispatch(lambda msg: msg['body'], on='a')
+
+        for i in range(100_000):
+            self.assertEqual(handle({'type': 'a', 'body': i}), i)
+        self.assertIn('a', handle.__code__.co_consts)
+
+        with self.assertRaises(KeyError):
+            handle({})
+
+    def test_adaptive_invalid(self):
+        with self.assertRaises(ValueError):
+            dynamic_dispatch(lambda _: _, adaptive=True, structural=True)
+
+        with self.assertRaises(ValueError):
+            @dynamic_dispatch(adaptive=True)
+            class _:
+                def __init__(self, _):
+                    pass
+
+    def test_latency(self):
+        @dynamic_dispatch(latency=1)
+        def handle(kind, a):
+            pass
+
+        handle.dispatch(lambda a: a, on='fast')
+        handle.dispatch(lambda a: threading.Event().wait(a), on='slow')
+
+        for _ in range(3):
+            handle('fast', 1)
+        handle('slow', 0.01)
+
+        # Each thread accumulates on its own, and snapshots merge them.
+        thread = threading.Thread(target=handle, args=('fast', 2))
+        thread.start()
+        thread.join()
+
+        latencies = handle.latency()
+        self.assertEqual(set(latencies), {'fast', 'slow'})
+        self.assertEqual(latencies['fast']['count'], 4)
+        self.assertEqual(sum(latencies['fast']['buckets'].values()), 4)
+        self.assertEqual(latencies['slow']['count'], 1)
+        self.assertGreaterEqual(latencies['slow']['p50_ns'], 10 ** 7)
+        self.assertLess(latencies['slow']['p50_ns'], 10 ** 10)
+        self.assertGreaterEqual(latencies['slow']['mean_ns'], 10 ** 7)
+        self.assertLessEqual(latencies['fast']['p50_ns'], latencies['fast']['p99_ns'])
+
+        text = handle.latency_text()
+        self.assertIn('# TYPE dispatch_latency_seconds histogram\n', text)
+        self.assertIn('dispatch_latency_seconds_count{function="handle",value="\'fast\'"} 4\n', text)
+        self.assertIn('dispatch_latency_seconds_bucket{function="handle",value="\'slow\'",le="+Inf"} 1\n', text)
+
+        self.assertEqual(handle.latency(reset=True), latencies)
+        self.assertEqual(handle.latency(), {})
+
+        handle('fast', 1)
+        self.assertEqual(handle.latency()['fast']['count'], 1)
+
+    def test_latency_sampled(self):
+        @dynamic_dispatch(on_attr='real', latency=3)
+        def handle(kind, a=None):
+            return 'default'
+
+        handle.dispatch(lambda a: a, on=1)
+
+        # Unsupported by the generated entry point, so counted down in the generic one.
+        for _ in range(7):
+            self.assertEqual(handle(1, a=2), 2)
+
+        self.assertEqual(handle.latency()[1]['count'], 2)
+
+        with self.assertRaises(ValueError):
+            handle(2)
+
+        @dynamic_dispatch(latency=2)
+        def generated(kind, a):
+            pass
+
+        generated.dispatch(lambda a: a, on=1)
+        for _ in range(5):
+            self.assertEqual(generated(1, 2), 2)
+
+        self.assertEqual(generated.latency()[1]['count'], 2)
+        self.assertEqual(dynamic_dispatch(lambda _: _).latency(), {})
+
+    def test_latency_builtin_names(self):
+        @dynamic_dispatch(latency=1)
+        def handle(kind, next):
+            pass
+
+        handle.dispatch(lambda next: next, on=1)
+        self.assertEqual(handle(1, 2), 2)
+        self.assertEqual(handle.latency()[1]['count'], 1)
+
+    def test_latency_invalid(self):
+        with self.assertRaises(ValueError):
+            dynamic_dispatch(lambda _: _, latency=0)
+
+        with self.assertRaises(ValueError):
+            @dynamic_dispatch(latency=10)
+            class _:
+                def __init__(self, _):
+                    pass
+
+    def test_weak(self):
+        @dynamic_dispatch(default=True)
+        def handle(kind, a):
+            return 'default'
+
+        def generate(value):
+            return lambda a: (value, a)
+
+        impl = generate(1)
+        handle.dispatch(impl, on=1, weak=True)
+        handle.dispatch_many({2: generate(2), 3: generate(3)}, weak=True)
+        self.assertEqual(handle(1, 'a'), (1, 'a'))
+        self.assertEqual(handle.weak_stats(), {'implementations': 1, 'values': 1, 'collected': 2, 'kept': 0,
+                                               'evicted': 0})
+
+        # Until the registry changes, collected implementations dispatch as if unregistered.
+        del impl
+        gc.collect()
+        self.assertEqual(handle(1, 'a'), 'default')
+
+        handle.dispatch(lambda a: a, on=1)
+        self.assertEqual(handle(1, 'a'), 'a')
+        self.assertEqual(handle.weak_stats()['collected'], 3)
+
+    def test_weak_keep_alive(self):
+        @dynamic_dispatch(keep_alive=2)
+        def handle(kind, a):
+            pass
+
+        def generate(value):
+            return lambda a: (value, a)
+
+        handle.dispatch(generate(1), on=1, weak=True)
+        handle.dispatch(generate(2), on=[2, 22], weak=True)
+        self.assertEqual(handle(1, 'a'), (1, 'a'))
+
+        # The least recently used is no longer kept alive.
+        handle.dispatch(generate(3), on=3, weak=True)
+        gc.collect()
+        self.assertEqual(handle.weak_stats(), {'implementations': 2, 'values': 2, 'collected': 2, 'kept': 2,
+                                               'evicted': 1})
+
+        for value in (2, 22):
+            with self.assertRaises(ValueError):
+                handle(value, 'a')
+        self.assertEqual(handle(1, 'a'), (1, 'a'))
+        self.assertEqual(handle(3, 'a'), (3, 'a'))
+
+        # Replacing keeps the new implementation alive, in place of the least recently used.
+        handle.replace(_square, on=3, weak=True)
+        gc.collect()
+        self.assertEqual(handle(3, 4), 16)
+        self.assertEqual(handle.weak_stats(), {'implementations': 1, 'values': 1, 'collected': 3, 'kept': 2,
+                                               'evicted': 2})
+
+    def test_weak_invalid(self):
+        @dynamic_dispatch
+        def handle(kind, a):
+            pass
+
+        class Unreferenceable:
+            __slots__ = ()
+
+            def __call__(self, a):
+                return a
+
+        with self.assertRaises(TypeError):
+            handle.dispatch(Unreferenceable(), on=1, weak=True)
+        with self.assertRaises(ValueError):
+            handle.dispatch(lambda a: a, on=1, weak=True, executor=ThreadPoolExecutor(1))
+        with self.assertRaises(ValueError):
+            handle.dispatch(lambda a: a, on=1, weak=True, balance='random')
+        with self.assertRaises(ValueError):
+            dynamic_dispatch(lambda _: _, keep_alive=0)
+
+        with self.assertRaises(ValueError):
+            @dynamic_dispatch(keep_alive=1)
+            class _:
+                def __init__(self, _):
+                    pass
+
+    def test_partitioned(self):
+        @dynamic_dispatch
+        def handle(kind, a):
+            pass
+
+        log = []
+        in_progress, most = set(), 0
+
+        @handle.dispatch(on=['a', 'b', 'c'])
+        async def _(kind, a):
+            nonlocal most
+            # Calls for one value never overlap, calls for different ones do.
+            self.assertNotIn(kind, in_progress)
+            in_progress.add(kind)
+            most = max(most, len(in_progress))
+            await asyncio.sleep(0.001 * random.random())
+            in_progress.remove(kind)
+            log.append((kind, a))
+            return a
+
+        @handle.dispatch(on='error')
+        def _(a):
+            raise KeyError(a)
+
+        async def main():
+            async with handle.partitioned(workers=3, queue_size=2) as runtime:
+                futures = [await runtime.submit(kind, a) for a in range(10) for kind in 'abc']
+
+                with self.assertRaises(KeyError):
+                    await runtime.call('error', 1)
+                with self.assertRaises(ValueError):
+                    await runtime.call('unregistered', 1)
+
+                results = await asyncio.gather(*futures)
+
+            self.assertEqual(runtime.stats(), {'partitions': 0, 'queued': 0, 'max_depth': 0, 'pending': 0,
+                                               'busy_workers': 0, 'calls': 32})
+            return results
+
+        self.assertEqual(asyncio.run(main()), [a for a in range(10) for _ in 'abc'])
+        for kind in 'abc':
+            self.assertEqual([a for k, a in log if k == kind], list(range(10)))
+        self.assertGreater(most, 1)
+
+    def test_partitioned_extract(self):
+        @dynamic_dispatch(on_item='kind')
+        def by_item(msg):
+            pass
+
+        @dynamic_dispatch(on_attr='kind')
+        def by_attr(msg):
+            pass
+
+        by_item.dispatch(lambda msg: msg['body'], on='a')
+        by_attr.dispatch(lambda msg: msg.body, on='a')
+
+        async def main():
+            # Partitioned on the field dispatched on, rather than on the whole, possibly unhashable, message.
+            async with by_item.partitioned(workers=1) as runtime:
+                self.assertEqual(runtime.partition({'kind': 'a', 'body': 1}), 'a')
+                self.assertEqual(await runtime.call({'kind': 'a', 'body': 1}), 1)
+
+            async with by_attr.partitioned(workers=1, buckets=4) as runtime:
+                first, second = types.SimpleNamespace(kind='a', body=1), types.SimpleNamespace(kind='a', body=2)
+                self.assertEqual(runtime.partition(first), runtime.partition(second))
+                self.assertEqual(await runtime.call(second), 2)
+
+        asyncio.run(main())
+
+    def test_partitioned_cancelled_impl(self):
+        @dynamic_dispatch
+        def handle(kind, a):
+            pass
+
+        @handle.dispatch(on=1)
+        async def _(a):
+            if a is None:
+                raise asyncio.CancelledError()
+            return a
+
+        async def main():
+            async with handle.partitioned(workers=1) as runtime:
+                cancelled = await runtime.submit(1, None)
+                future = await runtime.submit(1, 2)
+
+                # The worker carries on with the next call, and the partition is done with.
+                await asyncio.wait_for(runtime.join(), 5)
+                self.assertTrue(cancelled.cancelled())
+                self.assertEqual(runtime.stats()['partitions'], 0)
+                return await future
+
+        self.assertEqual(asyncio.run(main()), 2)
+
+    def test_partitioned_backpressure(self):
+        @dynamic_dispatch
+        def handle(kind, a):
+            pass
+
+        release = None
+
+        @handle.dispatch(on=[1, 2])
+        async def _(a):
+            await release.wait()
+            return a
+
+        async def main():
+            nonlocal release
+            release = asyncio.Event()
+
+            async with handle.partitioned(workers=2, queue_size=2, buckets=1) as runtime:
+                # One call runs and two are queued, so the next one waits for room.
+                futures = [await runtime.submit(1, a) for a in range(3)]
+                await asyncio.sleep(0)
+                submit = asyncio.ensure_future(runtime.submit(2, 3))
+                await asyncio.sleep(0.01)
+                self.assertFalse(submit.done())
+
+                self.assertEqual(runtime.depths(), {0: 2})
+                self.assertEqual(runtime.stats()['max_depth'], 2)
+                self.assertEqual(runtime.stats()['pending'], 4)
+                self.assertEqual(runtime.stats()['busy_workers'], 1)
+
+                release.set()
+                futures.append(await submit)
+                return await asyncio.gather(*futures)
+
+        self.assertEqual(asyncio.run(main()), [0, 1, 2, 3])
+
+        with self.assertRaises(ValueError):
+            handle.partitioned(workers=0)
+
+    def test_sharded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'shard_handlers.py'), 'w') as file:
+                file.write('import os\n'
+                           'from dynamic_dispatch import dynamic_dispatch\n'
+                           '\n'
+                           '@dynamic_dispatch\n'
+                           'def handle(kind, a):\n'
+                           '    pass\n'
+                           '\n'
+                           'seen = {}\n'
+                           '\n'
+                           '@handle.dispatch(on=list("abcdefgh"))\n'
+                           'def record(kind, a):\n'
+                           '    seen.setdefault(kind, []).append(a)\n'
+                           '    return os.getpid(), list(seen[kind])\n'
+                           '\n'
+                           '@handle.dispatch(on="error")\n'
+                           'def fail(a):\n'
+                           '    raise KeyError(a)\n'
+                           '\n'
+                           '@handle.dispatch(on="exit")\n'
+                           'def exit(a):\n'
+                           '    os._exit(a)\n'
+                           '\n'
+                           'class Mismatched(Exception):\n'
+                           '    def __init__(self, a, b):\n'
+                           '        super().__init__(a + b)\n'
+                           '\n'
+                           '@handle.dispatch(on="mismatched")\n'
+                           'def mismatched(a):\n'
+                           '    raise Mismatched(a, a)\n'
+                           '\n'
+                           'def unloadable():\n'
+                           '    raise ValueError("cannot load")\n'
+                           '\n'
+                           'class Unloadable:\n'
+                           '    def __reduce__(self):\n'
+                           '        return unloadable, ()\n'
+                           '\n'
+                           '@handle.dispatch(on="unloadable")\n'
+                           'def unloaded(a):\n'
+                           '    return Unloadable()\n'
+                           '\n'
+                           '@dynamic_dispatch(on_attr="kind")\n'
+                           'def handle_message(msg):\n'
+                           '    return msg.body\n')
+
+            sys.path.insert(0, directory)
+            try:
+                from shard_handlers import handle
+
+                with handle.sharded(workers=3) as executor:
+                    futures = [(kind, a, executor.submit(kind, a)) for a in range(20) for kind in 'abcdefgh']
+
+                    pids = {}
+                    for kind, a, future in futures:
+                        pid, seen = future.result(timeout=30)
+                        # Each value stays on one worker, whose state for it saw every call so far, in order.
+                        self.assertEqual(pids.setdefault(executor.shard(kind), pid), pid)
+                        self.assertEqual(seen, list(range(a + 1)))
+
+                    self.assertGreater(len(pids), 1)
+                    self.assertEqual(len(set(pids.values())), len(pids))
+
+                    with self.assertRaises(KeyError):
+                        executor.submit('error', 1).result(timeout=30)
+                    with self.assertRaises(ValueError):
+                        executor.submit('missing', 1).result(timeout=30)
+
+                    # Outcomes which cannot be unpickled fail only their own call.
+                    with self.assertRaises(RuntimeError):
+                        executor.submit('mismatched', 1).result(timeout=30)
+                    with self.assertRaises(RuntimeError):
+                        executor.submit('unloadable', 1).result(timeout=30)
+                    self.assertIn('could not be sent back', str(executor.submit('mismatched', 1).exception(timeout=30)))
+                    self.assertEqual(executor.pending(), {0: 0, 1: 0, 2: 0})
+
+                    # Calls on a worker which dies fail, as do later ones, while other workers carry on.
+                    shard = executor.shard('exit')
+                    with self.assertRaises(BrokenProcessPool):
+                        executor.submit('exit', 1).result(timeout=30)
+                    with self.assertRaises(BrokenProcessPool):
+                        executor.submit('exit', 1)
+
+                    kind = next(kind for kind in 'abcdefgh' if executor.shard(kind) != shard)
+                    self.assertEqual(executor.submit(kind, 20).result(timeout=30)[1], list(range(21)))
+
+                with self.assertRaises(RuntimeError):
+                    executor.submit('a', 1)
+
+                # Placed by the field dispatched on, rather than by the whole message.
+                from shard_handlers import handle_message
+                with handle_message.sharded(workers=3) as executor:
+                    for kind in 'abcdefgh':
+                        message = types.SimpleNamespace(kind=kind, body=kind)
+                        self.assertEqual(executor.shard(message), executor.ring.shard(kind))
+            finally:
+                sys.path.remove(directory)
+                sys.modules.pop('shard_handlers', None)
+
+    def test_sharded_placement(self):
+        ring = HashRing(4)
+        values = [f'sku-{i}' for i in range(10_000)]
+        placed = [ring.shard(value) for value in values]
+
+        # Placement doesn't depend on the process, unlike hash() of str.
+        script = 'from dynamic_dispatch._shard import HashRing\n' \
+                 'ring = HashRing(4)\n' \
+                 'print([ring.shard(f"sku-{i}") for i in range(10_000)])\n'
+        output = subprocess.run([sys.executable, '-c', script], check=True, stdout=subprocess.PIPE,
+                                env=dict(os.environ, PYTHONHASHSEED='1')).stdout
+        self.assertEqual(eval(output), placed)
+
+        for shard in range(4):
+            self.assertGreater(placed.count(shard), 0.15 * len(values))
+
+        # Adding a shard only moves values onto it, about a fifth of them.
+        grown = HashRing(5)
+        moved = [grown.shard(value) for value, shard in zip(values, placed) if grown.shard(value) != shard]
+        self.assertEqual(set(moved), {4})
+        self.assertLess(len(moved), 0.3 * len(values))
+
+        # Equal numbers, the same dispatch value, are placed together.
+        for equal in ((1, 1.0, True, 1 + 0j), (0.5, 0.5 + 0j), ((1, 'a'), (1.0, 'a'))):
+            self.assertEqual(len({ring.shard(value) for value in equal}), 1)
+
+        with self.assertRaises(ValueError):
+            HashRing(0)
+
+    def test_compile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'aot_handlers.py'), 'w') as file:
+                file.write('def add(a, b):\n'
+                           '    return a + b\n'
+                           '\n'
+                           'def sub(b, op, a):\n'
+                           '    return b - a\n'
+                           '\n'
+                           'class Ops:\n'
+                           '    @staticmethod\n'
+                           '    def mul(op, a, b):\n'
+                           '        return (op, a * b)\n')
+            with open(os.path.join(directory, 'aot_registry.py'), 'w') as file:
+                file.write('from dynamic_dispatch import dynamic_dispatch\n'
+                           'from aot_handlers import Ops, add, sub\n'
+                           '\n'
+                           '@dynamic_dispatch(on_item=0)\n'
+                           'def calc(op, a, b):\n'
+                           '    pass\n'
+                           '\n'
+                           'calc.dispatch(add, on="+")\n'
+                           'calc.dispatch(sub, on="-")\n'
+                           'calc.dispatch_many({"*": Ops.mul, 2: add})\n'
+                           '\n'
+                           '@dynamic_dispatch\n'
+                           'def unnamed(op):\n'
+                           '    pass\n'
+                           '\n'
+                           'unnamed.dispatch(lambda: None, on=1)\n'
+                           '\n'
+                           '@dynamic_dispatch(default=True)\n'
+                           'def fallback(op, a):\n'
+                           '    return ("default", op, a)\n'
+                           '\n'
+                           'fallback.dispatch(add, on="+")\n')
+
+            sys.path.insert(0, directory)
+            try:
+                output = os.path.join(directory, 'aot_compiled.py')
+                self.assertEqual(main(['compile', 'aot_registry:calc', '-o', output, '--check']), 1)
+                self.assertEqual(main(['compile', 'aot_registry:calc', '-o', output]), 0)
+                self.assertEqual(main(['compile', 'aot_registry:calc', '-o', output, '--check']), 0)
+
+                import aot_compiled
+                from aot_registry import calc
+                for args, kwargs in ((('+', 1, 2), {}), (('-',), {'a': 5, 'b': 2}), (('*x', 3, 4), {}),
+                                     (((2,), 1, 2), {})):
+                    self.assertEqual(aot_compiled.calc(*args, **kwargs), calc(*args, **kwargs))
+
+                with self.assertRaises(ValueError):
+                    aot_compiled.calc('/', 1, 2)
+
+                from aot_handlers import add
+                calc.dispatch(add, on='/')
+                self.assertEqual(main(['compile', 'aot_registry:calc', '-o', output, '--check']), 1)
+
+                fallback_output = os.path.join(directory, 'aot_fallback.py')
+                self.assertEqual(main(['compile', 'aot_registry:fallback', '-o', fallback_output]), 0)
+
+                import aot_fallback
+                from aot_registry import fallback
+                self.assertEqual(aot_fallback.fallback('+', 1, b=2), 3)
+                self.assertEqual(aot_fallback.fallback('?', 1), ('default', '?', 1))
+                self.assertEqual(aot_fallback.fallback(op='?', a=1), fallback(op='?', a=1))
+
+                self.assertEqual(main(['compile', 'aot_registry:unnamed', '-o', output]), 2)
+                self.assertEqual(main(['compile', 'aot_registry:missing', '-o', output]), 2)
+            finally:
+                sys.path.remove(directory)
+                for module in ('aot_handlers', 'aot_registry', 'aot_compiled', 'aot_fallback'):
+                    sys.modules.pop(module, None)
+
+    def test_dispatch_by_name(self):
+        @dynamic_dispatch
+        def foo(kind, a, b):
+            pass
+
+        impl = create_autospec(lambda b, a: None)
+        foo.dispatch(impl, on=1)
+
+        foo(b=3, kind=1, a=2)
+        impl.assert_called_once_with(b=3, a=2)
+
+    def test_dispatch_by_name_differential(self):
+        # Spelled out, the signature gets a generated entry point, while variadic it is dispatched generically.
+        def specialized(kind, b, c):
+            pass
+
+        def generic(kind, b, c, *rest):
+            pass
+
+        impls = {1: lambda c, b: (b, c), 2: lambda *, b, c: (b, c), 3: lambda b, c, kind: (kind, b, c),
+                 4: lambda *args, **kwargs: (args, kwargs)}
+        calls = (((1, 'B', 'C'), {}), ((1,), {'b': 'B', 'c': 'C'}), ((2,), {'b': 'B', 'c': 'C'}),
+                 (('B', 'C'), {'kind': 3}), ((3, 'B'), {'c': 'C'}), ((3,), {'c': 'C', 'b': 'B'}),
+                 ((4, 'B'), {'c': 'C'}), ((), {'kind': 4, 'b': 'B'}))
+
+        results = []
+        for func in (specialized, generic):
+            wrapped = dynamic_dispatch(func)
+            wrapped.dispatch_many(impls)
+            results.append([wrapped(*args, **kwargs) for args, kwargs in calls])
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], [('C', 'B'), ('B', 'C'), ('B', 'C'), (3, 'B', 'C'), (3, 'B', 'C'), (3, 'B', 'C'),
+                                      (('B',), {'c': 'C'}), ((), {'b': 'B'})])
+
+    def test_dispatch_signature(self):
+        def foo(kind, a, b):
+            pass
+
+        wrapped = dynamic_dispatch(foo)
+
+        self.assertEqual(inspect.signature(foo), inspect.signature(wrapped))
+
+    def test_dispatch_reserved_names(self):
+        default = create_autospec(lambda _impl, _entry: None)
+        wrapped = dynamic_dispatch(default, default=True)
+
+        impl = create_autospec(lambda _entry: None)
+        wrapped.dispatch(impl, on=1)
+
+        wrapped(1, 2)
+        wrapped(2, 3)
+
+        impl.assert_called_once_with(2)
+        default.assert_called_once_with(2, 3)
+
+    def test_dispatch_defaults(self):
+        @dynamic_dispatch(default=True)
+        def foo(kind, a=1):
+            return kind, a
+
+        foo.dispatch(lambda a=2: a, on=2)
+
+        self.assertEqual(foo(1), (1, 1))
+        self.assertEqual(foo(2), 2)
+        self.assertEqual(foo(2, 3), 3)
+
+    def test_dispatch_fewer_arguments(self):
+        @dynamic_dispatch
+        def foo(kind, a, b):
+            pass
+
+        @foo.dispatch(on='x')
+        def _():
+            return 'x'
+
+        @foo.dispatch(on='y')
+        def _(b=2):
+            return b
+
+        self.assertEqual(foo('x'), 'x')
+        self.assertEqual(foo(kind='x'), 'x')
+        self.assertEqual(foo('y'), 2)
+        self.assertEqual(foo('y', b=3), 3)
+        self.assertEqual(foo(kind='y', b=4), 4)
+
+        with self.assertRaises(TypeError):
+            foo()
+
+    def test_dispatch_class_impl(self):
+        @dynamic_dispatch(default=True)
+        def make(kind, a):
+            return 'default'
+
+        @make.dispatch(on=1)
+        class Impl:
+            def __init__(self, kind, a, extra=None):
+                self.args = kind, a, extra
+
+        self.assertEqual(make(1, 2).args, (1, 2, None))
+        self.assertEqual(make(1, 2, 3).args, (1, 2, 3))
+        self.assertEqual(make(kind=1, a=2).args, (1, 2, None))
+        self.assertEqual(make.resolve(1)(1, 2).args, (1, 2, None))
+
+        with make.override({2: Impl}):
+            self.assertEqual(make(2, 3).args, (2, 3, None))
+            self.assertEqual(make(1, 3).args, (1, 3, None))
+
+    def test_method(self):
+        impl = create_autospec(lambda _, a: _)
+
+        class Foo:
+            @dynamic_dispatch(default=True)
+            def method(self, kind, a):
+                return 'default', self, kind, a
+
+            @method.dispatch(on=1)
+            def _(self, a):
+                impl(self, a)
+                return self, a
+
+        foo = Foo()
+        self.assertEqual(foo.method(1, 2), (foo, 2))
+        self.assertEqual(foo.method(0, 2), ('default', foo, 0, 2))
+        self.assertEqual(foo.method(kind=1, a=3), (foo, 3))
+        self.assertEqual(Foo.method(foo, 1, 4), (foo, 4))
+        self.assertEqual(impl.call_count, 3)
+
+    def test_method_reorder(self):
+        class Foo:
+            @dynamic_dispatch
+            def method(self, kind, a, b):
+                pass
+
+            @method.dispatch(on=1)
+            def _(self, a, kind, b):
+                return self, a, kind, b
+
+        foo = Foo()
+        self.assertEqual(foo.method(1, 2, 3), (foo, 2, 1, 3))
+
+    def test_method_no_default(self):
+        class Foo:
+            @dynamic_dispatch
+            def method(self, kind):
+                pass
+
+        with self.assertRaises(ValueError):
+            Foo().method(1)
+
+    def test_method_missing_dispatch_param(self):
+        class Foo:
+            @dynamic_dispatch(default=True)
+            def method(self, kind):
+                pass
+
+        with self.assertRaises(TypeError):
+            Foo().method()
+
+    def test_method_classmethod(self):
+        class Foo:
+            @classmethod
+            @dynamic_dispatch
+            def method(cls, kind, a):
+                pass
+
+            @method.__func__.dispatch(on=1)
+            def _(cls, a):
+                return cls, a
+
+        self.assertEqual(Foo.method(1, 2), (Foo, 2))
+        self.assertEqual(Foo().method(1, 3), (Foo, 3))
+
+    def test_method_receiver_misnamed(self):
+        class Foo:
+            @dynamic_dispatch
+            def method(this, kind):
+                pass
+
+            @method.dispatch(on=1)
+            def _(this):
+                return this
+
+        with self.assertRaisesRegex(ValueError, 'must name their first parameter self or cls'):
+            Foo().method(1)
+
+    def test_function_cls_dispatched_on(self):
+        wrapped = dynamic_dispatch(lambda cls, a: None)
+        wrapped.dispatch(lambda a: a, on=int)
+
+        self.assertEqual(wrapped(int, 1), 1)
+
+        with self.assertRaisesRegex(ValueError, r'for <lambda>$'):
+            wrapped(str, 1)
+
+    def test_method_extend(self):
+        class Foo:
+            @dynamic_dispatch
+            def method(self, kind):
+                pass
+
+            @method.dispatch(on=1)
+            def _(self):
+                return 'foo', self
+
+        class Bar(Foo):
+            method = Foo.method.extend()
+
+            @method.dispatch(on=1)
+            def _(self):
+                return 'bar', self
+
+            @method.dispatch(on=2)
+            def _(self):
+                return 'bar', self
+
+        foo, bar = Foo(), Bar()
+        self.assertEqual(foo.method(1), ('foo', foo))
+        self.assertEqual(bar.method(1), ('bar', bar))
+        self.assertEqual(bar.method(2), ('bar', bar))
+
+        with self.assertRaises(ValueError):
+            foo.method(2)
+
+        @Foo.method.dispatch(on=3)
+        def _(self):
+            return 'foo', self
+
+        # Registrations on the parent after extending are still visible.
+        self.assertEqual(bar.method(3), ('foo', bar))
+
+    def test_extend(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda: 1, on=1)
+
+        extended = wrapped.extend()
+        extended.dispatch(lambda: 2, on=2)
+
+        self.assertEqual(extended(1), 1)
+        self.assertEqual(extended(2), 2)
+
+        with self.assertRaises(ValueError):
+            wrapped(2)
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_vectorize(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        double = create_autospec(lambda a: a, side_effect=lambda a: a * 2)
+        wrapped.dispatch(double, on=1)
+        wrapped.dispatch(lambda _, a: a + _, on=2)
+
+        result = wrapped.vectorize([1, 2, 1, 2, 1], [1, 2, 3, 4, 5])
+
+        numpy.testing.assert_array_equal(result, [2, 4, 6, 6, 10])
+        double.assert_called_once()
+        numpy.testing.assert_array_equal(double.call_args[0][0], [1, 3, 5])
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_vectorize_promotes_results(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+        wrapped.dispatch(lambda a: a, on='a')
+        wrapped.dispatch(lambda a: 0.5, on='b')
+
+        result = wrapped.vectorize(numpy.array(['a', 'b', 'a']), numpy.array([1, 2, 3]))
+
+        numpy.testing.assert_array_equal(result, [1, 0.5, 3])
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_vectorize_length_mismatch(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ValueError):
+            wrapped.vectorize([1, 2], [1])
+
+    @skipUnless(numpy is None, 'numpy is installed')
+    def test_vectorize_requires_numpy(self):
+        wrapped = dynamic_dispatch(lambda _: _)
+
+        with self.assertRaises(ModuleNotFoundError):
+            wrapped.vectorize([1], [1])
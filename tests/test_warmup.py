@@ -0,0 +1,92 @@
+import gc
+import json
+import os
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from dynamic_dispatch import dynamic_dispatch, warmup
+
+
+def _memory() -> dict:
+    """ Kilobytes of memory of this process, by kind, e.g. Shared_Dirty or Private_Dirty. """
+    memory = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) == 3 and fields[0].endswith(':'):
+                memory[fields[0][:-1]] = int(fields[1])
+
+    return memory
+
+
+def _forked(work) -> dict:
+    """ Memory of a worker forked from this process, once it has done work. """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Never return into the test runner in the worker, whatever happens.
+        try:
+            os.close(read)
+            work()
+            os.write(write, json.dumps(_memory()).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    with os.fdopen(read, 'rb') as file:
+        data = file.read()
+    os.waitpid(pid, 0)
+
+    return json.loads(data)
+
+
+class TestWarmup(TestCase):
+    def test_warmup(self):
+        @dynamic_dispatch
+        def handle(kind, a):
+            pass
+
+        handle.dispatch(lambda a: a, on=1)
+        self.assertGreaterEqual(warmup(), 1)
+
+        # The entry point for overrides is ready, so overriding compiles nothing.
+        with patch('dynamic_dispatch._entry.compile_entry') as compile_entry:
+            with handle.override({1: lambda a: -a}):
+                self.assertEqual(handle(1, 2), -2)
+            self.assertEqual(handle(1, 2), 2)
+
+        compile_entry.assert_not_called()
+
+    @skipUnless(hasattr(os, 'fork') and os.path.exists('/proc/self/smaps_rollup'), 'requires fork and Linux smaps')
+    def test_warmup_freeze_shares_memory(self):
+        @dynamic_dispatch
+        def handle(kind, a):
+            pass
+
+        impls = [eval(f'lambda a: {i}') for i in range(50)]
+        handle.dispatch_many({('sku', i): impls[i % 50] for i in range(100_000)})
+
+        # Long-lived objects the garbage collector tracks, as a server would have.
+        state = [[i] for i in range(200_000)]
+
+        def work():
+            for i in range(0, 100_000, 100):
+                handle(('sku', i), None)
+
+            # Collections visit, and so write to, every tracked object which isn't frozen.
+            gc.collect()
+
+        warmup()
+        thawed = _forked(work)
+
+        warmup(freeze=True)
+        try:
+            frozen = _forked(work)
+        finally:
+            gc.unfreeze()
+
+        del state
+
+        # Without freezing, collecting copies the pages of every tracked object into the worker.
+        self.assertLess(frozen['Private_Dirty'], thawed['Private_Dirty'])
+        self.assertGreater(frozen['Shared_Clean'] + frozen['Shared_Dirty'], frozen['Private_Dirty'])